@@ -0,0 +1,36 @@
+"""documents_fulltext_ngram
+
+Revision ID: a3b5c7d9e1f2
+Revises: f1c2d3e4a5b6
+Create Date: 2026-10-18 22:05:13.417290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3b5c7d9e1f2'
+down_revision: Union[str, Sequence[str], None] = 'f1c2d3e4a5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # FULLTEXT with the ngram parser is MySQL-only (5.7.6+); other backends search with LIKE
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    op.create_index(
+        'ft_documents_title_description_summary', 'documents', ['title', 'description', 'ai_summary'],
+        unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    op.drop_index('ft_documents_title_description_summary', table_name='documents')
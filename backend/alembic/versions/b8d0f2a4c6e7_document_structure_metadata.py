@@ -0,0 +1,37 @@
+"""document_structure_metadata
+
+Revision ID: b8d0f2a4c6e7
+Revises: a3b5c7d9e1f2
+Create Date: 2026-10-18 23:12:40.581936
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d0f2a4c6e7'
+down_revision: Union[str, Sequence[str], None] = 'a3b5c7d9e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('page_sizes', sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql'), nullable=True))
+    op.add_column('documents', sa.Column('pdf_info', sa.Text(), nullable=True))
+    op.add_column('documents', sa.Column('outline', sa.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True))
+    op.add_column('documents', sa.Column('is_linearized', sa.Boolean(), nullable=True))
+    op.add_column('documents', sa.Column('structure_extracted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'structure_extracted_at')
+    op.drop_column('documents', 'is_linearized')
+    op.drop_column('documents', 'outline')
+    op.drop_column('documents', 'pdf_info')
+    op.drop_column('documents', 'page_sizes')
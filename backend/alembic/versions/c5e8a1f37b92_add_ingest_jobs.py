@@ -0,0 +1,70 @@
+"""add_ingest_jobs
+
+Revision ID: c5e8a1f37b92
+Revises: a41c6f0d2b87
+Create Date: 2026-10-18 13:42:05.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a1f37b92'
+down_revision: Union[str, Sequence[str], None] = 'a41c6f0d2b87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ingest_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', name='ingestjobstatus'), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('succeeded', sa.Integer(), nullable=True),
+    sa.Column('failed', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ingest_jobs_id'), 'ingest_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_ingest_jobs_status'), 'ingest_jobs', ['status'], unique=False)
+    op.create_index(op.f('ix_ingest_jobs_created_at'), 'ingest_jobs', ['created_at'], unique=False)
+    op.create_table('ingest_job_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('file_name', sa.String(length=255), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=True),
+    sa.Column('staged_path', sa.String(length=500), nullable=False),
+    sa.Column('file_size', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'SUCCEEDED', 'FAILED', name='ingestitemstatus'), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.Column('deduplicated', sa.Boolean(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['ingest_jobs.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ingest_job_items_id'), 'ingest_job_items', ['id'], unique=False)
+    op.create_index(op.f('ix_ingest_job_items_job_id'), 'ingest_job_items', ['job_id'], unique=False)
+    op.create_index(op.f('ix_ingest_job_items_status'), 'ingest_job_items', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ingest_job_items_status'), table_name='ingest_job_items')
+    op.drop_index(op.f('ix_ingest_job_items_job_id'), table_name='ingest_job_items')
+    op.drop_index(op.f('ix_ingest_job_items_id'), table_name='ingest_job_items')
+    op.drop_table('ingest_job_items')
+    op.drop_index(op.f('ix_ingest_jobs_created_at'), table_name='ingest_jobs')
+    op.drop_index(op.f('ix_ingest_jobs_status'), table_name='ingest_jobs')
+    op.drop_index(op.f('ix_ingest_jobs_id'), table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
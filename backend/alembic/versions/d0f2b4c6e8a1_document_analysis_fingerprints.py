@@ -0,0 +1,28 @@
+"""document_analysis_fingerprints
+
+Revision ID: d0f2b4c6e8a1
+Revises: c9e1a3b5d7f8
+Create Date: 2026-10-19 11:02:56.730148
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0f2b4c6e8a1'
+down_revision: Union[str, Sequence[str], None] = 'c9e1a3b5d7f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('analysis_fingerprints', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'analysis_fingerprints')
@@ -0,0 +1,57 @@
+"""file_path_storage_refs
+
+Revision ID: d2f4b6a8c013
+Revises: c5e8a1f37b92
+Create Date: 2026-10-18 15:20:44.730512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f4b6a8c013'
+down_revision: Union[str, Sequence[str], None] = 'c5e8a1f37b92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columns holding a stored file location
+TABLES = ['documents', 'upload_sessions']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # "/static/uploads/<name>" -> "local:<name>", "https://<host>/<key>" -> "oss:<key>"
+    for table in TABLES:
+        op.execute(
+            f"UPDATE {table} SET file_path = CONCAT('local:', SUBSTRING(file_path, 17)) "
+            "WHERE file_path LIKE '/static/uploads/%'"
+        )
+        op.execute(
+            f"UPDATE {table} SET file_path = CONCAT('oss:', "
+            "SUBSTRING(file_path, LOCATE('/', file_path, LOCATE('://', file_path) + 3) + 1)) "
+            "WHERE file_path LIKE 'http://%' OR file_path LIKE 'https://%'"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if settings.OSS_BUCKET_DOMAIN:
+        oss_prefix = f"{settings.OSS_BUCKET_DOMAIN}/"
+    else:
+        oss_prefix = f"https://{settings.OSS_BUCKET_NAME}.{settings.OSS_ENDPOINT}/"
+    for table in TABLES:
+        op.execute(
+            f"UPDATE {table} SET file_path = CONCAT('/static/uploads/', SUBSTRING(file_path, 7)) "
+            "WHERE file_path LIKE 'local:%'"
+        )
+        op.execute(
+            sa.text(
+                f"UPDATE {table} SET file_path = CONCAT(:prefix, SUBSTRING(file_path, 5)) "
+                "WHERE file_path LIKE 'oss:%'"
+            ).bindparams(prefix=oss_prefix)
+        )
@@ -0,0 +1,49 @@
+"""add_verified_uploads
+
+Revision ID: e1a3c5e7f9b2
+Revises: d0f2b4c6e8a1
+Create Date: 2026-10-20 10:12:48.173304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a3c5e7f9b2'
+down_revision: Union[str, Sequence[str], None] = 'd0f2b4c6e8a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('verified_uploads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('file_name', sa.String(length=255), nullable=False),
+    sa.Column('file_size', sa.BigInteger(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('checksum', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_verified_uploads_id'), 'verified_uploads', ['id'], unique=False)
+    op.create_index(op.f('ix_verified_uploads_user_id'), 'verified_uploads', ['user_id'], unique=False)
+    op.create_index(op.f('ix_verified_uploads_file_path'), 'verified_uploads', ['file_path'], unique=False)
+    op.create_index(op.f('ix_verified_uploads_expires_at'), 'verified_uploads', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_verified_uploads_expires_at'), table_name='verified_uploads')
+    op.drop_index(op.f('ix_verified_uploads_file_path'), table_name='verified_uploads')
+    op.drop_index(op.f('ix_verified_uploads_user_id'), table_name='verified_uploads')
+    op.drop_index(op.f('ix_verified_uploads_id'), table_name='verified_uploads')
+    op.drop_table('verified_uploads')
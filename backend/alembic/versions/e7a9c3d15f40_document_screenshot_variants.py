@@ -0,0 +1,28 @@
+"""document_screenshot_variants
+
+Revision ID: e7a9c3d15f40
+Revises: d2f4b6a8c013
+Create Date: 2026-10-18 19:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a9c3d15f40'
+down_revision: Union[str, Sequence[str], None] = 'd2f4b6a8c013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('screenshot_variants', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'screenshot_variants')
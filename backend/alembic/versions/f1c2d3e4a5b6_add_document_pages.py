@@ -0,0 +1,38 @@
+"""add_document_pages
+
+Revision ID: f1c2d3e4a5b6
+Revises: e7a9c3d15f40
+Create Date: 2026-10-18 20:31:47.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c2d3e4a5b6'
+down_revision: Union[str, Sequence[str], None] = 'e7a9c3d15f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('document_pages',
+    sa.Column('document_id', sa.Integer(), nullable=False),
+    sa.Column('page_number', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('text', sa.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True),
+    sa.Column('char_count', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('document_id', 'page_number')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('document_pages')
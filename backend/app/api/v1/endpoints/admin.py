@@ -1,5 +1,5 @@
 from typing import Any, Dict, List
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, File, UploadFile, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
@@ -32,6 +32,26 @@ async def get_dashboard_stats(
         "revenue": revenue
     }
 
+@router.get("/storage/cache")
+async def get_file_cache_stats(
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Dict[str, Any]:
+    """
+    Hit/miss and size metrics of this worker's disk cache of OSS/S3 objects.
+    """
+    from app.services.file_cache import file_cache
+    return file_cache.stats()
+
+@router.get("/storage/render-cache")
+async def get_render_cache_stats(
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Dict[str, Any]:
+    """
+    Hit/miss and size metrics of this worker's cache of rendered page images.
+    """
+    from app.services.pdf_service import render_cache
+    return render_cache.stats()
+
 # --- User Management ---
 
 @router.get("/users", response_model=List[schemas.User])
@@ -69,8 +89,9 @@ async def update_user(
 
 # --- Document Management ---
 
-@router.post("/upload/batch")
+@router.post("/upload/batch", response_model=schemas.BatchUploadResponse)
 async def batch_upload_documents(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     category_id: int = Form(...),
     db: AsyncSession = Depends(deps.get_db),
@@ -78,37 +99,88 @@ async def batch_upload_documents(
 ) -> Any:
     """
     Batch upload documents.
+    Files are stored concurrently and all documents are created in one transaction.
+    Large files are linearized for the viewer after the response.
     """
-    success_count = 0
-    
-    from app.services.oss import oss_service
-    from app.models.document import DocumentStatus
-    import os
+    from app.services.ingest_service import ingest_service, IngestFile
+    from app.services.linearize_service import linearize_service
 
-    for file in files:
-        try:
-            content = await file.read()
-            # Upload to OSS/Local
-            file_path = oss_service.upload_file(content, file.filename, file.content_type)
-            
-            # Create Document
-            doc_in = schemas.DocumentCreate(
-                title=file.filename,
-                category_id=category_id,
-                file_path=file_path,
-                file_name=file.filename,
-                file_size=len(content),
-                status=DocumentStatus.DRAFT
-            )
-            
-            await crud.document.create_with_tags(db, obj_in=doc_in, created_by=current_user.id)
-            success_count += 1
-        except Exception as e:
-            print(f"Failed to process file {file.filename}: {e}")
-            # Continue with other files
-            continue
+    results = await ingest_service.ingest_batch(
+        db,
+        [IngestFile(file.file, file.filename, file.content_type) for file in files],
+        category_id=category_id,
+        created_by=current_user.id,
+    )
+    success_count = sum(1 for r in results if r["success"])
+    background_tasks.add_task(
+        linearize_service.linearize_documents,
+        [r["document_id"] for r in results if r["success"] and not r["deduplicated"]],
+    )
+    for r in results:
+        if not r["success"]:
+            print(f"Failed to process file {r['file_name']}: {r['error']}")
             
-    return {"success": success_count}
+    return {
+        "total": len(results),
+        "success": success_count,
+        "failed": len(results) - success_count,
+        "results": results
+    }
+
+
+@router.post("/upload/jobs", response_model=schemas.IngestJobResponse, status_code=202)
+async def create_ingest_job(
+    files: List[UploadFile] = File(...),
+    category_id: int = Form(...),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Queue a bulk upload for the ingest worker (`python -m app.worker`).
+    Files are only staged here; poll the returned job for per-file progress.
+    """
+    from app.services.ingest_service import ingest_service, IngestFile
+
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    staged = await ingest_service.stage_files(
+        [IngestFile(file.file, file.filename, file.content_type) for file in files]
+    )
+    try:
+        job = await crud.ingest_job.create_job(
+            db, category_id=category_id, created_by=current_user.id, items=staged
+        )
+    except Exception:
+        await db.rollback()
+        ingest_service.discard_staged([item["staged_path"] for item in staged])
+        raise
+    return job
+
+@router.get("/upload/jobs", response_model=List[schemas.IngestJobResponse])
+async def read_ingest_jobs(
+    db: AsyncSession = Depends(deps.get_db),
+    skip: int = 0,
+    limit: int = 20,
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    List recent ingest jobs, newest first.
+    """
+    return await crud.ingest_job.get_multi_recent(db, skip=skip, limit=limit)
+
+@router.get("/upload/jobs/{job_id}", response_model=schemas.IngestJobDetail)
+async def read_ingest_job(
+    job_id: int,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Get an ingest job with the status of every file.
+    """
+    job = await crud.ingest_job.get_with_items(db, id=job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
 
 
 @router.post("/documents/{document_id}/analyze", response_model=schemas.DocumentResponse)
@@ -116,94 +188,36 @@ async def analyze_document(
     *,
     db: AsyncSession = Depends(deps.get_db),
     document_id: int,
+    force: bool = False,
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Trigger AI analysis and screenshot generation for a document.
+    Only stages whose inputs changed since the last run (file, render settings,
+    AI model or prompt) are redone; `force` reruns all of them.
     """
+    from app.services.analysis_service import analysis_service
+
     document = await crud.document.get(db, id=document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
-        
-    # Get System Settings
-    settings_list = await crud.system_setting.get_multi(db, limit=100)
-    settings = {s.key: s.value for s in settings_list}
-    
-    # Configure AI
-    ai_api_key = settings.get("ai_api_key")
-    ai_base_url = settings.get("ai_base_url")
-    ai_model = settings.get("ai_model", "gpt-3.5-turbo")
-    
-    from app.services.ai_service import ai_service
-    if ai_api_key:
-        ai_service.configure(api_key=ai_api_key, base_url=ai_base_url, model=ai_model)
-        
-    # Screenshot Config
-    # screenshot_pages = int(settings.get("screenshot_pages", 3)) # Not used if indices are prioritized
-    screenshot_indices_str = settings.get("screenshot_indices", "")
-    screenshot_indices = [int(x.strip()) for x in screenshot_indices_str.split(",") if x.strip().isdigit()] if screenshot_indices_str else []
-    
-    # Enforce page 1 (index 0) is always captured
-    final_indices = {0}
-    if screenshot_indices:
-        final_indices.update(screenshot_indices)
-    
-    # Sort indices
-    sorted_indices = sorted(list(final_indices))
     
-    from app.services.pdf_service import pdf_service
-    import os
-    import json
-    
-    # Post-processing
-    # Resolve filesystem path for local processing
-    file_path = document.file_path
-    fs_path = None
-    
-    if file_path.startswith("/static/"):
-        # Local storage
-        fs_path = file_path.lstrip("/") # static/uploads/...
-        if not os.path.exists(fs_path):
-            # Try with current working directory
-            fs_path = os.path.join(os.getcwd(), fs_path)
-    else:
-        # TODO: Handle OSS download if needed
-        pass
+    await analysis_service.analyze(db, document, force=force)
+    return await crud.document.get(db, id=document_id)
 
-    if fs_path and os.path.exists(fs_path):
-        # 1. Screenshots
-        screenshot_dir = "static/screenshots"
-        screenshots = pdf_service.generate_screenshots(
-            fs_path, 
-            screenshot_dir, 
-            page_indices=sorted_indices
-        )
-        
-        doc_update_data = {}
-        
-        if screenshots:
-            # Store all screenshots as JSON
-            # Add /static/ prefix to all
-            all_screenshots = ["/static/" + s for s in screenshots]
-            screenshots_json = json.dumps(all_screenshots)
-            
-            cover_image = all_screenshots[0]
-            doc_update_data["cover_image"] = cover_image
-            doc_update_data["screenshots"] = screenshots_json
-        
-        # 2. AI Summary
-        if ai_api_key:
-            text = pdf_service.extract_text(fs_path)
-            summary = ai_service.generate_summary(text)
-            if summary:
-                doc_update_data["description"] = summary
-                doc_update_data["ai_summary"] = summary # Ensure both fields are updated if schema differs
-        
-        if doc_update_data:
-            doc_update = schemas.DocumentUpdate(**doc_update_data)
-            document = await crud.document.update(db, db_obj=document, obj_in=doc_update)
-    
-    return document
+@router.get("/analysis/stale")
+async def read_stale_analysis(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    How many documents each analysis stage would redo with the current settings,
+    e.g. after changing the preview quality or the AI model.
+    Run `python -m app.reanalyze` to bring them up to date.
+    """
+    from app.services.analysis_service import analysis_service
+
+    return await analysis_service.count_stale(db)
 
 @router.get("/documents", response_model=List[schemas.DocumentResponse])
 async def read_all_documents(
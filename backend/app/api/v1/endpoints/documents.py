@@ -1,13 +1,27 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Query, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from urllib.parse import quote
+import json
+import mimetypes
+import os
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud, models, schemas
 from app.api import deps
+from app.services.ingest_service import ingest_service
+from app.services.linearize_service import linearize_service
 from app.services.oss import oss_service
+from app.services.pdf_service import pdf_service, page_renderer, unpack_page_sizes, PageRenderError, CONTENT_TYPES, QUALITY_SETTINGS
+from app.services.search_index import search_index
+from app.services.upload_session_service import upload_session_service
+from app.models.upload import UploadSession, UploadSessionStatus
+from app.core import security
+from app.core.config import settings
 from app.models.document import DocumentStatus
 from app.models.analytics import Download
 from app.models.membership import MembershipType
-from datetime import datetime
+from datetime import datetime, timedelta
 
 router = APIRouter()
 
@@ -78,40 +92,301 @@ async def delete_category(
     return category
 
 # --- Documents ---
+async def _verified_upload(db: AsyncSession, user: models.User, result: dict) -> dict:
+    """Record an upload the server has checked, so create_document accepts its file_path from `user`."""
+    await crud.verified_upload.record(
+        db,
+        upload=schemas.UploadResult(**result),
+        user_id=user.id,
+        ttl=timedelta(hours=settings.VERIFIED_UPLOAD_TTL_HOURS),
+    )
+    return result
+
 @router.post("/upload")
 async def upload_document(
     file: UploadFile = File(...),
+    db: AsyncSession = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Upload a document file to OSS/Local storage.
-    Returns the file path and metadata.
+    Returns the file path and metadata. Content already in the library is not stored again.
     """
-    content = await file.read()
-    file_path = oss_service.upload_file(content, file.filename, file.content_type)
+    stored = await ingest_service.store(db, file.file, file.filename, file.content_type)
+    # Read while the upload is still a local temp file; the full structure is saved with the document
+    structure = await pdf_service.read_structure_fileobj_async(file.file)
     
-    return {
-        "file_path": file_path,
+    return await _verified_upload(db, current_user, {
+        "file_path": stored.path,
         "file_name": file.filename,
-        "file_size": len(content),
-        "content_type": file.content_type
+        "file_size": stored.size,
+        "content_type": file.content_type,
+        "content_hash": stored.content_hash,
+        "deduplicated": stored.deduplicated,
+        "page_count": structure["page_count"] if structure else None,
+    })
+
+# --- Direct-to-Storage Uploads ---
+
+@router.post("/upload/direct", response_model=schemas.DirectUploadTicket)
+async def create_direct_upload(
+    *,
+    upload_in: schemas.DirectUploadCreate,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Issue a short-lived signed form POST so the browser uploads straight to object storage (OSS/S3).
+    The object key and the size limit are fixed by the signed policy; call /upload/direct/complete afterwards.
+    """
+    file_ref = oss_service.new_ref(upload_in.file_name)
+    expires_in = timedelta(seconds=settings.DIRECT_UPLOAD_EXPIRE_SECONDS)
+    signed = oss_service.sign_upload(file_ref, upload_in.content_type)
+    upload_token = security.create_upload_token(
+        current_user.id, file_ref, upload_in.file_name, expires_delta=expires_in
+    )
+    return {
+        "object_key": oss_service.object_key(file_ref),
+        "upload_url": signed["url"],
+        "method": signed["method"],
+        "fields": signed["fields"],
+        "upload_token": upload_token,
+        "expires_at": datetime.utcnow() + expires_in,
+    }
+
+@router.post("/upload/direct/complete", response_model=schemas.UploadResult)
+async def complete_direct_upload(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    complete_in: schemas.DirectUploadComplete,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Verify a direct upload landed in storage, record its size and checksum for
+    POST /documents/ and return the same metadata as /upload.
+    The server never sees the bytes, so the backend checksum (OSS CRC64) is reported instead of a sha256
+    and the upload does not take part in content-hash deduplication.
+    """
+    payload = security.decode_upload_token(complete_in.upload_token)
+    if not payload or payload.get("sub") != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Invalid upload token")
+    
+    file_ref = payload["key"]
+    meta = await oss_service.head_object_async(file_ref)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Uploaded object not found")
+    if meta["size"] > settings.MAX_UPLOAD_SIZE:
+        await oss_service.delete_file_async(file_ref)
+        raise HTTPException(status_code=400, detail="File too large")
+    
+    return await _verified_upload(db, current_user, {
+        "file_path": file_ref,
+        "file_name": payload["name"],
+        "file_size": meta["size"],
+        "content_type": meta["content_type"],
+        "content_hash": None,
+        "deduplicated": False,
+        "checksum": meta["checksum"],
+    })
+
+# --- Resumable Upload Sessions ---
+
+async def _session_response(session: UploadSession) -> dict:
+    received = await run_in_threadpool(upload_session_service.received_chunks, session)
+    received_set = set(received)
+    return {
+        "id": session.id,
+        "file_name": session.file_name,
+        "file_size": session.file_size,
+        "content_type": session.content_type,
+        "chunk_size": session.chunk_size,
+        "total_chunks": session.total_chunks,
+        "status": session.status,
+        "received_chunks": received,
+        "missing_chunks": [i for i in range(session.total_chunks) if i not in received_set],
+        "received_bytes": sum(session.chunk_length(i) for i in received),
+        "expires_at": session.expires_at,
+    }
+
+def _committed_upload(session: UploadSession, deduplicated: bool) -> dict:
+    return {
+        "file_path": session.file_path,
+        "file_name": session.file_name,
+        "file_size": session.file_size,
+        "content_type": session.content_type,
+        "content_hash": session.content_hash,
+        "deduplicated": deduplicated,
     }
 
+async def _get_upload_session(db: AsyncSession, session_id: str, user: models.User) -> UploadSession:
+    session = await crud.upload_session.get(db, id=session_id)
+    if not session or session.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.status == UploadSessionStatus.ACTIVE and session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Upload session expired")
+    return session
+
+@router.post("/upload/sessions", response_model=schemas.UploadSessionResponse)
+async def create_upload_session(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    session_in: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Start a resumable upload. Send the file as numbered chunks, then commit.
+    """
+    chunk_size = session_in.chunk_size or settings.UPLOAD_SESSION_CHUNK_SIZE
+    if not 0 < chunk_size <= settings.UPLOAD_SESSION_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail="Invalid chunk size")
+    # Chunks are staged on local disk: bound them like every other upload path
+    if session_in.file_size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    # Opportunistically drop staged chunks of abandoned sessions
+    for expired in await crud.upload_session.get_expired(db):
+        await run_in_threadpool(upload_session_service.discard, expired)
+        await db.delete(expired)
+    
+    session = await crud.upload_session.create_session(
+        db,
+        obj_in=session_in,
+        user_id=current_user.id,
+        chunk_size=chunk_size,
+        ttl=timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS),
+    )
+    return await _session_response(session)
+
+@router.get("/upload/sessions/{session_id}", response_model=schemas.UploadSessionResponse)
+async def read_upload_session(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    session_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Report which chunks have been received, so a client can resume.
+    """
+    session = await _get_upload_session(db, session_id, current_user)
+    return await _session_response(session)
+
+@router.put("/upload/sessions/{session_id}/chunks/{index}", response_model=schemas.UploadSessionResponse)
+async def upload_session_chunk(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    session_id: str,
+    index: int,
+    request: Request,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Upload chunk `index` as the raw request body. Re-sending a chunk replaces it.
+    """
+    session = await _get_upload_session(db, session_id, current_user)
+    if session.status != UploadSessionStatus.ACTIVE:
+        raise HTTPException(status_code=409, detail="Upload session already committed")
+    content_length = request.headers.get("content-length")
+    await upload_session_service.write_chunk(
+        session, index, request.stream(), int(content_length) if content_length and content_length.isdigit() else None
+    )
+    return await _session_response(session)
+
+@router.post("/upload/sessions/{session_id}/commit", response_model=schemas.UploadResult)
+async def commit_upload_session(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    session_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Assemble the received chunks into storage.
+    Returns the same metadata as /upload; committing again returns it unchanged.
+    """
+    session = await _get_upload_session(db, session_id, current_user)
+    if session.status != UploadSessionStatus.ACTIVE:
+        # A retried commit: its upload was recorded the first time, so one file backs one document
+        return _committed_upload(session, deduplicated=False)
+    
+    missing = (await _session_response(session))["missing_chunks"]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing chunks: {missing[:20]}")
+    
+    reader = upload_session_service.open_reader(session)
+    try:
+        stored = await ingest_service.store(db, reader, session.file_name, session.content_type)
+    finally:
+        reader.close()
+    
+    if not await crud.upload_session.mark_committed(
+        db, session=session, file_path=stored.path, content_hash=stored.content_hash
+    ):
+        # A concurrent commit of the same session won and recorded the upload
+        return _committed_upload(session, deduplicated=False)
+    await run_in_threadpool(upload_session_service.discard, session)
+    return await _verified_upload(db, current_user, _committed_upload(session, stored.deduplicated))
+
 @router.post("/", response_model=schemas.DocumentResponse)
 async def create_document(
     *,
     db: AsyncSession = Depends(deps.get_db),
     document_in: schemas.DocumentCreate,
+    background_tasks: BackgroundTasks,
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new document.
+    file_path must come from one of the caller's uploads (/upload, an upload
+    session or a completed direct upload); each upload makes one document.
+    Page count, page sizes and outline are read from the stored file after the
+    response, unless a document with the same content already has them; then
+    large files get a linearized copy for the viewer.
     """
+    upload = await crud.verified_upload.get_for_user(db, file_path=document_in.file_path, user_id=current_user.id)
+    if not upload:
+        raise HTTPException(status_code=400, detail="Unknown file: upload it first")
+    # Size and hash as the server verified them; content_hash decides which stored object later uploads reuse
+    document_in.file_size = upload.file_size
+    document_in.content_hash = upload.content_hash
+    # Committed together with the document
+    await db.delete(upload)
     document = await crud.document.create_with_tags(
         db, obj_in=document_in, created_by=current_user.id
     )
+    if document.structure_extracted_at is None:
+        background_tasks.add_task(pdf_service.store_structure, document.id)
+    background_tasks.add_task(linearize_service.linearize_documents, [document.id])
     return document
 
+def _check_read_access(document: models.Document, current_user: Optional[models.User]) -> None:
+    # Check permissions if not published
+    if document.status != DocumentStatus.PUBLISHED:
+        if not current_user:
+             raise HTTPException(status_code=404, detail="Document not found")
+        # Allow owner or admin
+        if document.created_by != current_user.id and not current_user.role in [models.UserRole.ADMIN, models.UserRole.SUPER_ADMIN]:
+             raise HTTPException(status_code=404, detail="Document not found")
+
+def _download_url(document: models.Document) -> str:
+    """URL the client follows to fetch the file as an attachment."""
+    if oss_service.local_path(document.file_path) is None:
+        return oss_service.get_download_url(document.file_path, document.file_name)
+    token = security.create_file_token(
+        document.id, expires_delta=timedelta(seconds=settings.DOWNLOAD_LINK_EXPIRE_SECONDS)
+    )
+    return f"{settings.API_V1_PREFIX}/documents/{document.id}/content?token={token}"
+
+def _view_url(document: models.Document) -> str:
+    """URL the viewer loads inline: the linearized copy when there is one."""
+    file_ref = document.view_file_path or document.file_path
+    if oss_service.local_path(file_ref) is None:
+        return oss_service.get_download_url(file_ref, ttl=settings.VIEW_LINK_EXPIRE_SECONDS)
+    token = security.create_file_token(
+        document.id, expires_delta=timedelta(seconds=settings.VIEW_LINK_EXPIRE_SECONDS), view=True
+    )
+    return f"{settings.API_V1_PREFIX}/documents/{document.id}/content?token={token}"
+
+def _content_disposition(disposition: str, filename: str) -> str:
+    return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
 @router.get("/{id}/download", response_model=schemas.DocumentDownloadUrl)
 async def download_document(
     *,
@@ -158,7 +433,25 @@ async def download_document(
     
     await db.commit()
     
-    return {"url": document.file_path}
+    return {"url": _download_url(document)}
+
+@router.get("/{id}/view", response_model=schemas.DocumentDownloadUrl)
+async def view_document(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    id: int,
+    current_user: Optional[models.User] = Depends(deps.get_current_user_optional),
+) -> Any:
+    """
+    Short-lived URL for the online viewer. Anyone who can read the document
+    may view it; the original file as an attachment goes through /download
+    and its quota.
+    """
+    document = await crud.document.get(db, id=id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    _check_read_access(document, current_user)
+    return {"url": _view_url(document)}
 
 @router.get("/", response_model=List[schemas.DocumentResponse])
 async def read_documents(
@@ -167,17 +460,42 @@ async def read_documents(
     limit: int = 100,
     category_id: Optional[int] = None,
     status: Optional[DocumentStatus] = DocumentStatus.PUBLISHED, # Default to published for public
+    q: Optional[str] = Query(None, max_length=200, description="Match title, description and AI summary"),
     current_user: Optional[models.User] = Depends(deps.get_current_user_optional) # Optional auth
 ) -> Any:
     """
-    Retrieve documents.
+    Retrieve documents. With `q`, only documents whose title, description or
+    summary contain every word are returned, most relevant first.
     """
     # If admin/author, might want to see drafts. For now simplified.
     documents = await crud.document.get_multi_with_filters(
-        db, skip=skip, limit=limit, category_id=category_id, status=status
+        db, skip=skip, limit=limit, category_id=category_id, status=status, q=q
     )
     return documents
 
+@router.get("/search", response_model=schemas.DocumentSearchResponse)
+async def search_documents(
+    db: AsyncSession = Depends(deps.get_db),
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+) -> Any:
+    """
+    Search published documents by title, description, summary and page text.
+    Results are ranked by BM25; each carries the first page containing the
+    query and a snippet of it, when the match is in the page text.
+    """
+    await search_index.refresh(db)
+    total, hits = search_index.search(q, offset=skip, limit=limit)
+    documents = await crud.document.get_many(db, [hit.document_id for hit in hits])
+    snippets = await search_index.snippets(db, q, [document.id for document in documents])
+    scores = {hit.document_id: hit.score for hit in hits}
+    items = []
+    for document in documents:
+        page, snippet = snippets.get(document.id, (None, None))
+        items.append({"document": document, "score": scores[document.id], "page": page, "snippet": snippet})
+    return {"total": total, "items": items}
+
 @router.get("/{id}", response_model=schemas.DocumentResponse)
 async def read_document(
     *,
@@ -192,16 +510,152 @@ async def read_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Check permissions if not published
-    if document.status != DocumentStatus.PUBLISHED:
-        if not current_user:
-             raise HTTPException(status_code=404, detail="Document not found")
-        # Allow owner or admin
-        if document.created_by != current_user.id and not current_user.role in [models.UserRole.ADMIN, models.UserRole.SUPER_ADMIN]:
-             raise HTTPException(status_code=404, detail="Document not found")
-             
+    _check_read_access(document, current_user)
     return document
 
+@router.get("/{id}/structure", response_model=schemas.DocumentStructureResponse)
+async def read_document_structure(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    id: int,
+    current_user: Optional[models.User] = Depends(deps.get_current_user_optional)
+) -> Any:
+    """
+    Page sizes, outline and info dictionary of a document, for laying out the
+    viewer before any page is fetched. Empty until the structure has been read.
+    """
+    document = await crud.document.get(db, id=id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    _check_read_access(document, current_user)
+    return {
+        "page_count": document.page_count,
+        "page_sizes": [list(size) for size in unpack_page_sizes(document.page_sizes)],
+        "outline": json.loads(document.outline) if document.outline else [],
+        "pdf_info": json.loads(document.pdf_info) if document.pdf_info else {},
+        "is_linearized": document.is_linearized,
+    }
+
+@router.get("/{id}/pages/{page}")
+async def read_document_page(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    id: int,
+    page: int,
+    size: str = "detail",
+    format: Optional[str] = None,
+    current_user: Optional[models.User] = Depends(deps.get_current_user_optional)
+) -> Any:
+    """
+    One page (1-based) as a preview image, rendered on first request and cached.
+    `size` is a preview width name (thumb, card, detail); without `format` the
+    client gets WebP if its Accept header allows it, otherwise JPEG.
+    """
+    if size not in settings.PREVIEW_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"Unknown size, expected one of: {', '.join(settings.PREVIEW_WIDTHS)}")
+    if format is None:
+        format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+    elif format not in QUALITY_SETTINGS:
+        raise HTTPException(status_code=400, detail="Unknown format, expected webp or jpg")
+    
+    document = await crud.document.get(db, id=id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    _check_read_access(document, current_user)
+    if page < 1 or (document.page_count and page > document.page_count):
+        raise HTTPException(status_code=404, detail="Page not found")
+    
+    setting = await crud.system_setting.get(db, id=QUALITY_SETTINGS[format])
+    quality = pdf_service.preview_quality({setting.key: setting.value} if setting else {})[format]
+    
+    # Same file, page, size and encoding: same bytes
+    version = document.content_hash or f"{document.id}-{document.file_size}"
+    etag = f'"{version[:32]}-{page}-{settings.PREVIEW_WIDTHS[size]}-q{quality}.{format}"'
+    visibility = "public" if document.status == DocumentStatus.PUBLISHED else "private"
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"{visibility}, max-age={settings.PAGE_PREVIEW_MAX_AGE}",
+        "Vary": "Accept",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        data = await page_renderer.render(document.file_path, document.content_hash, page, size, format, quality)
+    except PageRenderError:
+        # Not a 404: the page exists, and the next request renders it again
+        raise HTTPException(status_code=500, detail="Page could not be rendered")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return Response(content=data, media_type=CONTENT_TYPES[format], headers=headers)
+
+@router.get("/{id}/content")
+async def read_document_content(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    id: int,
+    token: Optional[str] = None,
+) -> Any:
+    """
+    Serve the document file to the bearer of a signed `token` link: from
+    /download the original as an attachment, from /view the viewer copy
+    (linearized when there is one) inline. Both endpoints check access first.
+    Python never streams the body: local files are handed to nginx through
+    X-Accel-Redirect (which serves byte ranges), OSS/S3 objects redirect to a signed URL.
+    """
+    document = await crud.document.get(db, id=id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    payload = security.decode_file_token(token) if token else None
+    if not payload or payload.get("doc") != document.id:
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+    disposition = "inline" if payload.get("view") else "attachment"
+    
+    file_ref = document.file_path
+    if disposition == "inline" and document.view_file_path:
+        file_ref = document.view_file_path
+    
+    fs_path = oss_service.local_path(file_ref)
+    if fs_path is None:
+        filename = document.file_name if disposition == "attachment" else None
+        return RedirectResponse(oss_service.get_download_url(file_ref, filename), status_code=307)
+    
+    try:
+        stat = os.stat(fs_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # Stored files never change in place, so the content hash (or size + mtime) is a strong validator
+    if document.content_hash:
+        etag = f'"{document.content_hash}-lin"' if file_ref != document.file_path else f'"{document.content_hash}"'
+    else:
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": _content_disposition(disposition, document.file_name),
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+    
+    media_type = mimetypes.guess_type(document.file_name)[0] or "application/pdf"
+    if settings.LOCAL_DOWNLOAD_ACCEL_PREFIX:
+        object_key = oss_service.object_key(file_ref)
+        headers["X-Accel-Redirect"] = settings.LOCAL_DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + quote(object_key)
+        return Response(headers=headers, media_type=media_type)
+    
+    return FileResponse(fs_path, headers=headers, media_type=media_type)
+
 # --- Secure Download ---
 
 @router.get("/download-token/{token}")
@@ -268,5 +722,5 @@ async def use_download_token(
     # db_token.is_used = True
     # await db.commit()
     
-    return {"url": doc.file_path}
+    return {"url": _download_url(doc)}
 
@@ -0,0 +1,99 @@
+"""
+Read page count, page sizes, info dictionary and outline of documents uploaded
+before structure extraction existed.
+
+    python -m app.backfill_structure
+    python -m app.backfill_structure --concurrency 8 --batch-size 500
+    python -m app.backfill_structure --force     # re-read every document
+
+Documents are processed in id order, --batch-size at a time. Within a batch,
+files are read in parallel by the render pool (at most --concurrency at once,
+each distinct content only once) and the results are written with one bulk
+UPDATE per batch and committed, so an interrupted run can simply be started
+again. Documents whose file cannot be read are logged and left for the next run.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.future import select
+
+from app.crud.crud_document import STRUCTURE_FIELDS
+from app.db.session import SessionLocal
+from app.models.document import Document
+from app.services.file_cache import file_cache
+from app.services.pdf_service import pdf_service
+from app.services.render_engine import render_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def read_one(file_path: str, content_hash: Optional[str], semaphore: asyncio.Semaphore) -> Optional[dict]:
+    async with semaphore:
+        try:
+            async with file_cache.local_copy(file_path, content_hash) as path:
+                return await pdf_service.read_structure_async(path)
+        except Exception as e:
+            logger.error(f"Could not fetch {file_path}: {e}")
+            return None
+
+async def process_batch(db, rows: List[tuple], semaphore: asyncio.Semaphore) -> int:
+    # Deduplicated documents share their file: read each one once
+    files: Dict[str, tuple] = {}
+    for doc_id, file_path, content_hash in rows:
+        files.setdefault(content_hash or file_path, (file_path, content_hash))
+    keys = list(files)
+    structures = dict(zip(keys, await asyncio.gather(*(read_one(*files[key], semaphore) for key in keys))))
+
+    now = datetime.utcnow()
+    params = []
+    for doc_id, file_path, content_hash in rows:
+        structure = structures[content_hash or file_path]
+        if structure:
+            params.append({"doc_id": doc_id, "extracted_at": now, **{f"new_{f}": structure[f] for f in STRUCTURE_FIELDS}})
+    if params:
+        table = Document.__table__
+        # Core executemany: one round trip per batch, not per row
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("doc_id"))
+            .values(structure_extracted_at=bindparam("extracted_at"), **{f: bindparam(f"new_{f}") for f in STRUCTURE_FIELDS}),
+            params,
+        )
+        await db.commit()
+    return len(params)
+
+async def main(args: argparse.Namespace) -> None:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    done = failed = 0
+    last_id = 0
+    try:
+        async with SessionLocal() as db:
+            while True:
+                query = select(Document.id, Document.file_path, Document.content_hash).filter(Document.id > last_id)
+                if not args.force:
+                    query = query.filter(Document.structure_extracted_at.is_(None))
+                rows = (await db.execute(query.order_by(Document.id).limit(args.batch_size))).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                stored = await process_batch(db, [tuple(row) for row in rows], semaphore)
+                done += stored
+                failed += len(rows) - stored
+                logger.info(f"Structure: {done} documents done, {failed} failed (up to id {last_id})")
+    finally:
+        render_engine.shutdown()
+    logger.info(f"Done: read the structure of {done} documents, {failed} failed")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Read page count, page sizes and outline of existing documents")
+    parser.add_argument("--batch-size", type=int, default=200, help="Documents per bulk update and commit")
+    parser.add_argument("--concurrency", type=int, default=4, help="Files read at the same time")
+    parser.add_argument("--force", action="store_true", help="Also re-read documents that already have a structure")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 from functools import lru_cache
 
 class Settings(BaseSettings):
@@ -20,12 +20,129 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
     
+    # Storage backend for new files: "local", "oss" or "s3".
+    # Empty picks oss when OSS credentials are set, otherwise local.
+    STORAGE_BACKEND: str = ""
+    LOCAL_STORAGE_ROOT: str = "static/uploads"
+    # Hash-prefix directory levels for local uploads and screenshots ("ab/cd/<file>")
+    LOCAL_SHARD_LEVELS: int = 2
+    # Keep-alive connections per backend client; covers STORAGE_IO_WORKERS x OSS_UPLOAD_WORKERS
+    STORAGE_POOL_SIZE: int = 32
+
     # OSS
     OSS_ACCESS_KEY_ID: Optional[str] = ""
     OSS_ACCESS_KEY_SECRET: Optional[str] = ""
     OSS_ENDPOINT: Optional[str] = ""
     OSS_BUCKET_NAME: Optional[str] = ""
     OSS_BUCKET_DOMAIN: Optional[str] = ""
+    OSS_SIGNED_URL_TTL: int = 300 # Seconds a download URL stays valid (at least)
+    OSS_SIGNED_URL_CACHE_SIZE: int = 10000
+
+    # S3-compatible storage (AWS S3, MinIO); requires boto3
+    S3_ENDPOINT_URL: Optional[str] = "" # e.g. http://minio:9000, empty for AWS
+    S3_REGION: Optional[str] = ""
+    S3_ACCESS_KEY_ID: Optional[str] = ""
+    S3_SECRET_ACCESS_KEY: Optional[str] = ""
+    S3_BUCKET_NAME: Optional[str] = ""
+
+    # Uploads are streamed in chunks so memory stays flat regardless of file size
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    OSS_PART_SIZE: int = 8 * 1024 * 1024
+    OSS_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+    OSS_UPLOAD_WORKERS: int = 4
+    OSS_PART_RETRIES: int = 3
+    # Threads per worker process for blocking storage I/O (oss2 calls, local disk writes)
+    STORAGE_IO_WORKERS: int = 8
+    # Files of one batch upload that are hashed/uploaded at the same time
+    BATCH_UPLOAD_CONCURRENCY: int = 4
+
+    # Read-through disk cache of OSS/S3 objects for the analysis pipeline
+    FILE_CACHE_DIR: str = "tmp/file_cache"
+    FILE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    # Past FILE_CACHE_MAX_BYTES, evict down to this share of it; the directory is walked
+    # again (to count other processes' downloads) at most every FILE_CACHE_RESYNC_SECONDS
+    FILE_CACHE_LOW_WATERMARK: float = 0.9
+    FILE_CACHE_RESYNC_SECONDS: float = 300
+
+    # PDF rendering runs in a process pool; 0 = one process per available core
+    RENDER_WORKERS: int = 0
+    RENDER_JOB_TIMEOUT: float = 60
+    # Address space per render worker (MB) so one huge or malformed PDF cannot exhaust
+    # the host; 0 = unlimited. Ignored where the resource module is missing (Windows)
+    RENDER_WORKER_MAX_MEMORY_MB: int = 2048
+    # Preview image widths (px) rendered per page; each in WebP and progressive JPEG.
+    # Default qualities, overridable by the preview_webp_quality / preview_jpeg_quality settings
+    PREVIEW_WIDTHS: Dict[str, int] = {"thumb": 240, "card": 480, "detail": 1200}
+    PREVIEW_WEBP_QUALITY: int = 80
+    PREVIEW_JPEG_QUALITY: int = 82
+    # Rendered page images keyed by (content hash, page, size, format, quality), kept in a
+    # storage backend: "render_cache" (local RENDER_CACHE_DIR) or "oss"/"s3" under
+    # RENDER_CACHE_PREFIX. Empty disables the cache.
+    RENDER_CACHE_BACKEND: str = "render_cache"
+    RENDER_CACHE_DIR: str = "tmp/render_cache"
+    RENDER_CACHE_PREFIX: str = "render-cache/"
+    RENDER_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    # Past RENDER_CACHE_MAX_BYTES, evict down to this share of it; the backend is listed
+    # again (to count other processes' objects) at most every RENDER_CACHE_RESYNC_SECONDS
+    RENDER_CACHE_LOW_WATERMARK: float = 0.9
+    RENDER_CACHE_RESYNC_SECONDS: float = 300
+    # GET /documents/{id}/pages/{n}: renders at once per worker process, browser cache lifetime
+    PAGE_RENDER_CONCURRENCY: int = 2
+    PAGE_PREVIEW_MAX_AGE: int = 365 * 24 * 3600
+    # Full-text extraction into document_pages: pages per pool job, batches of one document
+    # extracted at the same time (0 = one per render worker), soft limit per page,
+    # characters kept per page
+    TEXT_BATCH_PAGES: int = 50
+    TEXT_PARALLEL_BATCHES: int = 0
+    TEXT_PAGE_TIMEOUT: float = 10
+    TEXT_MAX_PAGE_CHARS: int = 100000
+    # In-process search index (GET /documents/search): seconds between incremental refreshes,
+    # page text indexed per document, cached result pages
+    SEARCH_REFRESH_SECONDS: float = 10
+    SEARCH_MAX_DOC_CHARS: int = 50000
+    SEARCH_CACHE_SIZE: int = 256
+    # Queries on frequent terms score at most this many of their likeliest matches (totals stay exact)
+    SEARCH_MAX_CANDIDATES: int = 1024
+    # Build the index when a worker starts rather than on its first search
+    SEARCH_WARMUP: bool = True
+    # Structural metadata read at upload time (page count, page sizes, info, outline):
+    # pool job limit, outline entries kept
+    STRUCTURE_TIMEOUT: float = 30
+    STRUCTURE_MAX_OUTLINE: int = 2000
+    # Linearize ("fast web view") uploads for the viewer with pikepdf, or the qpdf binary
+    # if pikepdf is not installed; smaller files load fast enough as they are
+    LINEARIZE_ENABLED: bool = True
+    LINEARIZE_MIN_BYTES: int = 4 * 1024 * 1024
+    LINEARIZE_TIMEOUT: float = 600
+    QPDF_BINARY: str = "qpdf"
+
+    # Background ingestion: web workers stage files here, `python -m app.worker` stores them
+    INGEST_STAGING_DIR: str = "tmp/ingest"
+    INGEST_WORKER_BATCH_SIZE: int = 20
+    INGEST_WORKER_POLL_SECONDS: float = 2.0
+    INGEST_ITEM_TIMEOUT_MINUTES: int = 30
+    INGEST_MAX_ATTEMPTS: int = 3
+
+    # Resumable upload sessions: chunks are staged here until commit
+    UPLOAD_SESSION_DIR: str = "tmp/upload_sessions"
+    UPLOAD_SESSION_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_SESSION_MAX_CHUNK_SIZE: int = 64 * 1024 * 1024
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    # Hours an upload can be turned into a document (POST /documents/) before it must be sent again
+    VERIFIED_UPLOAD_TTL_HOURS: int = 24
+
+    # Browser-to-OSS uploads through signed POST policies (bucket CORS must allow POST)
+    DIRECT_UPLOAD_EXPIRE_SECONDS: int = 900
+    MAX_UPLOAD_SIZE: int = 1024 * 1024 * 1024
+
+    # Local files are served by nginx after the API authorizes the request.
+    # Set to the internal nginx location (e.g. "/protected/uploads/") to emit
+    # X-Accel-Redirect; empty streams the file from Python (dev only).
+    LOCAL_DOWNLOAD_ACCEL_PREFIX: str = ""
+    DOWNLOAD_LINK_EXPIRE_SECONDS: int = 300
+    # Viewer links (GET /documents/{id}/view) outlive download links: pdf.js keeps
+    # fetching byte ranges while the reader pages through
+    VIEW_LINK_EXPIRE_SECONDS: int = 3600
 
     class Config:
         env_file = ".env"
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional
-from jose import jwt
+from jose import jwt, JWTError
 from passlib.context import CryptContext
 from app.core.config import settings
 
@@ -21,6 +21,40 @@ def create_access_token(
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_upload_token(
+    subject: Union[str, Any], object_key: str, file_name: str, expires_delta: timedelta
+) -> str:
+    """Sign the object key issued for a direct-to-storage upload so completion can trust it."""
+    expire = datetime.utcnow() + expires_delta
+    to_encode = {"exp": expire, "sub": str(subject), "key": object_key, "name": file_name, "typ": "upload"}
+    return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_upload_token(token: str) -> Optional[dict]:
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("typ") != "upload":
+        return None
+    return payload
+
+def create_file_token(document_id: int, expires_delta: timedelta, view: bool = False) -> str:
+    """Short-lived link that lets the bearer fetch one document's file as an attachment, or with `view` its viewer copy inline."""
+    expire = datetime.utcnow() + expires_delta
+    to_encode = {"exp": expire, "doc": document_id, "typ": "file"}
+    if view:
+        to_encode["view"] = True
+    return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_file_token(token: str) -> Optional[dict]:
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("typ") != "file":
+        return None
+    return payload
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
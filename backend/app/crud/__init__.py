@@ -1,7 +1,11 @@
 from .crud_user import user
 from .crud_document import document, category, tag
+from .crud_document_page import document_page
 from .crud_membership import membership, redeem_code
 from .crud_analytics import download
 from .crud_system_setting import system_setting
 from .crud_token import download_token
+from .crud_upload_session import upload_session
+from .crud_verified_upload import verified_upload
+from .crud_ingest import ingest_job
 
@@ -1,4 +1,9 @@
-from typing import List, Optional, Union, Dict, Any
+import json
+import re
+from datetime import datetime
+from typing import List, Optional, Union, Dict, Any, Iterable
+from sqlalchemy import and_, or_, update
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -7,6 +12,20 @@ from app.crud.base import CRUDBase
 from app.models.document import Document, Category, Tag, DocumentStatus
 from app.schemas.document import DocumentCreate, DocumentUpdate, CategoryCreate, CategoryUpdate, TagCreate
 
+# Characters with a meaning in MySQL boolean-mode FULLTEXT syntax
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+# Default innodb ngram_token_size; shorter terms never match the index
+NGRAM_TOKEN_SIZE = 2
+
+
+def split_search_terms(q: str) -> List[str]:
+    return _BOOLEAN_OPERATORS.sub(" ", q).split()
+
+
+# Columns filled by pdf_service.read_structure
+STRUCTURE_FIELDS = ("page_count", "page_sizes", "pdf_info", "outline", "is_linearized")
+
+
 class CRUDCategory(CRUDBase[Category, CategoryCreate, CategoryUpdate]):
     async def get_multi_by_parent(self, db: AsyncSession, *, parent_id: Optional[int] = None, skip: int = 0, limit: int = 100) -> List[Category]:
         query = select(Category).filter(Category.parent_id == parent_id).offset(skip).limit(limit)
@@ -20,8 +39,9 @@ class CRUDTag(CRUDBase[Tag, TagCreate, TagCreate]): # TagUpdate same as Create f
         return result.scalars().first()
 
 class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
-    async def create_with_tags(self, db: AsyncSession, *, obj_in: DocumentCreate, created_by: int) -> Document:
-        db_obj = Document(
+    @staticmethod
+    def _build(obj_in: DocumentCreate, created_by: int) -> Document:
+        return Document(
             title=obj_in.title,
             description=obj_in.description,
             category_id=obj_in.category_id,
@@ -30,9 +50,19 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
             file_size=obj_in.file_size,
             page_count=obj_in.page_count,
             cover_image=obj_in.cover_image,
+            content_hash=obj_in.content_hash,
             status=obj_in.status,
             created_by=created_by
         )
+
+    async def create_with_tags(self, db: AsyncSession, *, obj_in: DocumentCreate, created_by: int) -> Document:
+        db_obj = self._build(obj_in, created_by)
+        
+        if obj_in.content_hash:
+            # Same file already in the library: share its analysis instead of redoing it
+            source = await self.get_by_content_hash(db, content_hash=obj_in.content_hash)
+            if source:
+                self.copy_analysis(source, db_obj)
         
         if obj_in.tag_ids:
             query = select(Tag).filter(Tag.id.in_(obj_in.tag_ids))
@@ -49,6 +79,88 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         result = await db.execute(query)
         return result.scalars().first()
 
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[DocumentCreate],
+        created_by: int,
+        commit: bool = True,
+        structures: Optional[Dict[str, dict]] = None,
+    ) -> List[Document]:
+        """
+        Insert many documents in one transaction, without tags and without the
+        per-row refresh/eager-load round trips of create_with_tags.
+        With commit=False the rows are only flushed, so the caller can commit
+        them together with its own bookkeeping. `structures` maps content hashes
+        to read_structure results for content not in the library yet.
+        """
+        hashes = {obj_in.content_hash for obj_in in objs_in if obj_in.content_hash}
+        sources = await self.get_by_content_hashes(db, content_hashes=hashes)
+        db_objs = []
+        for obj_in in objs_in:
+            db_obj = self._build(obj_in, created_by)
+            source = sources.get(obj_in.content_hash)
+            if source:
+                self.copy_analysis(source, db_obj)
+            structure = (structures or {}).get(obj_in.content_hash)
+            if structure and db_obj.structure_extracted_at is None:
+                self.apply_structure(db_obj, structure)
+            db_objs.append(db_obj)
+        db.add_all(db_objs)
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
+        return db_objs
+
+    @staticmethod
+    def apply_structure(target: Document, structure: dict) -> None:
+        for field in STRUCTURE_FIELDS:
+            setattr(target, field, structure[field])
+        target.structure_extracted_at = datetime.utcnow()
+
+    async def get_by_content_hashes(self, db: AsyncSession, *, content_hashes: Iterable[str]) -> Dict[str, Document]:
+        content_hashes = list(content_hashes)
+        if not content_hashes:
+            return {}
+        query = (
+            select(Document)
+            .filter(Document.content_hash.in_(content_hashes))
+            .order_by(Document.screenshots.is_(None), Document.id)
+        )
+        result = await db.execute(query)
+        found: Dict[str, Document] = {}
+        for doc in result.scalars().all():
+            found.setdefault(doc.content_hash, doc)
+        return found
+
+    async def get_by_content_hash(
+        self, db: AsyncSession, *, content_hash: str, exclude_id: Optional[int] = None
+    ) -> Optional[Document]:
+        # Prefer a copy that has already been analyzed
+        query = select(Document).filter(Document.content_hash == content_hash)
+        if exclude_id:
+            query = query.filter(Document.id != exclude_id)
+        query = query.order_by(Document.screenshots.is_(None), Document.id).limit(1)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    @staticmethod
+    def copy_analysis(source: Document, target: Document) -> None:
+        target.page_count = target.page_count or source.page_count
+        target.cover_image = target.cover_image or source.cover_image
+        target.screenshots = target.screenshots or source.screenshots
+        target.screenshot_variants = target.screenshot_variants or source.screenshot_variants
+        target.ai_summary = target.ai_summary or source.ai_summary
+        target.analysis_fingerprints = target.analysis_fingerprints or source.analysis_fingerprints
+        target.view_file_path = target.view_file_path or source.view_file_path
+        if target.structure_extracted_at is None and source.structure_extracted_at is not None:
+            for field in STRUCTURE_FIELDS + ("structure_extracted_at",):
+                setattr(target, field, getattr(source, field))
+        if not target.description and source.ai_summary:
+            target.description = source.ai_summary
+
     async def get_multi_with_filters(
         self, 
         db: AsyncSession, 
@@ -56,7 +168,8 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         skip: int = 0, 
         limit: int = 100,
         category_id: Optional[int] = None,
-        status: Optional[DocumentStatus] = None
+        status: Optional[DocumentStatus] = None,
+        q: Optional[str] = None
     ) -> List[Document]:
         query = select(Document).options(selectinload(Document.category), selectinload(Document.tags))
         
@@ -65,32 +178,141 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         
         if status:
             query = query.filter(Document.status == status)
-            
-        query = query.order_by(Document.created_at.desc()).offset(skip).limit(limit)
+
+        relevance = None
+        if q:
+            query, relevance = self._filter_text(query, q, db.get_bind().dialect.name)
+
+        if relevance is not None:
+            query = query.order_by(relevance.desc(), Document.created_at.desc())
+        else:
+            query = query.order_by(Document.created_at.desc())
+        query = query.offset(skip).limit(limit)
         
         result = await db.execute(query)
         return result.scalars().all()
 
+    @staticmethod
+    def _filter_text(query, q: str, dialect: str):
+        """
+        Restrict `query` to documents whose title, description or summary contain
+        every term of `q`. On MySQL the ngram FULLTEXT index does the work and the
+        MATCH score is returned for ordering; terms shorter than an ngram, and other
+        databases (SQLite in tests), fall back to LIKE.
+        """
+        columns = (Document.title, Document.description, Document.ai_summary)
+        terms = split_search_terms(q)
+        if dialect == "mysql":
+            indexed = [term for term in terms if len(term) >= NGRAM_TOKEN_SIZE]
+            terms = [term for term in terms if len(term) < NGRAM_TOKEN_SIZE]
+        else:
+            indexed = []
+
+        relevance = None
+        if indexed:
+            # +"term": every term required, each matched as a phrase of ngrams
+            against = " ".join(f'+"{term}"' for term in indexed)
+            relevance = match(*columns, against=against).in_boolean_mode()
+            query = query.filter(relevance)
+        if terms:
+            query = query.filter(and_(*(
+                or_(*(column.contains(term, autoescape=True) for column in columns)) for term in terms
+            )))
+        return query, relevance
+
+    async def touch(self, db: AsyncSession, *, id: int) -> None:
+        """Bump updated_at without loading the row; the caller commits."""
+        await db.execute(update(Document).where(Document.id == id).values(updated_at=datetime.utcnow()))
+
+    async def get_many(self, db: AsyncSession, ids: List[int]) -> List[Document]:
+        """Documents by id with relationships loaded, in the order of `ids`."""
+        if not ids:
+            return []
+        query = select(Document).options(selectinload(Document.category), selectinload(Document.tags)).filter(Document.id.in_(ids))
+        result = await db.execute(query)
+        by_id = {document.id: document for document in result.scalars().all()}
+        return [by_id[id] for id in ids if id in by_id]
+
     async def get(self, db: AsyncSession, id: Any) -> Optional[Document]:
         # Override to eager load relationships
         query = select(Document).options(selectinload(Document.category), selectinload(Document.tags)).filter(Document.id == id)
         result = await db.execute(query)
         return result.scalars().first()
 
+    @staticmethod
+    def variant_paths(screenshot_variants: Optional[str]) -> List[str]:
+        """Every image path in a screenshot_variants JSON string."""
+        if not screenshot_variants:
+            return []
+        try:
+            entries = json.loads(screenshot_variants)
+        except ValueError:
+            return []
+        paths = []
+        for entry in entries:
+            for size, variant in entry.items():
+                if isinstance(variant, dict):
+                    paths.extend(v for k, v in variant.items() if k not in ("width", "height"))
+        return paths
+
+    @staticmethod
+    def stored_files(document: Document) -> List[str]:
+        """Storage references a document points at: the file, its linearized copy and its rendered page images."""
+        refs = [document.file_path]
+        if document.view_file_path:
+            refs.append(document.view_file_path)
+        if document.screenshots:
+            try:
+                refs.extend(json.loads(document.screenshots))
+            except ValueError:
+                pass
+        refs.extend(CRUDDocument.variant_paths(document.screenshot_variants))
+        # Only covers we rendered; an admin may have set an external URL
+        if document.cover_image and document.cover_image.startswith("/static/screenshots/"):
+            refs.append(document.cover_image)
+        return list(dict.fromkeys(refs))
+
+    async def is_shared(self, db: AsyncSession, document: Document) -> bool:
+        """Whether another document uses the same stored file (dedup) and therefore its images."""
+        query = select(Document.id).filter(Document.id != document.id)
+        if document.content_hash:
+            query = query.filter(or_(Document.content_hash == document.content_hash, Document.file_path == document.file_path))
+        else:
+            query = query.filter(Document.file_path == document.file_path)
+        result = await db.execute(query.limit(1))
+        return result.first() is not None
+
     async def remove(self, db: AsyncSession, *, id: int) -> Document:
         # Manually delete dependent records to avoid Foreign Key constraints
         from app.models.analytics import Download, ReadingHistory
         from app.models.token import DownloadToken
+        from app.models.document import DocumentPage
+        from app.services.oss import oss_service
         from sqlalchemy import delete
         
+        result = await db.execute(select(Document).filter(Document.id == id))
+        obj = result.scalars().first()
+        orphaned = [] if await self.is_shared(db, obj) else self.stored_files(obj)
+        
         # DownloadToken
         await db.execute(delete(DownloadToken).where(DownloadToken.document_id == id))
         # Download
         await db.execute(delete(Download).where(Download.document_id == id))
         # ReadingHistory
         await db.execute(delete(ReadingHistory).where(ReadingHistory.document_id == id))
+        # Extracted page text
+        await db.execute(delete(DocumentPage).where(DocumentPage.document_id == id))
+        
+        await db.delete(obj)
+        await db.commit()
         
-        return await super().remove(db, id=id)
+        # Only after the commit: a rolled back delete must not lose files.
+        # Anything left behind here is picked up by `python -m app.storage_gc`.
+        if orphaned:
+            failed = await oss_service.delete_files_async(orphaned)
+            if failed:
+                print(f"Could not delete files of document {id}: {failed}")
+        return obj
 
 document = CRUDDocument(Document)
 category = CRUDCategory(Category)
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import Integer, delete, func, insert, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.crud.base import CRUDBase
+from app.models.document import DocumentPage
+from app.schemas.document import DocumentPageResponse
+
+# (page_number, text, error) as produced by PDFService.iter_page_text
+PageText = Tuple[int, str, Optional[str]]
+
+class CRUDDocumentPage(CRUDBase[DocumentPage, DocumentPageResponse, DocumentPageResponse]):
+    async def clear(self, db: AsyncSession, *, document_id: int) -> None:
+        await db.execute(delete(DocumentPage).where(DocumentPage.document_id == document_id))
+
+    async def bulk_insert(self, db: AsyncSession, *, document_id: int, pages: List[PageText]) -> None:
+        """One multi-row INSERT per batch; the caller commits."""
+        if not pages:
+            return
+        now = datetime.utcnow()
+        await db.execute(
+            insert(DocumentPage.__table__),
+            [
+                {
+                    "document_id": document_id,
+                    "page_number": page_number,
+                    "text": text,
+                    "char_count": len(text),
+                    "error": error,
+                    "created_at": now,
+                }
+                for page_number, text, error in pages
+            ],
+        )
+
+    async def copy(self, db: AsyncSession, *, source_id: int, target_id: int) -> None:
+        """Give a duplicate document the pages of the original (INSERT ... SELECT, no round trip)."""
+        columns = ["document_id", "page_number", "text", "char_count", "error", "created_at"]
+        source = select(
+            literal(target_id, Integer), DocumentPage.page_number, DocumentPage.text,
+            DocumentPage.char_count, DocumentPage.error, DocumentPage.created_at,
+        ).filter(DocumentPage.document_id == source_id)
+        await db.execute(insert(DocumentPage.__table__).from_select(columns, source))
+
+    async def count(self, db: AsyncSession, *, document_id: int) -> int:
+        result = await db.execute(select(func.count()).select_from(DocumentPage).filter(DocumentPage.document_id == document_id))
+        return result.scalar_one()
+
+    async def get_text(self, db: AsyncSession, *, document_id: int, max_pages: Optional[int] = None) -> str:
+        """Stored text of the first `max_pages` pages (all by default), one page per paragraph."""
+        query = (
+            select(DocumentPage.text)
+            .filter(DocumentPage.document_id == document_id)
+            .order_by(DocumentPage.page_number)
+        )
+        if max_pages:
+            query = query.limit(max_pages)
+        result = await db.execute(query)
+        return "\n".join(text or "" for text in result.scalars().all())
+
+document_page = CRUDDocumentPage(DocumentPage)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.crud.base import CRUDBase
+from app.models.ingest import IngestJob, IngestJobItem, IngestJobStatus, IngestItemStatus
+from app.schemas.ingest import IngestJobResponse
+
+class CRUDIngestJob(CRUDBase[IngestJob, IngestJobResponse, IngestJobResponse]):
+    async def create_job(
+        self, db: AsyncSession, *, category_id: int, created_by: int, items: List[dict]
+    ) -> IngestJob:
+        """Persist a job and its staged files in one transaction."""
+        job = IngestJob(category_id=category_id, created_by=created_by, total=len(items))
+        job.items = [IngestJobItem(**item) for item in items]
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+    async def get_with_items(self, db: AsyncSession, id: int) -> Optional[IngestJob]:
+        query = select(IngestJob).options(selectinload(IngestJob.items)).filter(IngestJob.id == id)
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    async def get_multi_recent(self, db: AsyncSession, *, skip: int = 0, limit: int = 20) -> List[IngestJob]:
+        query = select(IngestJob).order_by(IngestJob.id.desc()).offset(skip).limit(limit)
+        result = await db.execute(query)
+        return result.scalars().all()
+
+    async def claim_items(self, db: AsyncSession, *, limit: int) -> List[IngestJobItem]:
+        """
+        Atomically take up to `limit` pending items for this worker.
+        SKIP LOCKED lets several worker processes poll the same table without
+        blocking each other or claiming the same row.
+        """
+        query = (
+            select(IngestJobItem)
+            .filter(IngestJobItem.status == IngestItemStatus.PENDING)
+            .order_by(IngestJobItem.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(query)
+        items = result.scalars().all()
+        if not items:
+            await db.commit()
+            return []
+        
+        now = datetime.utcnow()
+        for item in items:
+            item.status = IngestItemStatus.PROCESSING
+            item.attempts = (item.attempts or 0) + 1
+            item.updated_at = now
+        job_ids = {item.job_id for item in items}
+        await db.execute(
+            update(IngestJob)
+            .where(IngestJob.id.in_(job_ids), IngestJob.status == IngestJobStatus.PENDING)
+            .values(status=IngestJobStatus.RUNNING, started_at=now)
+        )
+        await db.commit()
+        return items
+
+    async def requeue_stale(self, db: AsyncSession, *, older_than: timedelta, max_attempts: int) -> int:
+        """Hand items left PROCESSING by a crashed worker back to the queue (or fail them)."""
+        cutoff = datetime.utcnow() - older_than
+        stale = (IngestJobItem.status == IngestItemStatus.PROCESSING) & (IngestJobItem.updated_at < cutoff)
+        requeued = await db.execute(
+            update(IngestJobItem)
+            .where(stale, IngestJobItem.attempts < max_attempts)
+            .values(status=IngestItemStatus.PENDING)
+        )
+        await db.execute(
+            update(IngestJobItem)
+            .where(stale, IngestJobItem.attempts >= max_attempts)
+            .values(status=IngestItemStatus.FAILED, error="Worker did not finish this file")
+        )
+        await db.commit()
+        return requeued.rowcount
+
+    async def refresh_progress(self, db: AsyncSession, *, job_id: int) -> None:
+        """Recompute job counters from its items; safe with several workers on one job."""
+        query = (
+            select(IngestJobItem.status, func.count(IngestJobItem.id))
+            .filter(IngestJobItem.job_id == job_id)
+            .group_by(IngestJobItem.status)
+        )
+        result = await db.execute(query)
+        counts = {status: count for status, count in result.all()}
+        values = {
+            "succeeded": counts.get(IngestItemStatus.SUCCEEDED, 0),
+            "failed": counts.get(IngestItemStatus.FAILED, 0),
+        }
+        if not counts.get(IngestItemStatus.PENDING) and not counts.get(IngestItemStatus.PROCESSING):
+            values["status"] = IngestJobStatus.COMPLETED
+            values["finished_at"] = datetime.utcnow()
+        await db.execute(update(IngestJob).where(IngestJob.id == job_id).values(**values))
+        await db.commit()
+
+ingest_job = CRUDIngestJob(IngestJob)
@@ -0,0 +1,48 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.crud.base import CRUDBase
+from app.models.upload import UploadSession, UploadSessionStatus
+from app.schemas.upload import UploadSessionCreate
+
+class CRUDUploadSession(CRUDBase[UploadSession, UploadSessionCreate, UploadSessionCreate]):
+    async def create_session(
+        self, db: AsyncSession, *, obj_in: UploadSessionCreate, user_id: int, chunk_size: int, ttl: timedelta
+    ) -> UploadSession:
+        db_obj = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            file_name=obj_in.file_name,
+            content_type=obj_in.content_type,
+            file_size=obj_in.file_size,
+            chunk_size=chunk_size,
+            expires_at=datetime.utcnow() + ttl,
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def mark_committed(
+        self, db: AsyncSession, *, session: UploadSession, file_path: str, content_hash: str
+    ) -> bool:
+        """Move an ACTIVE session to COMMITTED. False if another commit of it got there first."""
+        committed = await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == session.id, UploadSession.status == UploadSessionStatus.ACTIVE)
+            .values(status=UploadSessionStatus.COMMITTED, file_path=file_path, content_hash=content_hash)
+        )
+        await db.commit()
+        await db.refresh(session)
+        return committed.rowcount == 1
+
+    async def get_expired(self, db: AsyncSession, *, limit: int = 100) -> List[UploadSession]:
+        query = select(UploadSession).filter(UploadSession.expires_at < datetime.utcnow()).limit(limit)
+        result = await db.execute(query)
+        return result.scalars().all()
+
+upload_session = CRUDUploadSession(UploadSession)
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.crud.base import CRUDBase
+from app.models.upload import VerifiedUpload
+from app.schemas.upload import UploadResult
+
+class CRUDVerifiedUpload(CRUDBase[VerifiedUpload, UploadResult, UploadResult]):
+    async def record(self, db: AsyncSession, *, upload: UploadResult, user_id: int, ttl: timedelta) -> VerifiedUpload:
+        """Remember that `user_id` uploaded `upload`; recording the same file again extends its expiry."""
+        await db.execute(delete(VerifiedUpload).filter(VerifiedUpload.expires_at < datetime.utcnow()))
+        db_obj = await self.get_for_user(db, file_path=upload.file_path, user_id=user_id)
+        if db_obj is None:
+            db_obj = VerifiedUpload(user_id=user_id, file_path=upload.file_path)
+            db.add(db_obj)
+        db_obj.file_name = upload.file_name
+        db_obj.file_size = upload.file_size
+        db_obj.content_type = upload.content_type
+        db_obj.content_hash = upload.content_hash
+        db_obj.checksum = upload.checksum
+        db_obj.expires_at = datetime.utcnow() + ttl
+        await db.commit()
+        return db_obj
+
+    async def get_for_user(self, db: AsyncSession, *, file_path: str, user_id: int) -> Optional[VerifiedUpload]:
+        query = (
+            select(VerifiedUpload)
+            .filter(
+                VerifiedUpload.file_path == file_path,
+                VerifiedUpload.user_id == user_id,
+                VerifiedUpload.expires_at >= datetime.utcnow(),
+            )
+            .limit(1)
+        )
+        result = await db.execute(query)
+        return result.scalars().first()
+
+verified_upload = CRUDVerifiedUpload(VerifiedUpload)
@@ -7,3 +7,5 @@ from app.models.membership import Membership, RedeemCode, Redemption, Order  # n
 from app.models.analytics import Download, ReadingHistory  # noqa
 from app.models.system import SystemSetting  # noqa
 from app.models.token import DownloadToken  # noqa
+from app.models.upload import UploadSession  # noqa
+from app.models.ingest import IngestJob, IngestJobItem  # noqa
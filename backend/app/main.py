@@ -22,9 +22,21 @@ app.add_middleware(
 
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
-# Mount static files for local development
-os.makedirs("static", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount public preview images for local development.
+# Uploaded documents are not mounted: they are served by /documents/{id}/content after an access check.
+os.makedirs("static/screenshots", exist_ok=True)
+app.mount("/static/screenshots", StaticFiles(directory="static/screenshots"), name="screenshots")
+
+@app.on_event("startup")
+async def warm_up_search_index():
+    if settings.SEARCH_WARMUP:
+        from app.services.search_index import search_index
+        search_index.warm_up()
+
+@app.on_event("shutdown")
+def shutdown_render_engine():
+    from app.services.render_engine import render_engine
+    render_engine.shutdown()
 
 @app.get("/")
 async def root():
@@ -1,4 +1,6 @@
 from .user import User, UserRole, UserStatus
-from .document import Document, Category, Tag, DocumentStatus
+from .document import Document, DocumentPage, Category, Tag, DocumentStatus
 from .membership import Membership, MembershipType, RedeemCode, Redemption, Order, OrderStatus
 from .analytics import Download, ReadingHistory
+from .upload import UploadSession, UploadSessionStatus, VerifiedUpload
+from .ingest import IngestJob, IngestJobItem, IngestJobStatus, IngestItemStatus
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey, Text, BigInteger, Table
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey, Text, BigInteger, Table, Index, LargeBinary
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship, backref
 from datetime import datetime
 import enum
@@ -47,20 +48,38 @@ class Tag(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Backs the `q` filter on the document list; ngram handles Chinese text without word breaks
+        Index(
+            "ft_documents_title_description_summary", "title", "description", "ai_summary",
+            mysql_prefix="FULLTEXT", mysql_with_parser="ngram",
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
     description = Column(Text, nullable=True)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     cover_image = Column(String(500), nullable=True)
-    file_path = Column(String(500), nullable=False) # OSS path
+    file_path = Column(String(500), nullable=False) # Storage reference, e.g. "oss:2026/10/<uuid>.pdf"
+    view_file_path = Column(String(500), nullable=True) # Linearized copy served to the viewer; file_path stays the original upload
     file_name = Column(String(255), nullable=False)
     file_size = Column(BigInteger, nullable=False)
     page_count = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True) # sha256 of the file, used for dedup
     
     # New fields for AI and Screenshots
     ai_summary = Column(Text, nullable=True)
     screenshots = Column(Text, nullable=True) # JSON string of list of paths
+    screenshot_variants = Column(Text, nullable=True) # JSON: per page, each preview size in webp/jpg
+    analysis_fingerprints = Column(Text, nullable=True) # JSON: {stage: hash of the inputs its current output was made from}
+
+    # Structure read once at upload time, without rendering
+    page_sizes = Column(LargeBinary().with_variant(mysql.MEDIUMBLOB(), "mysql"), nullable=True) # packed float32 (width, height) in points per page
+    pdf_info = Column(Text, nullable=True) # JSON: document info dictionary (Title, Author, ...)
+    outline = Column(Text().with_variant(mysql.MEDIUMTEXT(), "mysql"), nullable=True) # JSON: [[level, title, page], ...]
+    is_linearized = Column(Boolean, nullable=True)
+    structure_extracted_at = Column(DateTime, nullable=True)
     
     view_count = Column(Integer, default=0)
     download_count = Column(Integer, default=0)
@@ -76,3 +95,15 @@ class Document(Base):
     tags = relationship("Tag", secondary=document_tags, back_populates="documents")
     downloads = relationship("Download", back_populates="document")
     reading_history = relationship("ReadingHistory", back_populates="document")
+
+class DocumentPage(Base):
+    """Extracted text of one page, written in bulk by PDFService.store_page_text."""
+    __tablename__ = "document_pages"
+    
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True, autoincrement=False) # 1-based
+    # TEXT caps at 64 KB in MySQL, a dense CJK page can exceed it
+    text = Column(Text().with_variant(mysql.MEDIUMTEXT(), "mysql"), nullable=True)
+    char_count = Column(Integer, default=0)
+    error = Column(String(255), nullable=True) # Why the page has no text, e.g. "timeout"
+    created_at = Column(DateTime, default=datetime.utcnow)
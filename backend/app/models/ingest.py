@@ -0,0 +1,53 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey, Text, BigInteger
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import enum
+
+from app.db.base_class import Base
+
+class IngestJobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+
+class IngestItemStatus(str, enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    created_by = Column(Integer, nullable=False)
+    status = Column(Enum(IngestJobStatus), default=IngestJobStatus.PENDING, index=True)
+    total = Column(Integer, default=0)
+    succeeded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    # Relationships
+    items = relationship("IngestJobItem", back_populates="job", order_by="IngestJobItem.id")
+
+class IngestJobItem(Base):
+    __tablename__ = "ingest_job_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("ingest_jobs.id"), nullable=False, index=True)
+    file_name = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    staged_path = Column(String(500), nullable=False) # Local file shared with the worker
+    file_size = Column(BigInteger, nullable=False)
+    status = Column(Enum(IngestItemStatus), default=IngestItemStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    document_id = Column(Integer, nullable=True)
+    deduplicated = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    job = relationship("IngestJob", back_populates="items")
@@ -0,0 +1,57 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, BigInteger
+from datetime import datetime
+import enum
+
+from app.db.base_class import Base
+
+class UploadSessionStatus(str, enum.Enum):
+    ACTIVE = "active"
+    COMMITTED = "committed"
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String(32), primary_key=True, index=True) # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    file_name = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    file_size = Column(BigInteger, nullable=False) # Declared total size
+    chunk_size = Column(Integer, nullable=False)
+    status = Column(Enum(UploadSessionStatus), default=UploadSessionStatus.ACTIVE, index=True)
+    
+    # Filled in on commit
+    file_path = Column(String(500), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    @property
+    def total_chunks(self) -> int:
+        return max(1, -(-self.file_size // self.chunk_size))
+
+    def chunk_length(self, index: int) -> int:
+        if index == self.total_chunks - 1:
+            return self.file_size - index * self.chunk_size
+        return self.chunk_size
+
+
+class VerifiedUpload(Base):
+    """
+    A stored file whose size and checksum the server checked after a user
+    uploaded it. create_document only accepts file paths recorded here for the
+    caller, so a document cannot point at an object the user never uploaded.
+    """
+    __tablename__ = "verified_uploads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    file_path = Column(String(500), nullable=False, index=True)
+    file_name = Column(String(255), nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    content_hash = Column(String(64), nullable=True) # sha256, when the bytes passed through the server
+    checksum = Column(String(100), nullable=True) # Storage-side checksum of direct uploads
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,98 @@
+"""
+Bring the analysis of every document up to date with the current settings.
+
+    python -m app.reanalyze --dry-run              # what would run, per stage
+    python -m app.reanalyze                        # only stages whose inputs changed
+    python -m app.reanalyze --stage screenshots    # e.g. after changing the preview quality
+    python -m app.reanalyze --force --stage text   # redo a stage everywhere
+    python -m app.reanalyze --adopt                # stamp results made before fingerprints existed
+
+A stage is stale when the fingerprint of its inputs (file, render settings, AI
+model and prompt; see app.services.analysis_service) differs from the one its
+stored result was made with, so a settings change only redoes the stages that
+read it. Documents are processed one at a time in id order and each one is
+committed as it finishes, so an interrupted run can simply be started again.
+
+--adopt is for libraries analyzed before fingerprints were recorded: instead of
+redoing everything once, it records the current fingerprints for the stages
+whose results already exist, treating them as made with the current settings.
+"""
+import argparse
+import asyncio
+import logging
+from collections import Counter
+
+from app import crud
+from app.db.session import SessionLocal
+from app.services.analysis_service import analysis_service, load_fingerprints, STAGES
+from app.services.render_engine import render_engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def adopt(db, document, options, stages) -> list:
+    """Record current fingerprints for existing results; returns the stages stamped."""
+    current = analysis_service.fingerprints(document, options)
+    done = load_fingerprints(document)
+    exists = {
+        "screenshots": bool(document.screenshot_variants or document.screenshots),
+        "text": await crud.document_page.count(db, document_id=document.id) > 0,
+        "summary": bool(document.ai_summary),
+    }
+    stamped = [stage for stage in stages if exists[stage] and stage not in done]
+    if stamped:
+        done.update({stage: current[stage] for stage in stamped})
+        analysis_service.save_fingerprints(document, done)
+        await db.commit()
+    return stamped
+
+async def main(args: argparse.Namespace) -> None:
+    counts = Counter()
+    processed = 0
+    try:
+        async with SessionLocal() as scan, SessionLocal() as db:
+            options = await analysis_service.load_options(db)
+            if args.stage and "summary" in args.stage and not options.ai_api_key:
+                logger.warning("No AI API key configured: the summary stage is skipped")
+            pending = analysis_service.iter_pending(scan, options, stages=args.stage, force=args.force)
+            async for document_id, todo in pending:
+                if args.limit and processed >= args.limit:
+                    break
+                processed += 1
+                if args.dry_run:
+                    counts.update(todo)
+                    logger.info(f"[dry-run] document {document_id}: {todo}")
+                    continue
+                document = await crud.document.get(db, id=document_id)
+                if not document:
+                    continue
+                try:
+                    if args.adopt:
+                        ran = await adopt(db, document, options, todo)
+                    else:
+                        ran = await analysis_service.analyze(db, document, options, force=args.force, stages=todo)
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"Document {document_id}: analysis failed: {e}")
+                    continue
+                finally:
+                    # One document's rows at a time
+                    db.expunge_all()
+                counts.update(ran)
+                logger.info(f"Document {document_id}: {ran or 'nothing done'}")
+    finally:
+        render_engine.shutdown()
+    verb = "would run" if args.dry_run else ("stamped" if args.adopt else "ran")
+    logger.info(f"Done: {processed} documents, {verb} " + ", ".join(f"{stage} {counts[stage]}" for stage in STAGES))
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Redo the analysis stages whose inputs changed")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="Only this stage (repeatable). Default: all")
+    parser.add_argument("--force", action="store_true", help="Run the stages even where they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would run")
+    parser.add_argument("--adopt", action="store_true", help="Record fingerprints for existing results instead of recomputing them")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many documents (0 = all)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -3,12 +3,17 @@ from .user import User, UserCreate, UserUpdate, UserInDB
 from .document import (
     DocumentCreate, DocumentUpdate, DocumentResponse, 
     CategoryCreate, CategoryUpdate, CategoryResponse,
-    TagCreate, TagResponse, DocumentDownloadUrl
+    TagCreate, TagResponse, DocumentDownloadUrl, DocumentPageResponse, DocumentStructureResponse,
+    DocumentSearchHit, DocumentSearchResponse
 )
 from .membership import (
     Membership, MembershipCreate, MembershipUpdate,
     RedeemCode, RedeemCodeCreate, RedeemCodeUpdate, RedeemRequest
 )
 from .analytics import DownloadStats, ReadingStats
-from .system import SystemSetting, SystemSettingCreate, SystemSettingUpdate, BatchUploadResponse
-
+from .system import SystemSetting, SystemSettingCreate, SystemSettingUpdate, BatchUploadItem, BatchUploadResponse
+from .upload import (
+    UploadSessionCreate, UploadSessionResponse, UploadResult,
+    DirectUploadCreate, DirectUploadTicket, DirectUploadComplete
+)
+from .ingest import IngestJobResponse, IngestJobDetail, IngestJobItemResponse
@@ -55,6 +55,7 @@ class DocumentCreate(DocumentBase):
     file_name: str
     file_size: int
     page_count: Optional[int] = None
+    content_hash: Optional[str] = None
     cover_image: Optional[str] = None
     tag_ids: Optional[List[int]] = []
 
@@ -67,6 +68,7 @@ class DocumentUpdate(BaseModel):
     cover_image: Optional[str] = None
     tag_ids: Optional[List[int]] = None
     screenshots: Optional[str] = None # JSON string
+    screenshot_variants: Optional[str] = None # JSON string
 
 class DocumentResponse(DocumentBase):
     id: int
@@ -74,6 +76,7 @@ class DocumentResponse(DocumentBase):
     file_name: str
     file_size: int
     page_count: Optional[int]
+    content_hash: Optional[str] = None
     view_count: int
     download_count: int
     created_by: int
@@ -82,6 +85,9 @@ class DocumentResponse(DocumentBase):
     published_at: Optional[datetime]
     cover_image: Optional[str]
     screenshots: Optional[List[str]] = []
+    screenshot_variants: Optional[List[dict]] = []
+    is_linearized: Optional[bool] = None
+    pdf_info: Optional[dict] = None
     category: Optional[CategoryResponse]
     tags: List[TagResponse] = []
 
@@ -100,7 +106,7 @@ class DocumentResponse(DocumentBase):
         # Let's use validator for compatibility or field_validator for v2
         return super().model_validate(obj, *args, **kwargs)
     
-    @field_validator('screenshots', mode='before')
+    @field_validator('screenshots', 'screenshot_variants', mode='before')
     def parse_screenshots(cls, v):
         if v is None:
             return []
@@ -111,3 +117,40 @@ class DocumentResponse(DocumentBase):
             except:
                 return []
         return v
+
+    @field_validator('pdf_info', mode='before')
+    def parse_pdf_info(cls, v):
+        if isinstance(v, str):
+            try:
+                import json
+                return json.loads(v)
+            except ValueError:
+                return None
+        return v
+
+class DocumentStructureResponse(BaseModel):
+    page_count: Optional[int] = None
+    page_sizes: List[List[float]] = [] # [width, height] in points, per page
+    outline: List[list] = [] # [level, title, page]; page is None for entries without a target
+    pdf_info: dict = {}
+    is_linearized: Optional[bool] = None
+
+class DocumentPageResponse(BaseModel):
+    document_id: int
+    page_number: int
+    text: Optional[str] = None
+    char_count: int = 0
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class DocumentSearchHit(BaseModel):
+    document: DocumentResponse
+    score: float
+    page: Optional[int] = None # first page containing the query, if any
+    snippet: Optional[str] = None
+
+class DocumentSearchResponse(BaseModel):
+    total: int
+    items: List[DocumentSearchHit]
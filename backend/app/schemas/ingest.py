@@ -0,0 +1,36 @@
+from typing import Optional, List
+from datetime import datetime
+from pydantic import BaseModel
+from app.models.ingest import IngestJobStatus, IngestItemStatus
+
+class IngestJobItemResponse(BaseModel):
+    id: int
+    file_name: str
+    file_size: int
+    status: IngestItemStatus
+    attempts: int
+    error: Optional[str] = None
+    document_id: Optional[int] = None
+    deduplicated: bool = False
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class IngestJobResponse(BaseModel):
+    id: int
+    category_id: Optional[int] = None
+    created_by: int
+    status: IngestJobStatus
+    total: int
+    succeeded: int
+    failed: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class IngestJobDetail(IngestJobResponse):
+    items: List[IngestJobItemResponse] = []
@@ -20,9 +20,16 @@ class SystemSetting(SystemSettingBase):
     class Config:
         from_attributes = True
 
+class BatchUploadItem(BaseModel):
+    file_name: str
+    success: bool
+    document_id: Optional[int] = None
+    error: Optional[str] = None
+    deduplicated: bool = False
+
 class BatchUploadResponse(BaseModel):
     total: int
     success: int
     failed: int
-    results: List[dict]
+    results: List[BatchUploadItem]
 
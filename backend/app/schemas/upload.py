@@ -0,0 +1,50 @@
+from typing import Dict, Optional, List
+from datetime import datetime
+from pydantic import BaseModel, Field
+from app.models.upload import UploadSessionStatus
+
+class UploadSessionCreate(BaseModel):
+    file_name: str
+    file_size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+    chunk_size: Optional[int] = None # Defaults to UPLOAD_SESSION_CHUNK_SIZE
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    file_name: str
+    file_size: int
+    content_type: Optional[str] = None
+    chunk_size: int
+    total_chunks: int
+    status: UploadSessionStatus
+    # Chunk i covers bytes [i * chunk_size, min((i + 1) * chunk_size, file_size))
+    received_chunks: List[int] = []
+    missing_chunks: List[int] = []
+    received_bytes: int = 0
+    expires_at: datetime
+
+class UploadResult(BaseModel):
+    file_path: str
+    file_name: str
+    file_size: int
+    content_type: Optional[str] = None
+    content_hash: Optional[str] = None
+    deduplicated: bool = False
+    checksum: Optional[str] = None # Storage-side checksum, e.g. "crc64ecma:<value>"
+    page_count: Optional[int] = None
+
+class DirectUploadCreate(BaseModel):
+    file_name: str
+    content_type: Optional[str] = None
+
+class DirectUploadTicket(BaseModel):
+    object_key: str
+    upload_url: str
+    method: str
+    # Form fields to send before the file (a multipart/form-data POST)
+    fields: Dict[str, str] = {}
+    upload_token: str # Pass to /upload/direct/complete
+    expires_at: datetime
+
+class DirectUploadComplete(BaseModel):
+    upload_token: str
@@ -4,6 +4,11 @@ from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a helpful assistant that summarizes documents."
+DEFAULT_PROMPT = "Please analyze the following book content and provide a concise summary and key takeaways:"
+# Characters of document text sent with the prompt
+MAX_INPUT_CHARS = 10000
+
 class AIService:
     def __init__(self):
         self.client = None
@@ -16,28 +21,28 @@ class AIService:
         if api_key:
             self.client = OpenAI(api_key=api_key, base_url=base_url)
 
-    def generate_summary(self, text: str, prompt_template: str = None) -> str:
+    def generate_summary(self, text: str, prompt_template: str = None) -> Optional[str]:
+        """Summary of `text`, or None if the model is not configured or the call failed."""
         if not self.client:
             logger.warning("AI client not configured")
-            return "AI Summary not available (Configuration missing)."
+            return None
             
         if not text.strip():
             return "No text content to analyze."
 
         try:
-            default_prompt = "Please analyze the following book content and provide a concise summary and key takeaways:"
-            prompt = f"{prompt_template or default_prompt}\n\n{text[:10000]}" # Limit context
+            prompt = f"{prompt_template or DEFAULT_PROMPT}\n\n{text[:MAX_INPUT_CHARS]}" # Limit context
             
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes documents."},
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ]
             )
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"AI Generation failed: {e}")
-            return f"AI Generation failed: {str(e)}"
+            return None
 
 ai_service = AIService()
@@ -0,0 +1,306 @@
+"""
+Incremental document analysis: screenshots, page text and AI summary.
+
+Each stage has a fingerprint, a hash of everything its output depends on:
+
+- screenshots: file digest, page indices, preview widths, formats and qualities
+- text: file digest and the per-page character limit
+- summary: the text fingerprint, AI endpoint, model and prompt
+
+The fingerprint of a stage's current output is stored in
+Document.analysis_fingerprints. A stage runs only when its fingerprint has
+changed (or `force` is set), so changing a setting re-runs just the stages
+that read it, for every document analyzed again afterwards, and
+`python -m app.reanalyze` applies it across the library. When another document
+with the same content already has an up-to-date result for a stage, that
+result is copied instead of being computed again.
+
+Bump STAGE_VERSIONS when a stage's code starts producing different output.
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import crud, schemas
+from app.core.config import settings
+from app.models.document import Document
+from app.services.ai_service import ai_service, DEFAULT_PROMPT, SYSTEM_PROMPT, MAX_INPUT_CHARS
+from app.services.file_cache import file_cache
+from app.services.linearize_service import linearize_service
+from app.services.pdf_service import pdf_service
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("screenshots", "text", "summary")
+STAGE_VERSIONS = {"screenshots": 1, "text": 1, "summary": 1}
+# Pages of text the summary is generated from
+SUMMARY_PAGES = 5
+SCREENSHOT_DIR = "static/screenshots"
+
+
+@dataclass
+class AnalysisOptions:
+    """The system settings analysis reads, parsed once per run."""
+    page_indices: List[int]
+    preview_quality: Dict[str, int]
+    ai_api_key: Optional[str] = None
+    ai_base_url: Optional[str] = None
+    ai_model: str = "gpt-3.5-turbo"
+    ai_prompt: Optional[str] = None
+
+    @classmethod
+    def from_settings(cls, system_settings: Dict[str, str]) -> "AnalysisOptions":
+        indices_str = system_settings.get("screenshot_indices", "")
+        indices = [int(x.strip()) for x in indices_str.split(",") if x.strip().isdigit()] if indices_str else []
+        return cls(
+            # Page 1 (index 0) is always captured
+            page_indices=sorted({0, *indices}),
+            # Preview encoding quality (1-100); unset keeps the configured defaults
+            preview_quality=pdf_service.preview_quality(system_settings),
+            ai_api_key=system_settings.get("ai_api_key") or None,
+            ai_base_url=system_settings.get("ai_base_url") or None,
+            ai_model=system_settings.get("ai_model") or "gpt-3.5-turbo",
+            ai_prompt=system_settings.get("ai_prompt") or None,
+        )
+
+
+def _digest(inputs: dict) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_fingerprints(document: Document) -> Dict[str, str]:
+    if not document.analysis_fingerprints:
+        return {}
+    try:
+        return json.loads(document.analysis_fingerprints)
+    except ValueError:
+        return {}
+
+
+class AnalysisService:
+    @staticmethod
+    async def load_options(db: AsyncSession) -> AnalysisOptions:
+        settings_list = await crud.system_setting.get_multi(db, limit=1000)
+        return AnalysisOptions.from_settings({s.key: s.value for s in settings_list})
+
+    @staticmethod
+    def fingerprints(document: Document, options: AnalysisOptions) -> Dict[str, Optional[str]]:
+        """Current fingerprint of every stage; None for a stage that cannot run (no AI key)."""
+        # Stored files never change in place: the content hash, or the reference itself
+        file_digest = document.content_hash or f"{document.file_path}:{document.file_size}"
+        screenshots = _digest({
+            "v": STAGE_VERSIONS["screenshots"],
+            "file": file_digest,
+            "pages": options.page_indices,
+            "widths": settings.PREVIEW_WIDTHS,
+            "quality": options.preview_quality,
+        })
+        text = _digest({
+            "v": STAGE_VERSIONS["text"],
+            "file": file_digest,
+            "max_chars": settings.TEXT_MAX_PAGE_CHARS,
+        })
+        summary = None
+        if options.ai_api_key:
+            summary = _digest({
+                "v": STAGE_VERSIONS["summary"],
+                "text": text,
+                "pages": SUMMARY_PAGES,
+                "base_url": options.ai_base_url,
+                "model": options.ai_model,
+                "system": SYSTEM_PROMPT,
+                "prompt": options.ai_prompt or DEFAULT_PROMPT,
+                "max_chars": MAX_INPUT_CHARS,
+            })
+        return {"screenshots": screenshots, "text": text, "summary": summary}
+
+    def stale_stages(self, document: Document, options: AnalysisOptions, current: Dict[str, Optional[str]] = None) -> List[str]:
+        """Stages whose stored fingerprint differs from the current one (and that can run)."""
+        current = current or self.fingerprints(document, options)
+        stored = load_fingerprints(document)
+        return [stage for stage in STAGES if current[stage] and stored.get(stage) != current[stage]]
+
+    async def iter_pending(
+        self,
+        db: AsyncSession,
+        options: AnalysisOptions,
+        *,
+        stages: List[str] = None,
+        force: bool = False,
+        batch_size: int = 500,
+    ) -> AsyncIterator[Tuple[int, List[str]]]:
+        """(document id, stages to run) for every document with work left, in id order."""
+        columns = (Document.id, Document.file_path, Document.file_size, Document.content_hash, Document.analysis_fingerprints)
+        last_id = 0
+        while True:
+            # Plain rows: nothing is loaded into the session the caller analyzes with
+            query = select(*columns).filter(Document.id > last_id).order_by(Document.id).limit(batch_size)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            for row in rows:
+                document = Document(**row._asdict())
+                current = self.fingerprints(document, options)
+                todo = [s for s in STAGES if current[s]] if force else self.stale_stages(document, options, current)
+                if stages is not None:
+                    todo = [s for s in todo if s in stages]
+                if todo:
+                    yield row.id, todo
+
+    async def count_stale(self, db: AsyncSession) -> dict:
+        """Documents per stage that the current settings would analyze again."""
+        options = await self.load_options(db)
+        stale = {stage: 0 for stage in STAGES}
+        documents = 0
+        async for _, todo in self.iter_pending(db, options):
+            documents += 1
+            for stage in todo:
+                stale[stage] += 1
+        return {"documents": documents, "stages": stale, "summary_enabled": bool(options.ai_api_key)}
+
+    @staticmethod
+    def save_fingerprints(document: Document, fingerprints: Dict[str, str]) -> None:
+        document.analysis_fingerprints = json.dumps(fingerprints, sort_keys=True)
+
+    async def _copy_from_duplicate(
+        self, db: AsyncSession, document: Document, stages: List[str], current: Dict[str, Optional[str]], done: Dict[str, str]
+    ) -> List[str]:
+        """Copy stage results from a document with the same content and the same fingerprints; returns the stages left."""
+        if not document.content_hash:
+            return stages
+        source = await crud.document.get_by_content_hash(db, content_hash=document.content_hash, exclude_id=document.id)
+        if not source:
+            return stages
+        source_done = load_fingerprints(source)
+        left = []
+        for stage in stages:
+            if source_done.get(stage) != current[stage]:
+                left.append(stage)
+                continue
+            if stage == "screenshots":
+                document.cover_image = source.cover_image
+                document.screenshots = source.screenshots
+                document.screenshot_variants = source.screenshot_variants
+            elif stage == "text":
+                await crud.document_page.clear(db, document_id=document.id)
+                await crud.document_page.copy(db, source_id=source.id, target_id=document.id)
+                await crud.document.touch(db, id=document.id)
+            elif stage == "summary":
+                document.ai_summary = source.ai_summary
+                document.description = source.ai_summary
+            done[stage] = current[stage]
+        if len(left) < len(stages):
+            self.save_fingerprints(document, done)
+            db.add(document)
+            await db.commit()
+            logger.info(f"Document {document.id}: copied {[s for s in stages if s not in left]} from document {source.id}")
+        return left
+
+    async def _render_screenshots(self, document: Document, fs_path: str, options: AnalysisOptions) -> Optional[dict]:
+        """Thumb/card/detail widths in WebP + JPEG; the DocumentUpdate fields, or None if nothing rendered."""
+        previews = await pdf_service.generate_previews_async(
+            fs_path,
+            SCREENSHOT_DIR,
+            page_indices=options.page_indices,
+            quality=options.preview_quality,
+            content_hash=document.content_hash,
+        )
+        if not previews:
+            return None
+        # Add /static/ prefix to all
+        for entry in previews:
+            for size, variant in entry.items():
+                if size != "page":
+                    for fmt in ("webp", "jpg"):
+                        variant[fmt] = "/static/" + variant[fmt]
+        # `screenshots` keeps one full-size JPEG per page for older clients;
+        # the cover is the card size, the catalog never needs more
+        return {
+            "cover_image": previews[0]["card"]["jpg"],
+            "screenshots": json.dumps([entry["detail"]["jpg"] for entry in previews]),
+            "screenshot_variants": json.dumps(previews),
+        }
+
+    async def analyze(
+        self,
+        db: AsyncSession,
+        document: Document,
+        options: AnalysisOptions = None,
+        *,
+        force: bool = False,
+        stages: List[str] = None,
+    ) -> List[str]:
+        """
+        Bring the analysis of `document` up to date. With `force` every stage
+        runs again; `stages` limits the run to those stages. Returns the stages
+        that were computed or copied.
+        """
+        options = options or await self.load_options(db)
+        current = self.fingerprints(document, options)
+        todo = [s for s in STAGES if current[s]] if force else self.stale_stages(document, options, current)
+        if stages is not None:
+            todo = [s for s in todo if s in stages]
+        done = {k: v for k, v in load_fingerprints(document).items() if k in STAGES}
+        ran = list(todo)
+
+        if not force:
+            todo = await self._copy_from_duplicate(db, document, todo, current, done)
+
+        # Local files are used in place; OSS/S3 objects go through the read-through disk cache
+        async with file_cache.local_copy(document.file_path, document.content_hash) as fs_path:
+            if not os.path.exists(fs_path):
+                return [s for s in ran if s not in todo]
+
+            # Structure (uploaded before it was read at ingest) and the viewer's linearized copy
+            if document.structure_extracted_at is None:
+                structure = await pdf_service.read_structure_async(fs_path)
+                if structure:
+                    crud.document.apply_structure(document, structure)
+                    await db.commit()
+            await linearize_service.linearize(db, document)
+
+            if not todo:
+                return ran
+            doc_update_data = {}
+
+            if "screenshots" in todo:
+                rendered = await self._render_screenshots(document, fs_path, options)
+                if rendered:
+                    doc_update_data.update(rendered)
+                    done["screenshots"] = current["screenshots"]
+                else:
+                    ran.remove("screenshots")
+
+            # Text of every page, stored for search, AI and previews
+            if "text" in todo:
+                try:
+                    await pdf_service.store_page_text(db, document.id, fs_path)
+                    done["text"] = current["text"]
+                except Exception as e:
+                    logger.error(f"Text extraction failed for document {document.id}: {e}")
+                    ran.remove("text")
+
+            if "summary" in todo:
+                ai_service.configure(api_key=options.ai_api_key, base_url=options.ai_base_url, model=options.ai_model)
+                text = await crud.document_page.get_text(db, document_id=document.id, max_pages=SUMMARY_PAGES)
+                summary = ai_service.generate_summary(text, options.ai_prompt)
+                if summary:
+                    doc_update_data["description"] = summary
+                    doc_update_data["ai_summary"] = summary
+                    done["summary"] = current["summary"]
+                else:
+                    ran.remove("summary")
+
+            self.save_fingerprints(document, done)
+            await crud.document.update(db, db_obj=document, obj_in=schemas.DocumentUpdate(**doc_update_data))
+        logger.info(f"Document {document.id}: analyzed {ran}")
+        return ran
+
+analysis_service = AnalysisService()
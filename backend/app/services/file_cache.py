@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError: # Windows dev machines: no cross-process coalescing
+    fcntl = None
+
+from app.core.config import settings
+from app.services.storage import storage, shard_key
+
+logger = logging.getLogger(__name__)
+
+
+class FileCache:
+    """
+    Read-through LRU disk cache for remote (OSS/S3) objects, so the analysis
+    pipeline can hand PDFService a local path.
+
+    - Local-backend files are returned as-is and never copied.
+    - Entries are keyed by content hash when known, so deduplicated documents
+      share one copy.
+    - Concurrent misses for one object are coalesced into a single streaming
+      download: per process through a shared Future, across worker processes
+      through an flock on the entry's lock file.
+    - Total size is bounded by FILE_CACHE_MAX_BYTES; the least recently used
+      entries (by mtime, refreshed on every hit) are evicted first, never one
+      that is currently pinned by a reader of this process. Past the limit it
+      evicts down to FILE_CACHE_LOW_WATERMARK of it, walking the directory again
+      first when the last walk is FILE_CACHE_RESYNC_SECONDS old, so entries
+      downloaded by other processes are accounted for. Walks never hold the lock.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or settings.FILE_CACHE_DIR
+        self.max_bytes = settings.FILE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        # key -> size, oldest first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._pins: Dict[str, int] = {}
+        self._loaded = False
+        # Held while walking the directory; entries downloaded meanwhile, to keep them
+        self._sync_lock = threading.Lock()
+        self._synced_at = 0.0
+        self._stored_while_syncing: Optional[Dict[str, int]] = None
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "downloads": 0,
+            "bytes_downloaded": 0,
+            "evictions": 0,
+            "bytes_evicted": 0,
+        }
+
+    @staticmethod
+    def cache_key(ref: str, content_hash: Optional[str] = None) -> str:
+        return content_hash or hashlib.sha1(ref.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, shard_key(key))
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            with self._sync_lock:
+                if not self._loaded:
+                    self._sync()
+
+    def _sync(self) -> None:
+        """
+        Called with _sync_lock held. Pick up entries left by earlier runs or
+        other worker processes, oldest first.
+        """
+        with self._lock:
+            self._stored_while_syncing = {}
+        try:
+            found = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename == ".lock" or filename.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(dirpath, filename))
+                    except FileNotFoundError:
+                        continue
+                    found.append((stat.st_mtime, filename, stat.st_size))
+        except BaseException:
+            with self._lock:
+                self._stored_while_syncing = None
+            raise
+        found.sort()
+        entries = OrderedDict((name, size) for _, name, size in found)
+        with self._lock:
+            # Keep this process's recency order, and what it downloaded during the walk
+            for key in self._entries:
+                if key in entries:
+                    entries.move_to_end(key)
+            for key, size in self._stored_while_syncing.items():
+                entries.pop(key, None)
+                entries[key] = size
+            self._stored_while_syncing = None
+            self._entries = entries
+            self._bytes = sum(entries.values())
+            self._loaded = True
+            self._synced_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "hit_ratio": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _hit(self, key: str) -> Optional[str]:
+        """Called with the lock held."""
+        if key not in self._entries:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path) # LRU order shared with other processes
+        except FileNotFoundError:
+            # Evicted by another worker process
+            self._bytes -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        self.metrics["hits"] += 1
+        return path
+
+    def get(self, ref: str, content_hash: Optional[str] = None) -> str:
+        """Local path of the object behind `ref`, downloading it on a miss (blocking)."""
+        backend, object_key = storage.resolve(ref)
+        local = backend.local_path(object_key)
+        if local is not None:
+            return local
+
+        key = self.cache_key(ref, content_hash)
+        self._ensure_loaded()
+        with self._lock:
+            path = self._hit(key)
+            if path:
+                return path
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.metrics["misses"] += 1
+            else:
+                self.metrics["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            path = self._download(key, backend, object_key)
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def get_async(self, ref: str, content_hash: Optional[str] = None) -> str:
+        # Hits and waiters on a coalesced download are answered without a thread hop
+        backend, object_key = storage.resolve(ref)
+        local = backend.local_path(object_key)
+        if local is not None:
+            return local
+        key = self.cache_key(ref, content_hash)
+        self._ensure_loaded()
+        with self._lock:
+            path = self._hit(key)
+            if path:
+                return path
+            future = self._inflight.get(key)
+            if future is not None:
+                self.metrics["coalesced"] += 1
+        if future is not None:
+            return await asyncio.wrap_future(future)
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, ref, content_hash)
+
+    @asynccontextmanager
+    async def local_copy(self, ref: str, content_hash: Optional[str] = None) -> AsyncIterator[str]:
+        """`async with file_cache.local_copy(ref) as path:` the entry is not evicted while in use."""
+        key = self.cache_key(ref, content_hash)
+        with self._pinned(key):
+            yield await self.get_async(ref, content_hash)
+
+    @contextmanager
+    def _pinned(self, key: str) -> Iterator[None]:
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[key] -= 1
+                if not self._pins[key]:
+                    del self._pins[key]
+
+    def _download(self, key: str, backend, object_key: str) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One lock file per leaf directory keeps the number of lock files bounded
+        with open(os.path.join(os.path.dirname(path), ".lock"), "wb") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(path):
+                    # Another worker process fetched it while we waited for the lock
+                    size = os.path.getsize(path)
+                else:
+                    size = self._fetch(backend, object_key, path)
+                    with self._lock:
+                        self.metrics["downloads"] += 1
+                        self.metrics["bytes_downloaded"] += size
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size
+                self._bytes += size
+            self._entries.move_to_end(key)
+            if self._stored_while_syncing is not None:
+                self._stored_while_syncing[key] = size
+        self._evict()
+        return path
+
+    @staticmethod
+    def _fetch(backend, object_key: str, path: str) -> int:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        stream = backend.open(object_key)
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = stream.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        return size
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        # Other worker processes add entries too: resync before deleting, unless walked recently or walking now
+        if time.monotonic() - self._synced_at >= settings.FILE_CACHE_RESYNC_SECONDS and self._sync_lock.acquire(blocking=False):
+            try:
+                if time.monotonic() - self._synced_at >= settings.FILE_CACHE_RESYNC_SECONDS:
+                    self._sync()
+            except Exception as e:
+                # Evict by what this process knows; the next overflow retries the walk
+                logger.warning(f"File cache walk failed: {e}")
+            finally:
+                self._sync_lock.release()
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            low = self.max_bytes * settings.FILE_CACHE_LOW_WATERMARK
+            for key in list(self._entries):
+                if self._bytes <= low:
+                    break
+                if key in self._pins or key in self._inflight:
+                    continue
+                size = self._entries.pop(key)
+                self._bytes -= size
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    continue
+                self.metrics["evictions"] += 1
+                self.metrics["bytes_evicted"] += size
+
+file_cache = FileCache()
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, schemas
+from app.core.config import settings
+from app.models.document import DocumentStatus
+from app.models.ingest import IngestJobItem, IngestItemStatus
+from app.services.oss import oss_service, StoredFile
+from app.services.pdf_service import pdf_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestFile:
+    fileobj: BinaryIO
+    filename: str
+    content_type: Optional[str] = None
+
+
+class IngestService:
+    async def store(self, db: AsyncSession, fileobj: BinaryIO, filename: str, content_type: str = None) -> StoredFile:
+        """
+        Store an uploaded file, reusing the stored object of an existing document
+        with identical content. Seekable sources (UploadFile spools to a temp file)
+        are hashed first so duplicates never reach storage; anything else is hashed
+        while streaming and the fresh copy is dropped if it turns out to be a duplicate.
+        """
+        seekable = hasattr(fileobj, "seek")
+        if seekable:
+            content_hash, _ = await oss_service.hash_fileobj_async(fileobj)
+            existing = await crud.document.get_by_content_hash(db, content_hash=content_hash)
+            if existing:
+                return StoredFile(
+                    path=existing.file_path,
+                    size=existing.file_size,
+                    content_hash=content_hash,
+                    deduplicated=True,
+                )
+
+        stored = await oss_service.upload_fileobj_async(fileobj, filename, content_type)
+
+        if not seekable:
+            existing = await crud.document.get_by_content_hash(db, content_hash=stored.content_hash)
+            if existing:
+                await oss_service.delete_file_async(stored.path)
+                return StoredFile(
+                    path=existing.file_path,
+                    size=existing.file_size,
+                    content_hash=stored.content_hash,
+                    deduplicated=True,
+                )
+        return stored
+
+    async def ingest_batch(
+        self,
+        db: AsyncSession,
+        files: List[IngestFile],
+        *,
+        category_id: int,
+        created_by: int,
+        concurrency: int = None,
+        commit: bool = True,
+    ) -> List[dict]:
+        """
+        Store many files concurrently and create their documents in one transaction.
+
+        All files are hashed in parallel, known content is resolved with a single
+        query, each distinct new content is uploaded once (at most `concurrency`
+        at a time) and its structure read once, and the Document rows are
+        inserted and committed together.
+        Returns one result per input file, in order. With commit=False the
+        documents are flushed but the transaction is left to the caller.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.BATCH_UPLOAD_CONCURRENCY)
+        results = [{"file_name": f.filename, "success": False, "document_id": None, "error": None, "deduplicated": False} for f in files]
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        # 1. Hash everything in parallel (local spooled files, no network)
+        hashed = await asyncio.gather(
+            *(bounded(oss_service.hash_fileobj_async(f.fileobj)) for f in files),
+            return_exceptions=True,
+        )
+        hashes = [h[0] if not isinstance(h, BaseException) else None for h in hashed]
+        existing = await crud.document.get_by_content_hashes(db, content_hashes={h for h in hashes if h})
+
+        # 2. Upload each distinct new content once; duplicates within the batch share the upload
+        uploads: Dict[str, "asyncio.Task[StoredFile]"] = {}
+        stored: List[Optional[StoredFile]] = [None] * len(files)
+        for i, (f, content_hash) in enumerate(zip(files, hashes)):
+            if content_hash is None:
+                results[i]["error"] = f"Could not read file: {hashed[i]}"
+            elif content_hash in existing:
+                doc = existing[content_hash]
+                stored[i] = StoredFile(path=doc.file_path, size=doc.file_size, content_hash=content_hash, deduplicated=True)
+            elif content_hash not in uploads:
+                uploads[content_hash] = asyncio.ensure_future(
+                    bounded(oss_service.upload_fileobj_async(f.fileobj, f.filename, f.content_type))
+                )
+        if uploads:
+            await asyncio.wait(list(uploads.values()))
+
+        for i, content_hash in enumerate(hashes):
+            if content_hash is None or stored[i] is not None:
+                continue
+            task = uploads[content_hash]
+            if task.exception():
+                results[i]["error"] = str(task.exception())
+                continue
+            first = task.result()
+            # Only the first file with this content owns the upload
+            is_owner = hashes.index(content_hash) == i
+            stored[i] = StoredFile(path=first.path, size=first.size, content_hash=content_hash, deduplicated=not is_owner)
+
+        # 3. Read page count, page sizes and outline of each new content once, from the local upload
+        new_hashes = [h for h, task in uploads.items() if not task.exception()]
+        read = await asyncio.gather(
+            *(bounded(pdf_service.read_structure_fileobj_async(files[hashes.index(h)].fileobj)) for h in new_hashes)
+        )
+        structures = {h: structure for h, structure in zip(new_hashes, read) if structure}
+
+        # 4. Insert every successful document in one transaction
+        pending = [i for i, s in enumerate(stored) if s is not None]
+        docs_in = [
+            schemas.DocumentCreate(
+                title=files[i].filename,
+                category_id=category_id,
+                file_path=stored[i].path,
+                file_name=files[i].filename,
+                file_size=stored[i].size,
+                content_hash=stored[i].content_hash,
+                status=DocumentStatus.DRAFT,
+            )
+            for i in pending
+        ]
+        try:
+            documents = await crud.document.create_many(
+                db, objs_in=docs_in, created_by=created_by, commit=commit, structures=structures
+            )
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Batch insert failed: {e}")
+            # Nothing references the objects we just uploaded
+            for task in uploads.values():
+                if not task.exception():
+                    await oss_service.delete_file_async(task.result().path)
+            for i in pending:
+                results[i]["error"] = f"Database insert failed: {e}"
+            return results
+
+        for i, document in zip(pending, documents):
+            results[i].update(success=True, document_id=document.id, deduplicated=stored[i].deduplicated)
+        return results
+
+    def _stage_one(self, fileobj: BinaryIO, filename: str) -> dict:
+        os.makedirs(settings.INGEST_STAGING_DIR, exist_ok=True)
+        ext = os.path.splitext(filename or "")[1]
+        path = os.path.join(settings.INGEST_STAGING_DIR, f"{uuid.uuid4().hex}{ext}")
+        fileobj.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, settings.UPLOAD_CHUNK_SIZE)
+        return {"staged_path": path, "file_size": os.path.getsize(path)}
+
+    async def stage_files(self, files: List[IngestFile]) -> List[dict]:
+        """
+        Copy request files to the staging directory shared with the ingest worker.
+        Returns the IngestJobItem fields for each file; on failure nothing is left behind.
+        """
+        staged = []
+        try:
+            for f in files:
+                item = await asyncio.to_thread(self._stage_one, f.fileobj, f.filename)
+                item.update(file_name=f.filename, content_type=f.content_type)
+                staged.append(item)
+        except Exception:
+            self.discard_staged([item["staged_path"] for item in staged])
+            raise
+        return staged
+
+    @staticmethod
+    def discard_staged(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def process_items(self, db: AsyncSession, items: List[IngestJobItem], *, category_id: int, created_by: int) -> None:
+        """
+        Ingest claimed job items of one job. Documents and item results are
+        committed in the same transaction, so a crash never leaves a document
+        without its item being marked done.
+        """
+        # Snapshot what we need up front: ingest_batch rolls back (expiring every
+        # loaded row) if the document insert fails
+        snapshot = [(item, item.staged_path, item.attempts) for item in items]
+        files, handles, outcome = [], [], {}
+        for i, item in enumerate(items):
+            try:
+                fh = open(item.staged_path, "rb")
+            except OSError as e:
+                outcome[i] = {"success": False, "error": f"Staged file missing: {e}", "final": True}
+                continue
+            handles.append(fh)
+            files.append((i, IngestFile(fh, item.file_name, item.content_type)))
+        try:
+            results = await self.ingest_batch(
+                db, [f for _, f in files], category_id=category_id, created_by=created_by, commit=False
+            )
+        finally:
+            for fh in handles:
+                fh.close()
+        for (i, _), result in zip(files, results):
+            outcome[i] = result
+
+        done = []
+        for i, (item, staged_path, attempts) in enumerate(snapshot):
+            result = outcome[i]
+            item.error = result["error"]
+            if result["success"]:
+                item.status = IngestItemStatus.SUCCEEDED
+                item.document_id = result["document_id"]
+                item.deduplicated = result["deduplicated"]
+                done.append(staged_path)
+            elif result.get("final") or attempts >= settings.INGEST_MAX_ATTEMPTS:
+                item.status = IngestItemStatus.FAILED
+                done.append(staged_path)
+            else:
+                item.status = IngestItemStatus.PENDING
+        await db.commit()
+        self.discard_staged(done)
+
+ingest_service = IngestService()
@@ -0,0 +1,144 @@
+"""
+Optional ingest stage: rewrite uploads into linearized ("fast web view") PDFs.
+
+A linearized file starts with page 1 and a hint table, so pdf.js can show the
+first page from the first few range requests instead of fetching the
+cross-reference table at the end of the file first.
+
+The rewrite uses pikepdf when it is installed and the qpdf command line tool
+otherwise; with neither the stage is skipped. The original upload is never
+modified: the linearized copy is stored as a separate object and recorded in
+Document.view_file_path, which only the inline (viewer) response serves.
+Downloads keep the original bytes, so content_hash stays the hash of file_path.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm.attributes import set_committed_value
+
+try:
+    import pikepdf
+except ImportError: # optional: fall back to the qpdf binary
+    pikepdf = None
+
+from app.core.config import settings
+from app.models.document import Document
+from app.services.file_cache import file_cache
+from app.services.oss import oss_service
+from app.services.pdf_service import LINEARIZED_PROBE_BYTES
+from app.services.render_engine import render_engine
+
+logger = logging.getLogger(__name__)
+
+
+def is_linearized(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        return b"/Linearized" in f.read(LINEARIZED_PROBE_BYTES)
+
+
+def linearize_file(src: str, dst: str, timeout: float = None) -> None:
+    """Write a linearized copy of `src` to `dst`. Runs inside a pool worker."""
+    if pikepdf is not None:
+        with pikepdf.open(src) as pdf:
+            pdf.save(dst, linearize=True)
+        return
+    result = subprocess.run(
+        [settings.QPDF_BINARY, "--linearize", src, dst],
+        capture_output=True,
+        timeout=timeout or settings.LINEARIZE_TIMEOUT,
+    )
+    # Exit status 3: written, with warnings about damage qpdf repaired
+    if result.returncode not in (0, 3):
+        raise RuntimeError(result.stderr.decode(errors="replace").strip()[:500] or f"qpdf exited with {result.returncode}")
+
+
+class LinearizeService:
+    def available(self) -> bool:
+        return settings.LINEARIZE_ENABLED and (pikepdf is not None or shutil.which(settings.QPDF_BINARY) is not None)
+
+    def needed(self, document: Document) -> bool:
+        """Whether a document should get a linearized copy (its structure must be known)."""
+        return (
+            not document.view_file_path
+            and document.structure_extracted_at is not None
+            and document.is_linearized is False
+            and document.file_size >= settings.LINEARIZE_MIN_BYTES
+        )
+
+    async def _shared_copy(self, db: AsyncSession, document: Document) -> Optional[str]:
+        if not document.content_hash:
+            return None
+        query = (
+            select(Document.view_file_path)
+            .filter(Document.content_hash == document.content_hash, Document.view_file_path.isnot(None))
+            .limit(1)
+        )
+        return (await db.execute(query)).scalar()
+
+    async def _write_copy(self, document: Document) -> Optional[str]:
+        fd, dst = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        try:
+            async with file_cache.local_copy(document.file_path, document.content_hash) as src:
+                await render_engine.submit(linearize_file, src, dst, settings.LINEARIZE_TIMEOUT, timeout=settings.LINEARIZE_TIMEOUT)
+            if not is_linearized(dst):
+                logger.warning(f"Linearizing document {document.id} produced no linearization dictionary, keeping the original")
+                return None
+            with open(dst, "rb") as f:
+                stored = await oss_service.upload_fileobj_async(f, document.file_name, "application/pdf")
+            return stored.path
+        finally:
+            os.remove(dst)
+
+    async def linearize(self, db: AsyncSession, document: Document) -> bool:
+        """
+        Give `document` (and every document with the same content) a linearized
+        copy for the viewer. Returns whether view_file_path was set; failures
+        are logged and leave the document serving its original file.
+        """
+        if not self.available() or not self.needed(document):
+            return False
+        document_id = document.id
+        try:
+            ref = await self._shared_copy(db, document) or await self._write_copy(document)
+        except Exception as e:
+            logger.error(f"Linearizing document {document_id} failed: {e}")
+            return False
+        if not ref:
+            return False
+
+        same_content = Document.content_hash == document.content_hash if document.content_hash else Document.id == document_id
+        await db.execute(
+            update(Document)
+            .where(same_content, Document.view_file_path.is_(None))
+            .values(view_file_path=ref)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        set_committed_value(document, "view_file_path", ref)
+        logger.info(f"Document {document_id}: viewer serves linearized copy {ref}")
+        return True
+
+    async def linearize_documents(self, document_ids: List[int]) -> None:
+        """
+        Background task after an upload: one document at a time in a session of
+        its own, so a batch of large files does not occupy the whole render pool.
+        """
+        from app.db.session import SessionLocal
+
+        if not document_ids or not self.available():
+            return
+        async with SessionLocal() as db:
+            for document_id in document_ids:
+                document = await db.get(Document, document_id)
+                if document:
+                    await self.linearize(db, document)
+
+linearize_service = LinearizeService()
@@ -1,81 +1,175 @@
-import oss2
-import os
-import uuid
-from datetime import datetime
-from fastapi import UploadFile, HTTPException
+import asyncio
+import functools
+import io
+import time
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import quote
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
 from app.core.config import settings
+from app.services.storage import (  # noqa: F401 (re-exported)
+    storage, make_ref, hash_fileobj, HashingReader, ChainedReader,
+    MultipartUploader, MultipartUploadError, FakeBucket,
+)
+
+
+@dataclass
+class StoredFile:
+    path: str
+    size: int
+    content_hash: Optional[str] = None
+    deduplicated: bool = False
+
 
 class OSSService:
+    """
+    Facade over the storage backends used by the API. File references have the
+    form "<backend>:<key>" (see app.services.storage); new files go to the
+    default backend, existing ones are served from the backend they name.
+    """
+
     def __init__(self):
-        if settings.OSS_ACCESS_KEY_ID and settings.OSS_ACCESS_KEY_SECRET and settings.OSS_ENDPOINT:
-            self.auth = oss2.Auth(settings.OSS_ACCESS_KEY_ID, settings.OSS_ACCESS_KEY_SECRET)
-            self.bucket = oss2.Bucket(self.auth, settings.OSS_ENDPOINT, settings.OSS_BUCKET_NAME)
-            self.domain = settings.OSS_BUCKET_DOMAIN
-        else:
-            self.bucket = None
+        if storage.default_name == "local":
             print("OSS not configured")
+        # (reference, filename, ttl, window) -> signed URL, LRU bounded
+        self._signed_urls: "OrderedDict[tuple, str]" = OrderedDict()
+        self._signed_url_lock = threading.Lock()
+        # Blocking storage calls and disk writes run here so they never stall the event loop
+        self._executor = ThreadPoolExecutor(max_workers=settings.STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def new_ref(self, filename: str) -> str:
+        """Reference for a new object on the default backend, in that backend's key layout."""
+        backend = storage.default
+        return make_ref(backend.name, backend.new_key(filename))
 
     def upload_file(self, file_content: bytes, filename: str, content_type: str = None) -> str:
-        if not self.bucket:
-            # Mock upload for local dev if OSS not configured
-            # Save to local 'static' folder
-            save_dir = "static/uploads"
-            os.makedirs(save_dir, exist_ok=True)
-            
-            # Generate unique filename
-            ext = os.path.splitext(filename)[1]
-            unique_filename = f"{uuid.uuid4()}{ext}"
-            file_path = os.path.join(save_dir, unique_filename)
-            
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-            
-            return f"/static/uploads/{unique_filename}"
-
-        # Generate object name: YYYY/MM/uuid.ext
-        ext = os.path.splitext(filename)[1]
-        object_name = f"{datetime.now().strftime('%Y/%m')}/{uuid.uuid4()}{ext}"
+        return self.upload_fileobj(io.BytesIO(file_content), filename, content_type).path
 
+    def upload_fileobj(self, fileobj: BinaryIO, filename: str, content_type: str = None) -> StoredFile:
+        """
+        Stream a file-like object to the default backend without loading it into memory.
+        The sha256 of the content is computed on the way through.
+        """
+        ref = self.new_ref(filename)
+        backend, key = storage.resolve(ref)
+        fileobj = HashingReader(fileobj)
         try:
-            headers = {}
-            if content_type:
-                headers['Content-Type'] = content_type
-            
-            result = self.bucket.put_object(object_name, file_content, headers=headers)
-            
-            if result.status != 200:
-                raise HTTPException(status_code=500, detail="OSS upload failed")
-            
-            # Return URL
-            if self.domain:
-                return f"{self.domain}/{object_name}"
-            return f"https://{settings.OSS_BUCKET_NAME}.{settings.OSS_ENDPOINT}/{object_name}"
-            
+            size = backend.put(key, fileobj, content_type)
         except Exception as e:
-            print(f"OSS Upload Error: {e}")
+            print(f"Storage Upload Error ({backend.name}): {e}")
             raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+        return StoredFile(path=ref, size=size, content_hash=fileobj.hexdigest())
+
+    def sign_upload(self, ref: str, content_type: str = None, expires: int = None) -> Dict[str, Any]:
+        """
+        Presign a form POST for `ref` so the browser can upload straight to object storage.
+        The client sends the returned fields, then the file as the last field "file";
+        the policy limits the object to MAX_UPLOAD_SIZE bytes.
+        """
+        backend, key = storage.resolve(ref)
+        if not backend.supports_presign:
+            raise HTTPException(status_code=400, detail="Direct upload requires object storage")
+        signed = backend.presign_post(key, settings.MAX_UPLOAD_SIZE, content_type, expires)
+        signed["file_path"] = ref
+        return signed
+
+    def head_object(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Return size and checksum of a stored object, or None if it does not exist."""
+        backend, key = storage.resolve(ref)
+        return backend.head(key)
+
+    def open_file(self, ref: str) -> BinaryIO:
+        backend, key = storage.resolve(ref)
+        return backend.open(key)
+
+    @staticmethod
+    def local_path(ref: str) -> Optional[str]:
+        """Filesystem path of a file in local storage, or None for remote objects."""
+        backend, key = storage.resolve(ref)
+        return backend.local_path(key)
 
-    def delete_file(self, file_url: str):
-        if not self.bucket:
-            # Local delete logic if needed, but risky for now to implement auto-delete on local
-            return
+    @staticmethod
+    def object_key(ref: str) -> str:
+        return storage.resolve(ref)[1]
 
+    def get_download_url(self, ref: str, filename: str = None, ttl: int = None) -> str:
+        """
+        Return a short-lived signed GET URL for a stored file, named `filename` on download.
+        TTLs are bucketed into windows of `ttl` seconds and every URL in a window expires at
+        the same moment (at least `ttl` seconds away), so repeated requests for a hot document
+        reuse one cached, CDN-friendly URL instead of re-signing.
+        Only backends that support presigning (OSS, S3) can be used here.
+        """
+        backend, key = storage.resolve(ref)
+        ttl = ttl or settings.OSS_SIGNED_URL_TTL
+        window = int(time.time()) // ttl
+        cache_key = (backend.name, key, filename, ttl, window)
+        with self._signed_url_lock:
+            url = self._signed_urls.get(cache_key)
+            if url:
+                self._signed_urls.move_to_end(cache_key)
+                return url
+
+        params = {}
+        if filename:
+            params['response-content-disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        expires_at = (window + 2) * ttl
+        url = backend.presign_get(key, expires_at - int(time.time()), params=params)
+
+        with self._signed_url_lock:
+            self._signed_urls[cache_key] = url
+            while len(self._signed_urls) > settings.OSS_SIGNED_URL_CACHE_SIZE:
+                self._signed_urls.popitem(last=False)
+        return url
+
+    def delete_file(self, ref: str):
         try:
-            # Extract object name from URL
-            # URL format: http://domain/object_name or https://bucket.endpoint/object_name
-            if self.domain and file_url.startswith(self.domain):
-                object_name = file_url.replace(f"{self.domain}/", "")
-            else:
-                 # Fallback extraction logic
-                 # This is tricky without strict URL structure, simplified for now
-                 parts = file_url.split('/')
-                 # Assuming YYYY/MM/uuid.ext structure at the end
-                 object_name = "/".join(parts[-3:]) 
-            
-            self.bucket.delete_object(object_name)
+            backend, key = storage.resolve(ref)
+            backend.delete(key)
         except Exception as e:
-            print(f"OSS Delete Error: {e}")
+            print(f"Storage Delete Error: {e}")
             # Don't raise error for delete failure to avoid blocking main logic
             pass
 
+    def delete_files(self, refs: Iterable[str]) -> List[str]:
+        """Delete many files with one batch request per backend (per 1000 keys). Returns refs that failed."""
+        by_backend = defaultdict(list)
+        failed = []
+        for ref in refs:
+            try:
+                backend, key = storage.resolve(ref)
+            except ValueError:
+                failed.append(ref)
+                continue
+            by_backend[backend].append((ref, key))
+        for backend, items in by_backend.items():
+            refs_by_key = {key: ref for ref, key in items}
+            failed.extend(refs_by_key[key] for key in backend.delete_many(list(refs_by_key)))
+        return failed
+
+    async def upload_file_async(self, file_content: bytes, filename: str, content_type: str = None) -> str:
+        return await self._run_blocking(self.upload_file, file_content, filename, content_type)
+
+    async def upload_fileobj_async(self, fileobj: BinaryIO, filename: str, content_type: str = None) -> StoredFile:
+        return await self._run_blocking(self.upload_fileobj, fileobj, filename, content_type)
+
+    async def hash_fileobj_async(self, fileobj: BinaryIO) -> Tuple[str, int]:
+        return await self._run_blocking(hash_fileobj, fileobj)
+
+    async def head_object_async(self, ref: str) -> Optional[Dict[str, Any]]:
+        return await self._run_blocking(self.head_object, ref)
+
+    async def delete_file_async(self, ref: str):
+        return await self._run_blocking(self.delete_file, ref)
+
+    async def delete_files_async(self, refs: Iterable[str]) -> List[str]:
+        return await self._run_blocking(self.delete_files, list(refs))
+
 oss_service = OSSService()
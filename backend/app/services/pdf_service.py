@@ -1,82 +1,811 @@
 import pypdfium2 as pdfium
+import asyncio
+import dataclasses
+import json
 import os
 import logging
-from typing import List, Tuple
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.services.storage import storage, shard_prefix, hash_fileobj
+from app.services.file_cache import file_cache
+from app.services.render_engine import RenderJob, RenderResult, RenderTimeout, render_engine, _on_alarm
 
 logger = logging.getLogger(__name__)
 
+CONTENT_TYPES = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+# SystemSetting keys overriding PREVIEW_*_QUALITY
+QUALITY_SETTINGS = {"webp": "preview_webp_quality", "jpg": "preview_jpeg_quality"}
+
+
+class RenderCache:
+    """
+    Rendered page images keyed by (content digest, page, size, format, quality),
+    so re-analyzing a document, or a duplicate of its file, skips pdfium.
+
+    - Objects live in a storage backend (RENDER_CACHE_BACKEND) under
+      RENDER_CACHE_PREFIX: local disk by default, or a bucket shared by all hosts.
+    - A page is a hit only when every image the job asks for is cached.
+    - Total size is bounded by RENDER_CACHE_MAX_BYTES. Each process keeps an LRU
+      index built from a listing of the backend on first use. Past the limit it
+      evicts down to RENDER_CACHE_LOW_WATERMARK of it, listing the backend again
+      first when the last listing is RENDER_CACHE_RESYNC_SECONDS old, so objects
+      stored by other processes are accounted for. Listings never hold the lock.
+    """
+
+    def __init__(self, backend_name: str = None, prefix: str = None, max_bytes: int = None):
+        self.backend_name = settings.RENDER_CACHE_BACKEND if backend_name is None else backend_name
+        self.prefix = settings.RENDER_CACHE_PREFIX if prefix is None else prefix
+        self.max_bytes = settings.RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        # key -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        # Held while listing the backend; entries stored meanwhile, to keep them
+        self._sync_lock = threading.Lock()
+        self._synced_at = 0.0
+        self._stored_while_syncing: Optional[Dict[str, int]] = None
+        # digest -> page count, so out-of-range pages are not looked up (and missed) every time
+        self._page_counts: "OrderedDict[str, int]" = OrderedDict()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bytes_stored": 0,
+            "evictions": 0,
+            "bytes_evicted": 0,
+            "errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backend_name)
+
+    @property
+    def backend(self):
+        return storage.get(self.backend_name)
+
+    def cache_key(self, digest: str, job: RenderJob, page_number: int, size: Optional[str], fmt: str, quality: Optional[int]) -> str:
+        # The pixel size, not the size name, so changing PREVIEW_WIDTHS never serves stale images
+        dims = f"w{job.widths[size]}" if size else f"x{job.scale:g}"
+        suffix = f"_q{quality}" if quality is not None else ""
+        return f"{self.prefix}{digest[:2]}/{digest}/p{page_number}_{dims}{suffix}.{fmt}"
+
+    def _page_keys(self, job: RenderJob, digest: str, page_number: int) -> List[Tuple[str, str]]:
+        """(file name, cache key) of every image of a page."""
+        return [
+            (name, self.cache_key(digest, job, page_number, size, fmt, quality))
+            for name, size, fmt, quality in job.page_files(page_number)
+        ]
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            with self._sync_lock:
+                if not self._loaded:
+                    self._sync()
+
+    def _sync(self) -> None:
+        """Called with _sync_lock held. Rebuild the index from a listing of the backend."""
+        with self._lock:
+            self._stored_while_syncing = {}
+        try:
+            found = []
+            for page in self.backend.iter_objects(prefix=self.prefix):
+                found.extend(page)
+        except BaseException:
+            with self._lock:
+                self._stored_while_syncing = None
+            raise
+        found.sort(key=lambda obj: obj.last_modified)
+        entries = OrderedDict((obj.key, obj.size) for obj in found)
+        with self._lock:
+            # Keep this process's recency order, and what it stored during the listing
+            for key in self._entries:
+                if key in entries:
+                    entries.move_to_end(key)
+            for key, size in self._stored_while_syncing.items():
+                entries.pop(key, None)
+                entries[key] = size
+            self._stored_while_syncing = None
+            self._entries = entries
+            self._bytes = sum(entries.values())
+            self._loaded = True
+            self._synced_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "hit_ratio": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+                "backend": self.backend_name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def page_count(self, digest: str) -> Optional[int]:
+        with self._lock:
+            return self._page_counts.get(digest)
+
+    def set_page_count(self, digest: str, page_count: int) -> None:
+        with self._lock:
+            self._page_counts[digest] = page_count
+            self._page_counts.move_to_end(digest)
+            while len(self._page_counts) > 10000:
+                self._page_counts.popitem(last=False)
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Contents of one cached image, or None. Only hits are counted; the caller's render lookup counts the miss."""
+        self._ensure_loaded()
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            stream = self.backend.open(key)
+            try:
+                data = stream.read()
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+        except Exception as e:
+            logger.warning(f"Render cache read failed for {key}: {e}")
+            with self._lock:
+                self.metrics["errors"] += 1
+                if key in self._entries:
+                    self._bytes -= self._entries.pop(key)
+            return None
+        with self._lock:
+            self.metrics["hits"] += 1
+        return data
+
+    def fetch(self, job: RenderJob, digest: str) -> List[int]:
+        """Copy the cached images of job.pages into job.output_dir. Returns the 0-based pages restored."""
+        restored = []
+        self._ensure_loaded()
+        for index in job.pages:
+            files = self._page_keys(job, digest, index + 1)
+            with self._lock:
+                hit = all(key in self._entries for _, key in files)
+                if hit:
+                    for _, key in files:
+                        self._entries.move_to_end(key)
+            if hit:
+                try:
+                    for name, key in files:
+                        self._copy_out(key, os.path.join(job.output_dir, name))
+                except Exception as e:
+                    # Evicted by another process, or the bucket is unreachable: render it
+                    logger.warning(f"Render cache read failed for {digest} page {index + 1}: {e}")
+                    hit = False
+                    with self._lock:
+                        self.metrics["errors"] += 1
+                        for _, key in files:
+                            if key in self._entries:
+                                self._bytes -= self._entries.pop(key)
+            with self._lock:
+                self.metrics["hits" if hit else "misses"] += 1
+            if hit:
+                restored.append(index)
+        return restored
+
+    def _copy_out(self, key: str, path: str) -> None:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        stream = self.backend.open(key)
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(stream, f, settings.UPLOAD_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    def store(self, job: RenderJob, digest: str, pages: List[int]) -> None:
+        """Add the freshly rendered images of `pages` (0-based) from job.output_dir."""
+        self._ensure_loaded()
+        for index in pages:
+            for name, key in self._page_keys(job, digest, index + 1):
+                path = os.path.join(job.output_dir, name)
+                try:
+                    with open(path, "rb") as f:
+                        size = self.backend.put(key, f, content_type=CONTENT_TYPES.get(os.path.splitext(name)[1][1:]))
+                except Exception as e:
+                    logger.warning(f"Render cache write failed for {key}: {e}")
+                    with self._lock:
+                        self.metrics["errors"] += 1
+                    continue
+                with self._lock:
+                    self._bytes += size - self._entries.pop(key, 0)
+                    self._entries[key] = size
+                    if self._stored_while_syncing is not None:
+                        self._stored_while_syncing[key] = size
+                    self.metrics["stores"] += 1
+                    self.metrics["bytes_stored"] += size
+        self._evict()
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        # Other processes store entries too: resync before deleting, unless listed recently or listing now
+        if time.monotonic() - self._synced_at >= settings.RENDER_CACHE_RESYNC_SECONDS and self._sync_lock.acquire(blocking=False):
+            try:
+                if time.monotonic() - self._synced_at >= settings.RENDER_CACHE_RESYNC_SECONDS:
+                    self._sync()
+            except Exception as e:
+                # Evict by what this process knows; the next overflow retries the listing
+                logger.warning(f"Render cache listing failed: {e}")
+            finally:
+                self._sync_lock.release()
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            low = self.max_bytes * settings.RENDER_CACHE_LOW_WATERMARK
+            victims = []
+            while self._entries and self._bytes > low:
+                key, size = self._entries.popitem(last=False)
+                self._bytes -= size
+                victims.append(key)
+                self.metrics["evictions"] += 1
+                self.metrics["bytes_evicted"] += size
+        if victims:
+            failed = self.backend.delete_many(victims)
+            if failed:
+                logger.warning(f"Render cache could not evict {len(failed)} objects")
+
+render_cache = RenderCache()
+
 class PDFService:
     @staticmethod
-    def generate_screenshots(file_path: str, output_dir: str, page_indices: List[int] = None, max_pages: int = 3) -> List[str]:
+    def _screenshot_job(file_path: str, output_dir: str, page_indices: List[int] = None, max_pages: int = 3) -> RenderJob:
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        # All pages of a document share one hash-prefix directory
+        return RenderJob(
+            file_path=file_path,
+            output_dir=output_dir,
+            name_prefix=f"{shard_prefix(base_name)}/{base_name}".lstrip("/"),
+            # Out-of-range indices are skipped by the renderer
+            pages=list(page_indices) if page_indices else list(range(max_pages)),
+            scale=2.0, # Scale 2.0 for better quality
+        )
+
+    @staticmethod
+    def _screenshot_paths(output_dir: str, images: List[str]) -> List[str]:
+        # Assuming output_dir is .../static/screenshots
+        # We return "screenshots/ab/cd/filename.jpg"
+        rel_dir = os.path.basename(output_dir)
+        return [f"{rel_dir}/{name}" for name in images]
+
+    @staticmethod
+    def preview_quality(system_settings: Dict[str, str]) -> Dict[str, int]:
+        """Encoding quality (1-100) per preview format from SystemSetting values; unset keeps the config defaults."""
+        quality = {"webp": settings.PREVIEW_WEBP_QUALITY, "jpg": settings.PREVIEW_JPEG_QUALITY}
+        for fmt, key in QUALITY_SETTINGS.items():
+            value = system_settings.get(key)
+            if value and value.strip().isdigit():
+                quality[fmt] = min(max(int(value), 1), 100)
+        return quality
+
+    @staticmethod
+    def _file_digest(file_path: str) -> str:
+        with open(file_path, "rb") as f:
+            return hash_fileobj(f)[0]
+
+    @staticmethod
+    def _describe_page(job: RenderJob, page_number: int) -> dict:
+        """Preview entry of a page restored from the render cache, as the renderer reports it."""
+        from PIL import Image
+
+        entry = {"page": page_number}
+        for name, size, fmt, _ in job.page_files(page_number):
+            if size not in entry:
+                with Image.open(os.path.join(job.output_dir, name)) as image:
+                    entry[size] = {"width": image.width, "height": image.height}
+            entry[size][fmt] = name
+        return entry
+
+    @staticmethod
+    async def _render(job: RenderJob, content_hash: Optional[str] = None) -> RenderResult:
+        """
+        Render through render_cache: cached pages are copied into place, only the
+        others go to the process pool. `content_hash` is the file's sha256
+        (Document.content_hash); it is computed when not given.
+        """
+        if not render_cache.enabled:
+            return await render_engine.render(job)
+        loop = asyncio.get_running_loop()
+        try:
+            digest = content_hash or await loop.run_in_executor(None, PDFService._file_digest, job.file_path)
+            page_count = render_cache.page_count(digest)
+            if page_count is not None:
+                job = dataclasses.replace(job, pages=[i for i in job.pages if 0 <= i < page_count])
+            os.makedirs(os.path.dirname(os.path.join(job.output_dir, job.name_prefix)), exist_ok=True)
+            restored = await loop.run_in_executor(None, render_cache.fetch, job, digest)
+        except Exception as e:
+            logger.warning(f"Render cache unavailable: {e}")
+            return await render_engine.render(job)
+
+        missing = [i for i in job.pages if i not in restored]
+        result = RenderResult(page_count=page_count or 0)
+        if missing:
+            result = await render_engine.render(dataclasses.replace(job, pages=missing))
+            if result.page_count:
+                render_cache.set_page_count(digest, result.page_count)
+        # Only pages this render produced; a failed page is simply not listed
+        if job.widths:
+            rendered = [entry["page"] - 1 for entry in result.variants]
+        else:
+            names = set(result.images)
+            rendered = [i for i in missing if job.page_files(i + 1)[0][0] in names]
+        if rendered:
+            await loop.run_in_executor(None, render_cache.store, job, digest, rendered)
+
+        # Results in the order of job.pages, as if everything had been rendered
+        if job.widths:
+            entries = {entry["page"]: entry for entry in result.variants}
+            for i in restored:
+                entries[i + 1] = PDFService._describe_page(job, i + 1)
+            result.variants = [entries[i + 1] for i in job.pages if i + 1 in entries]
+        else:
+            names = set(result.images)
+            result.images = [
+                job.page_files(i + 1)[0][0] for i in job.pages
+                if i in restored or job.page_files(i + 1)[0][0] in names
+            ]
+        return result
+
+    @staticmethod
+    async def generate_screenshots_async(
+        file_path: str,
+        output_dir: str,
+        page_indices: List[int] = None,
+        max_pages: int = 3,
+        content_hash: str = None,
+    ) -> List[str]:
+        """
+        Generate screenshots for specific pages or first N pages, rendered by the
+        process pool so the event loop never blocks. Returns list of relative
+        paths to the screenshots ("screenshots/ab/cd/...").
+        Pages already in the render cache are not rendered again.
+        """
+        if not os.path.exists(file_path):
+            logger.error(f"File not found: {file_path}")
+            return []
+
+        job = PDFService._screenshot_job(file_path, output_dir, page_indices, max_pages)
+        result = await PDFService._render(job, content_hash)
+        if result.error:
+            logger.error(f"Error generating screenshots: {result.error}")
+        return PDFService._screenshot_paths(output_dir, result.images)
+
+    @staticmethod
+    async def generate_previews_async(
+        file_path: str,
+        output_dir: str,
+        page_indices: List[int] = None,
+        max_pages: int = 3,
+        widths: Dict[str, int] = None,
+        quality: Dict[str, int] = None,
+        content_hash: str = None,
+    ) -> List[dict]:
         """
-        Generate screenshots for specific pages or first N pages.
-        Returns list of relative paths to the screenshots.
+        Render every page at each preview width (settings.PREVIEW_WIDTHS) as WebP and
+        progressive JPEG; `quality` overrides the default {"webp": q, "jpg": q}.
+        Returns one entry per page: {"page": n, "card": {"width", "height", "webp", "jpg"}, ...}
+        with file paths relative like generate_screenshots_async ("screenshots/ab/cd/...").
+        Pages already in the render cache are not rendered again.
         """
         if not os.path.exists(file_path):
             logger.error(f"File not found: {file_path}")
             return []
 
+        job = PDFService._screenshot_job(file_path, output_dir, page_indices, max_pages)
+        job.widths = widths or settings.PREVIEW_WIDTHS
+        job.formats = {"webp": settings.PREVIEW_WEBP_QUALITY, "jpg": settings.PREVIEW_JPEG_QUALITY}
+        job.formats.update(quality or {})
+        result = await PDFService._render(job, content_hash)
+        if result.error:
+            logger.error(f"Error generating previews: {result.error}")
+        
+        rel_dir = os.path.basename(output_dir)
+        for entry in result.variants:
+            for size in job.widths:
+                variant = entry[size]
+                for fmt in job.formats:
+                    variant[fmt] = f"{rel_dir}/{variant[fmt]}"
+        return result.variants
+
+    @staticmethod
+    def join_page_text(file_path: str, pages: List[Tuple[int, str, Optional[str]]]) -> str:
+        """The text of the pages that were extracted; failed pages are logged and left out."""
+        failed = [f"{number} ({error})" for number, _, error in pages if error]
+        if failed:
+            logger.warning(f"Text of {file_path}: skipped pages {', '.join(failed)}")
+        return "\n".join(text for _, text, error in pages if not error)
+
+    @staticmethod
+    async def _extract_page(file_path: str, index: int, page_timeout: float) -> List[Tuple[int, str, Optional[str]]]:
+        error = "worker crashed"
+        # Every job in the pool fails when one worker dies: try again before blaming this page
+        for _ in range(2):
+            try:
+                return await render_engine.submit(extract_page_batch, file_path, index, 1, page_timeout, timeout=page_timeout)
+            except RenderTimeout:
+                return [(index + 1, "", "timeout")]
+            except BrokenProcessPool:
+                continue
+            except Exception as e:
+                error = str(e)[:255] or type(e).__name__
+                break
+        return [(index + 1, "", error)]
+
+    @staticmethod
+    async def _extract_batch(file_path: str, start: int, count: int, page_timeout: float) -> List[Tuple[int, str, Optional[str]]]:
         try:
-            pdf = pdfium.PdfDocument(file_path)
-            total_pages = len(pdf)
-            
-            if page_indices:
-                # Use specific pages, filter out invalid ones
-                pages_to_render = [p for p in page_indices if 0 <= p < total_pages]
-            else:
-                # Use first N pages
-                pages_to_render = list(range(min(max_pages, total_pages)))
-            
-            screenshot_paths = []
-            
-            # Ensure output directory exists
-            os.makedirs(output_dir, exist_ok=True)
-            
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            
-            for i in pages_to_render:
-                page = pdf[i]
-                # Render page to bitmap
-                bitmap = page.render(scale=2.0) # Scale 2.0 for better quality
-                pil_image = bitmap.to_pil()
-                
-                # Save image
-                image_filename = f"{base_name}_page_{i+1}.jpg"
-                image_path = os.path.join(output_dir, image_filename)
-                pil_image.save(image_path)
-                
-                # Return path relative to static/uploads or similar
-                # Assuming output_dir is .../static/screenshots
-                # We return "screenshots/filename.jpg"
-                rel_dir = os.path.basename(output_dir)
-                screenshot_paths.append(f"{rel_dir}/{image_filename}")
-                
-            return screenshot_paths
-            
+            return await render_engine.submit(
+                extract_page_batch, file_path, start, count, page_timeout, timeout=page_timeout * count
+            )
+        except (RenderTimeout, BrokenProcessPool, MemoryError) as e:
+            reason = "timed out" if isinstance(e, RenderTimeout) else "lost its worker"
+            logger.warning(f"Text extraction of pages {start + 1}-{start + count} of {file_path} {reason}, retrying page by page")
+        batch = []
+        for i in range(start, start + count):
+            batch.extend(await PDFService._extract_page(file_path, i, page_timeout))
+        return batch
+
+    @staticmethod
+    async def iter_page_text_async(
+        file_path: str, batch_pages: int = None, page_timeout: float = None, max_pages: int = None
+    ) -> AsyncIterator[List[Tuple[int, str, Optional[str]]]]:
+        """
+        Text of every page (or the first `max_pages`) as batches of
+        (page_number, text, error), in page order. Batches are extracted by the
+        process pool, TEXT_PARALLEL_BATCHES at a time, so memory stays bounded
+        by that many batches. If a batch overruns (pdfium stuck on a page) or
+        its worker dies (memory limit), its pages are retried one by one and
+        the page at fault is recorded with error "timeout" or "worker crashed";
+        the other pages keep their text.
+        """
+        batch_pages = batch_pages or settings.TEXT_BATCH_PAGES
+        page_timeout = page_timeout or settings.TEXT_PAGE_TIMEOUT
+        parallel = settings.TEXT_PARALLEL_BATCHES or render_engine.workers
+        page_count = await render_engine.submit(count_pages, file_path)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+
+        starts = iter(range(0, page_count, batch_pages))
+
+        def schedule(start: int) -> asyncio.Task:
+            count = min(batch_pages, page_count - start)
+            return asyncio.ensure_future(PDFService._extract_batch(file_path, start, count, page_timeout))
+
+        pending = deque(schedule(start) for start in islice(starts, parallel))
+        try:
+            while pending:
+                batch = await pending.popleft()
+                # Keep the workers busy while the caller stores this batch
+                start = next(starts, None)
+                if start is not None:
+                    pending.append(schedule(start))
+                yield batch
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def store_page_text(db, document_id: int, file_path: str) -> int:
+        """
+        Replace the document_pages rows of a document with the text of every page,
+        one bulk INSERT per batch, committed together. Returns the number of pages.
+        """
+        from app import crud
+
+        pages = 0
+        # A savepoint: on failure the old rows stay and the caller's objects are not expired
+        async with db.begin_nested():
+            await crud.document_page.clear(db, document_id=document_id)
+            async for batch in PDFService.iter_page_text_async(file_path):
+                await crud.document_page.bulk_insert(db, document_id=document_id, pages=batch)
+                pages += len(batch)
+            # Signals the search index to pick up the new text
+            await crud.document.touch(db, id=document_id)
+        await db.commit()
+        return pages
+
+    @staticmethod
+    async def read_structure_async(file_path: str) -> Optional[dict]:
+        """read_structure in the process pool; None if the file cannot be parsed."""
+        try:
+            return await render_engine.submit(read_structure, file_path, timeout=settings.STRUCTURE_TIMEOUT)
         except Exception as e:
-            logger.error(f"Error generating screenshots: {e}")
-            return []
+            logger.error(f"Error reading PDF structure of {file_path}: {e}")
+            return None
 
     @staticmethod
-    def extract_text(file_path: str, max_pages: int = 5) -> str:
+    def _spill(fileobj: BinaryIO) -> Tuple[str, bool]:
+        """A path with the content of `fileobj`, and whether it is a temp copy to delete."""
+        name = getattr(fileobj, "name", None)
+        # Staged files are real files; UploadFile spools to an anonymous one
+        if isinstance(name, str) and os.path.isfile(name):
+            return name, False
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            fileobj.seek(0)
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(fileobj, out, settings.UPLOAD_CHUNK_SIZE)
+        except Exception:
+            os.remove(path)
+            raise
+        finally:
+            fileobj.seek(0)
+        return path, True
+
+    @staticmethod
+    async def read_structure_fileobj_async(fileobj: BinaryIO) -> Optional[dict]:
+        """read_structure for an upload that has not been stored anywhere with a path yet."""
+        try:
+            path, temporary = await asyncio.to_thread(PDFService._spill, fileobj)
+        except Exception as e:
+            logger.error(f"Error reading PDF structure: {e}")
+            return None
+        try:
+            return await PDFService.read_structure_async(path)
+        finally:
+            if temporary:
+                os.remove(path)
+
+    @staticmethod
+    async def store_structure(document_id: int) -> None:
         """
-        Extract text from first N pages for AI analysis.
+        Read the structure of a stored document and save it, in a session of its
+        own: runs as a background task after the request that created the document.
+        """
+        from app import crud
+        from app.db.session import SessionLocal
+
+        async with SessionLocal() as db:
+            document = await crud.document.get(db, id=document_id)
+            if not document or document.structure_extracted_at is not None:
+                return
+            try:
+                async with file_cache.local_copy(document.file_path, document.content_hash) as path:
+                    structure = await PDFService.read_structure_async(path)
+            except Exception as e:
+                logger.error(f"Error fetching document {document_id} for structure extraction: {e}")
+                return
+            if structure:
+                crud.document.apply_structure(document, structure)
+                await db.commit()
+
+    @staticmethod
+    async def extract_text_async(file_path: str, max_pages: int = 5) -> str:
+        """
+        Text of the first N pages, extracted page by page in the process pool.
+        Pages that time out or fail are left out; the rest is still returned.
         """
         if not os.path.exists(file_path):
             return ""
-            
+        pages = []
         try:
-            pdf = pdfium.PdfDocument(file_path)
-            text_content = []
-            
-            for i in range(min(max_pages, len(pdf))):
+            async for batch in PDFService.iter_page_text_async(file_path, max_pages=max_pages):
+                pages.extend(batch)
+        except Exception as e:
+            # Only the pages before the failure
+            logger.error(f"Error extracting text: {str(e) or type(e).__name__}")
+        return PDFService.join_page_text(file_path, pages)
+
+def iter_page_text(
+    file_path: str, start: int = 0, page_timeout: float = None, max_chars: int = None
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    Yield (page_number, text, error) for every page from `start` (0-based), one
+    page in memory at a time. In a render pool worker a page that runs past
+    `page_timeout` yields error "timeout" and extraction continues.
+    """
+    max_chars = max_chars or settings.TEXT_MAX_PAGE_CHARS
+    # Only where the pool initializer installed the alarm handler: the default action kills the process
+    use_alarm = (
+        page_timeout and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+        and signal.getsignal(signal.SIGALRM) is _on_alarm
+    )
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        for i in range(start, len(pdf)):
+            page = textpage = None
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
                 page = pdf[i]
                 textpage = page.get_textpage()
-                text_content.append(textpage.get_text_range())
-                
-            return "\n".join(text_content)
-        except Exception as e:
-            logger.error(f"Error extracting text: {e}")
-            return ""
+                text, error = textpage.get_text_range()[:max_chars], None
+            except RenderTimeout:
+                text, error = "", "timeout"
+            except MemoryError:
+                text, error = "", "out of memory"
+            except Exception as e:
+                text, error = "", str(e)[:255] or type(e).__name__
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+                if textpage is not None:
+                    textpage.close()
+                if page is not None:
+                    page.close()
+            yield i + 1, text, error
+    finally:
+        pdf.close()
+
+
+def count_pages(file_path: str) -> int:
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def extract_page_batch(file_path: str, start: int, count: int, page_timeout: float = None) -> List[Tuple[int, str, Optional[str]]]:
+    """Text of pages [start, start + count) (0-based). Runs inside a pool worker."""
+    return list(islice(iter_page_text(file_path, start, page_timeout), count))
+
+
+# A linearized file begins with its linearization dictionary, within the first 1024 bytes
+LINEARIZED_PROBE_BYTES = 1024
+
+
+def pack_page_sizes(sizes: List[Tuple[float, float]]) -> bytes:
+    """(width, height) per page as little-endian float32 pairs: 8 bytes a page."""
+    packed = array("f", (value for size in sizes for value in size))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_page_sizes(data: Optional[bytes]) -> List[Tuple[float, float]]:
+    if not data:
+        return []
+    packed = array("f")
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return list(zip(packed[0::2], packed[1::2]))
+
+
+def read_structure(file_path: str, max_outline: int = None) -> dict:
+    """
+    Page count, page sizes, info dictionary, outline and linearization of a PDF,
+    read from the page tree and catalog without loading any page content. Runs
+    inside a pool worker; returns the Document column values.
+    """
+    max_outline = max_outline or settings.STRUCTURE_MAX_OUTLINE
+    with open(file_path, "rb") as f:
+        linearized = b"/Linearized" in f.read(LINEARIZED_PROBE_BYTES)
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        page_count = len(pdf)
+        # FPDF_GetPageSizeByIndexF: the MediaBox, without parsing the page
+        sizes = [pdf.get_page_size(i) for i in range(page_count)]
+        info = {key: value[:500] for key, value in pdf.get_metadata_dict(skip_empty=True).items()}
+        outline = []
+        for bookmark in islice(pdf.get_toc(), max_outline):
+            dest = bookmark.get_dest()
+            index = dest.get_index() if dest is not None else None
+            outline.append([bookmark.level, bookmark.get_title(), index + 1 if index is not None else None])
+    finally:
+        pdf.close()
+    return {
+        "page_count": page_count,
+        "page_sizes": pack_page_sizes(sizes),
+        "pdf_info": json.dumps(info, ensure_ascii=False) if info else None,
+        "outline": json.dumps(outline, ensure_ascii=False) if outline else None,
+        "is_linearized": linearized,
+    }
+
 
 pdf_service = PDFService()
+
+
+class PageRenderError(Exception):
+    """A page that exists could not be rendered (pdfium error, timeout, broken pool)."""
+
+
+class PageRenderer:
+    """
+    Single preview images rendered on first request (GET /documents/{id}/pages/{n}).
+
+    - Hits are read straight from render_cache, which also holds the pages
+      rendered at analyze time.
+    - Concurrent misses for the same image share one render.
+    - At most PAGE_RENDER_CONCURRENCY misses per process render at a time, so
+      visitors paging through a new document cannot starve analysis of the pool.
+    """
+
+    def __init__(self, concurrency: int = None):
+        self.concurrency = concurrency or settings.PAGE_RENDER_CONCURRENCY
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def render(
+        self,
+        ref: str,
+        content_hash: Optional[str],
+        page_number: int,
+        size: str,
+        fmt: str,
+        quality: int,
+    ) -> Optional[bytes]:
+        """
+        Image bytes of a 1-based page at a PREVIEW_WIDTHS size, or None if the
+        page does not exist. Raises PageRenderError when rendering it fails.
+        """
+        job = RenderJob(
+            file_path="",
+            output_dir="",
+            name_prefix="page",
+            pages=[page_number - 1],
+            widths={size: settings.PREVIEW_WIDTHS[size]},
+            formats={fmt: quality},
+        )
+        loop = asyncio.get_running_loop()
+        if content_hash and render_cache.enabled:
+            key = render_cache.cache_key(content_hash, job, page_number, size, fmt, quality)
+            data = await loop.run_in_executor(None, render_cache.read, key)
+            if data is not None:
+                return data
+
+        # The render is a task of its own: a client hanging up does not cancel it for the others
+        inflight_key = f"{content_hash or ref}:{page_number}:{size}:{fmt}:{quality}"
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(ref, content_hash, job))
+            self._inflight[inflight_key] = task
+
+            def done(task: asyncio.Future) -> None:
+                self._inflight.pop(inflight_key, None)
+                # Every waiter may have hung up: retrieve the error so it is not logged as unhandled
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def _render(self, ref: str, content_hash: Optional[str], job: RenderJob) -> Optional[bytes]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            async with file_cache.local_copy(ref, content_hash) as fs_path:
+                output_dir = await loop.run_in_executor(None, tempfile.mkdtemp, "", "page-")
+                try:
+                    job = dataclasses.replace(job, file_path=fs_path, output_dir=output_dir)
+                    result = await PDFService._render(job, content_hash)
+                    if not result.variants:
+                        # page_count is known whenever the file could be opened
+                        if result.page_count and job.pages[0] >= result.page_count:
+                            return None
+                        error = result.error or f"page {job.pages[0] + 1}: no image"
+                        logger.error(f"Page render failed for {ref}: {error}")
+                        raise PageRenderError(error)
+                    name = job.page_files(job.pages[0] + 1)[0][0]
+                    with open(os.path.join(output_dir, name), "rb") as f:
+                        return f.read()
+                finally:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+page_renderer = PageRenderer()
@@ -0,0 +1,374 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError: # not on Windows: workers run without a memory limit
+    resource = None
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+@dataclass
+class RenderJob:
+    file_path: str
+    output_dir: str
+    # Image files are named "{name_prefix}_page_{n}.{format}" below output_dir
+    name_prefix: str
+    pages: List[int] = field(default_factory=list) # 0-based, out-of-range pages are skipped
+    scale: float = 2.0
+    format: str = "jpg"
+    timeout: Optional[float] = None
+    # Preview mode: {"thumb": 240, ...} target widths; each page is rasterized once
+    # for the widest one, downscaled for the others and saved in every format
+    widths: Dict[str, int] = field(default_factory=dict)
+    # {"webp": quality, "jpg": quality}
+    formats: Dict[str, int] = field(default_factory=dict)
+
+    def page_files(self, page_number: int) -> List[Tuple[str, str, str, Optional[int]]]:
+        """(file name, size, format, quality) of every image rendered for a 1-based page."""
+        if self.widths:
+            return [
+                (f"{self.name_prefix}_page_{page_number}_{size}.{fmt}", size, fmt, quality)
+                for size in self.widths
+                for fmt, quality in self.formats.items()
+            ]
+        return [(f"{self.name_prefix}_page_{page_number}.{self.format}", None, self.format, None)]
+
+
+@dataclass
+class RenderResult:
+    images: List[str] = field(default_factory=list) # relative to output_dir
+    page_count: int = 0
+    error: Optional[str] = None
+    # Preview mode: one entry per page, {"page": n, "<size>": {"width", "height", "<format>": file}}
+    variants: List[dict] = field(default_factory=list)
+
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout("Render job timed out")
+
+
+# In a worker: where jobs report (job id, pid) when they start, see RenderEngine.submit
+_started_queue = None
+
+
+def _init_worker(started_queue=None):
+    global _started_queue
+    _started_queue = started_queue
+    # Each worker process owns its own pdfium library state (pdfium is not thread-safe)
+    import pypdfium2  # noqa: F401
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_alarm)
+    # Past the limit allocations fail (MemoryError, or pdfium aborts and the pool
+    # is rebuilt): one huge or malformed PDF fails its own job, not the host
+    limit = settings.RENDER_WORKER_MAX_MEMORY_MB * 1024 * 1024
+    if limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_job(job_id: int, fn: Callable, args: tuple) -> Any:
+    """Pool entry point: tell the parent the job started in this process, then run it."""
+    if _started_queue is not None:
+        _started_queue.put((job_id, os.getpid()))
+    return fn(*args)
+
+
+# Upscaling past this adds bytes, not detail
+MAX_PREVIEW_SCALE = 4.0
+
+
+def _save_image(image, path: str, fmt: str, quality: int) -> None:
+    if fmt == "webp":
+        image.save(path, "WEBP", quality=quality, method=4)
+    elif fmt in ("jpg", "jpeg"):
+        # Progressive JPEGs render a usable preview before the download completes
+        image.convert("RGB").save(path, "JPEG", quality=quality, progressive=True, optimize=True)
+    else:
+        image.save(path)
+
+
+def _render_variants(job: RenderJob, page, page_number: int) -> dict:
+    from PIL import Image
+
+    widest = max(job.widths.values())
+    scale = min(widest / page.get_width(), MAX_PREVIEW_SCALE)
+    bitmap = page.render(scale=scale)
+    try:
+        # Shares the bitmap's buffer: only valid until the bitmap is closed
+        image = bitmap.to_pil()
+        entry = {"page": page_number}
+        for size, width in sorted(job.widths.items(), key=lambda item: -item[1]):
+            if width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            else:
+                resized = image
+            entry[size] = {"width": resized.width, "height": resized.height}
+            for name, file_size, fmt, quality in job.page_files(page_number):
+                if file_size == size:
+                    _save_image(resized, os.path.join(job.output_dir, name), fmt, quality)
+                    entry[size][fmt] = name
+        return entry
+    finally:
+        bitmap.close()
+
+
+def render_pages(job: RenderJob) -> RenderResult:
+    """
+    Rasterize the requested pages of a PDF to image files. Runs inside a pool
+    worker. A page that fails is skipped and named in `error`; when the job
+    deadline passes, the pages rendered so far are returned.
+    """
+    import pypdfium2 as pdfium
+
+    # Soft per-job deadline; the parent kills the worker if pdfium ignores it
+    use_alarm = job.timeout and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        signal.setitimer(signal.ITIMER_REAL, job.timeout)
+    pdf = None
+    try:
+        pdf = pdfium.PdfDocument(job.file_path)
+        page_count = len(pdf)
+        images = []
+        variants = []
+        errors = []
+        os.makedirs(os.path.dirname(os.path.join(job.output_dir, job.name_prefix)), exist_ok=True)
+        for i in job.pages:
+            if not 0 <= i < page_count:
+                continue
+            page = bitmap = None
+            try:
+                page = pdf[i]
+                if job.widths:
+                    variants.append(_render_variants(job, page, i + 1))
+                else:
+                    bitmap = page.render(scale=job.scale)
+                    name = job.page_files(i + 1)[0][0]
+                    bitmap.to_pil().save(os.path.join(job.output_dir, name))
+                    images.append(name)
+            except RenderTimeout:
+                errors.append(f"page {i + 1}: timeout")
+                break
+            except Exception as e:
+                errors.append(f"page {i + 1}: {str(e) or type(e).__name__}")
+            finally:
+                if bitmap is not None:
+                    bitmap.close()
+                if page is not None:
+                    page.close()
+        return RenderResult(images=images, page_count=page_count, variants=variants, error="; ".join(errors) or None)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if pdf is not None:
+            pdf.close()
+
+
+def _available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@dataclass
+class _Job:
+    pool: ProcessPoolExecutor
+    loop: asyncio.AbstractEventLoop
+    started: asyncio.Event
+    pid: Optional[int] = None # worker running it, once started
+    stuck: bool = False
+
+
+class RenderEngine:
+    """
+    Runs pdfium work in a pool of worker processes so API workers only await it.
+    The pool is created on first use (processes that never render never spawn
+    one) and is rebuilt if a worker crashes. A job that overruns its timeout
+    retires the pool: new jobs go to a fresh one, the jobs still running in the
+    old one finish, then the stuck worker is killed.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or settings.RENDER_WORKERS or _available_cores()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[int, _Job] = {}
+        self._job_ids = itertools.count(1)
+        # Pools that take no new jobs since one of their workers got stuck
+        self._retired: List[ProcessPoolExecutor] = []
+        self._started_queue = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # fork would copy the API worker's threads and open connections
+                context = multiprocessing.get_context("spawn")
+                if self._started_queue is None:
+                    self._started_queue = context.SimpleQueue()
+                    threading.Thread(target=self._watch_starts, args=(self._started_queue,), daemon=True).start()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._started_queue,),
+                )
+            return self._pool
+
+    def _watch_starts(self, queue) -> None:
+        """Thread: record which worker started each job and wake its submitter."""
+        while True:
+            message = queue.get()
+            if message is None:
+                return
+            job_id, pid = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job.pid = pid
+            if job is not None:
+                try:
+                    job.loop.call_soon_threadsafe(job.started.set)
+                except RuntimeError: # the submitting event loop has closed
+                    pass
+
+    def _job_done(self, job_id: int) -> None:
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            self._reap(job.pool)
+
+    def _retire(self, pool: ProcessPoolExecutor, job: _Job) -> None:
+        """
+        Send no new jobs to `pool`, whose worker is stuck on `job`. Killing the
+        worker at once would fail every job in the pool (ProcessPoolExecutor
+        breaks when any worker dies), so that waits until the jobs still
+        running there are done; see _reap.
+        """
+        with self._lock:
+            job.stuck = True
+            if self._pool is pool:
+                self._pool = None
+            if pool not in self._retired:
+                self._retired.append(pool)
+        self._reap(pool)
+
+    def _reap(self, pool: ProcessPoolExecutor) -> None:
+        """Kill the stuck workers of a retired pool once nothing else runs in it."""
+        with self._lock:
+            if pool not in self._retired:
+                return
+            jobs = [job for job in self._jobs.values() if job.pool is pool]
+            if any(job.pid is not None and not job.stuck for job in jobs):
+                return
+            self._retired.remove(pool)
+        # Jobs still queued there fail with BrokenProcessPool and are resubmitted by submit
+        processes = getattr(pool, "_processes", None) or {}
+        for pid in {job.pid for job in jobs if job.stuck}:
+            process = processes.get(pid)
+            if process is not None:
+                logger.warning(f"Killing stuck render worker {pid}")
+                process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _restart(self, pool: ProcessPoolExecutor) -> None:
+        """A worker died: ProcessPoolExecutor has failed every job in `pool`, replace it."""
+        with self._lock:
+            if self._pool is not pool:
+                return # already replaced
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run a picklable function in the pool and await its result. `timeout`
+        counts from when a worker starts the job, not while it waits in the
+        queue; past it only that job's worker is given up on.
+        """
+        timeout = timeout or settings.RENDER_JOB_TIMEOUT
+        loop = asyncio.get_running_loop()
+        # A job that never started is resubmitted when its pool is retired or breaks
+        for _ in range(3):
+            pool = self._get_pool()
+            job_id = next(self._job_ids)
+            job = _Job(pool, loop, asyncio.Event())
+            with self._lock:
+                self._jobs[job_id] = job
+            try:
+                cfuture = pool.submit(_run_job, job_id, fn, args)
+            except RuntimeError: # broken (or shut down) since _get_pool
+                self._job_done(job_id)
+                self._restart(pool)
+                continue
+            cfuture.add_done_callback(lambda _, job_id=job_id: self._job_done(job_id))
+            future = asyncio.wrap_future(cfuture)
+            started = asyncio.ensure_future(job.started.wait())
+            try:
+                await asyncio.wait({future, started}, return_when=asyncio.FIRST_COMPLETED)
+                if not future.done():
+                    # Grace period on top of the in-worker alarm
+                    await asyncio.wait({future}, timeout=timeout + 5)
+            except asyncio.CancelledError:
+                future.cancel() # drops the job if it is still queued
+                raise
+            finally:
+                started.cancel()
+
+            if not future.done():
+                future.cancel()
+                logger.error(f"Render job exceeded {timeout}s, retiring worker {job.pid}")
+                self._retire(pool, job)
+                raise RenderTimeout(f"Render job exceeded {timeout}s")
+            if future.cancelled():
+                continue
+            if isinstance(future.exception(), BrokenProcessPool):
+                self._restart(pool)
+                if job.pid is None:
+                    continue
+            return future.result()
+        raise BrokenProcessPool("Render pool failed before the job could start")
+
+    async def render(self, job: RenderJob) -> RenderResult:
+        job.timeout = job.timeout or settings.RENDER_JOB_TIMEOUT
+        try:
+            return await self.submit(render_pages, job, timeout=job.timeout)
+        except Exception as e:
+            logger.error(f"Error rendering {job.file_path}: {e}")
+            return RenderResult(error=str(e) or type(e).__name__)
+
+    async def render_many(self, jobs: List[RenderJob]) -> List[RenderResult]:
+        """Render a batch of jobs concurrently; results are in job order."""
+        return list(await asyncio.gather(*(self.render(job) for job in jobs)))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, retired = self._pool, self._retired
+            self._pool, self._retired = None, []
+            queue, self._started_queue = self._started_queue, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        for pool in retired:
+            # Their stuck workers would otherwise keep the interpreter from exiting
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.kill()
+            pool.shutdown(wait=False, cancel_futures=True)
+        if queue is not None:
+            queue.put(None)
+
+render_engine = RenderEngine()
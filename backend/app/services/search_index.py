@@ -0,0 +1,515 @@
+"""
+In-process full-text index over published documents: titles, descriptions,
+AI summaries and the extracted page text (document_pages), ranked with BM25.
+
+- Words are lowercased; runs of CJK characters are split into overlapping
+  bigrams, so Chinese/Japanese/Korean text needs no dictionary. Every CJK
+  character is indexed on its own as well, so a one-character query matches
+  it inside longer runs. A query matches documents containing all of its
+  terms (AND).
+- Postings are two compact arrays per term (document numbers, weighted term
+  frequencies), about 8 bytes per (term, document), sorted by document number,
+  so a multi-term query walks the shortest list and binary-searches the others.
+  Long lists (frequent words, common CJK characters) are not walked: on first
+  use they get a copy ordered by score contribution and a bitmap, which give
+  the exact number of matches and let scoring stop once no document further
+  down can still enter the requested page.
+- Every worker process owns an index. It is built from the database on the
+  first search and then refreshed incrementally every SEARCH_REFRESH_SECONDS
+  from the documents updated (or re-extracted) since the last refresh; once a
+  quarter of the entries are stale it is rebuilt.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.document import Document, DocumentPage, DocumentStatus
+
+logger = logging.getLogger(__name__)
+
+# Hiragana/katakana, CJK ideographs (+ extension A, compatibility) and Hangul
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+CJK_RE = re.compile(f"[{CJK}]")
+TOKEN_RE = re.compile(f"[{CJK}]+|[^\\W_{CJK}]+")
+MAX_TOKEN_LEN = 40
+
+# Field weights: a title hit counts three times as much as a body hit
+FIELD_WEIGHTS = (("title", 3.0), ("description", 1.0), ("ai_summary", 1.0), ("pages", 1.0))
+
+# Documents read from the database per query while (re)building
+LOAD_BATCH = 200
+
+# Posting lists this long are searched through a bitmap and their best
+# postings, kept for the LONG_CACHE_TERMS most recently queried terms
+LONG_POSTINGS = 4096
+LONG_CACHE_TERMS = 2048
+_BITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def _bitmap(flags: bytes) -> int:
+    """Integer with bit i set where flags[i] is 1."""
+    return int(bytes(flags)[::-1].translate(_BITS) or b"0", 2)
+
+
+def _set_bits(data: bytes) -> Iterator[int]:
+    """Positions of the set bits of a little-endian bitmap."""
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def tokenize(text: str, unigrams: bool = False) -> List[str]:
+    """
+    Terms of a text: lowercased words and CJK bigrams (a lone CJK character
+    stays a unigram). With `unigrams`, for indexing, every character of a
+    longer CJK run is a term too.
+    """
+    tokens = []
+    for run in TOKEN_RE.findall(text.lower()):
+        if CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+                if unigrams:
+                    tokens.extend(run)
+        elif len(run) <= MAX_TOKEN_LEN:
+            tokens.append(run)
+    return tokens
+
+
+class SearchHit(NamedTuple):
+    document_id: int
+    score: float
+
+
+class LongPostings(NamedTuple):
+    # Of the first `size` postings of a term: the document numbers of the
+    # SEARCH_MAX_CANDIDATES with the highest tf / (tf + norm), and a bitmap of all
+    docnos: array
+    bits: int
+    size: int
+
+
+class SearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # term -> (document numbers ascending, weighted term frequencies)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        # Per document number: document id, weighted length, BM25 length norm, live flag
+        self._doc_ids = array("I")
+        self._lengths = array("f")
+        self._norms = array("f")
+        self._live = bytearray()
+        self._docnos: Dict[int, int] = {} # live document id -> document number
+        self._versions: Dict[int, datetime] = {} # document id -> updated_at when indexed
+        self._total_length = 0.0
+        self._norm_avg = 0.0 # average length the norms were computed with
+        self._generation = 0
+        self._results: "OrderedDict[tuple, Tuple[int, List[SearchHit]]]" = OrderedDict()
+        self._long: "OrderedDict[str, LongPostings]" = OrderedDict()
+        self._live_bits: Optional[int] = None
+        # Refresh state
+        self._ready = False
+        self._watermark: Optional[datetime] = None
+        self._refreshed_at = 0.0
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    def __len__(self) -> int:
+        return len(self._docnos)
+
+    @property
+    def stale(self) -> int:
+        return len(self._doc_ids) - len(self._docnos)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._docnos),
+                "stale": self.stale,
+                "terms": len(self._postings),
+                "postings": sum(len(docnos) for docnos, _ in self._postings.values()),
+                "watermark": self._watermark.isoformat() if self._watermark else None,
+            }
+
+    # --- Indexing ---
+
+    @staticmethod
+    def document_fields(document: Document, pages_text: str = "") -> Dict[str, str]:
+        return {
+            "title": document.title or "",
+            "description": document.description or "",
+            # The analysis stores the same summary in both: count it once
+            "ai_summary": document.ai_summary if document.ai_summary != document.description else "",
+            "pages": pages_text,
+        }
+
+    def add(self, document_id: int, fields: Dict[str, str], version: datetime = None) -> None:
+        """Index a document, replacing its previous entry. `version` is its updated_at."""
+        frequencies = Counter()
+        for name, weight in FIELD_WEIGHTS:
+            text = fields.get(name)
+            if text:
+                for term in tokenize(text, unigrams=True):
+                    frequencies[term] += weight
+        length = sum(frequencies.values())
+
+        with self._lock:
+            self._remove(document_id)
+            docno = len(self._doc_ids)
+            self._doc_ids.append(document_id)
+            self._lengths.append(length)
+            self._norms.append(self._norm(length))
+            self._live.append(1)
+            self._docnos[document_id] = docno
+            self._versions[document_id] = version
+            self._total_length += length
+            for term, tf in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("I"), array("f"))
+                postings[0].append(docno)
+                postings[1].append(tf)
+            self._changed()
+
+    def remove(self, document_id: int) -> None:
+        with self._lock:
+            if self._remove(document_id):
+                self._changed()
+
+    def _remove(self, document_id: int) -> bool:
+        """Called with the lock held. The postings stay until the next rebuild."""
+        docno = self._docnos.pop(document_id, None)
+        self._versions.pop(document_id, None)
+        if docno is None:
+            return False
+        self._live[docno] = 0
+        self._total_length -= self._lengths[docno]
+        return True
+
+    def _norm(self, length: float) -> float:
+        average = self._norm_avg or length or 1.0
+        return self.k1 * (1 - self.b + self.b * length / average)
+
+    def _changed(self) -> None:
+        """Called with the lock held."""
+        self._generation += 1
+        self._results.clear()
+        self._live_bits = None
+        # Length norms follow the average document length once it drifts by 10%
+        average = self._total_length / len(self._docnos) if self._docnos else 0.0
+        if average and abs(average - self._norm_avg) > 0.1 * average:
+            self._norm_avg = average
+            self._norms = array("f", (self._norm(length) for length in self._lengths))
+            self._long.clear()
+
+    # --- Querying ---
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[SearchHit]]:
+        """(number of matching documents, hits ranked by BM25 for the requested page)."""
+        terms = tuple(sorted(set(tokenize(query))))
+        if not terms:
+            return 0, []
+        key = (terms, offset + limit)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                total, hits = cached
+                return total, hits[offset:]
+            generation = self._generation
+            total, hits = self._search(terms, offset + limit)
+            if generation == self._generation:
+                self._results[key] = (total, hits)
+                while len(self._results) > settings.SEARCH_CACHE_SIZE:
+                    self._results.popitem(last=False)
+        return total, hits[offset:]
+
+    def _search(self, terms: Tuple[str, ...], top: int) -> Tuple[int, List[SearchHit]]:
+        """Called with the lock held."""
+        lists = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                return 0, []
+            lists.append((term, postings))
+        lists.sort(key=lambda item: len(item[1][0]))
+        if len(lists[0][1][0]) >= LONG_POSTINGS and top <= settings.SEARCH_MAX_CANDIDATES:
+            result = self._search_long(lists, top)
+            if result is not None:
+                return result
+
+        # Document frequencies include replaced entries until the next rebuild, so count them in N too
+        n = len(self._doc_ids)
+        k1_plus_1 = self.k1 + 1
+        live, norms = self._live, self._norms
+
+        def idf(df: int) -> float:
+            return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        # Score the shortest list, then keep only documents every other term matches
+        docnos, tfs = lists[0][1]
+        weight = idf(len(docnos)) * k1_plus_1
+        scores = {
+            docno: weight * tf / (tf + norms[docno])
+            for docno, tf in zip(docnos, tfs) if live[docno]
+        }
+        for _, (docnos, tfs) in lists[1:]:
+            if not scores:
+                break
+            weight = idf(len(docnos)) * k1_plus_1
+            size = len(docnos)
+            matched = {}
+            for docno, score in scores.items():
+                i = bisect_left(docnos, docno)
+                if i < size and docnos[i] == docno:
+                    tf = tfs[i]
+                    matched[docno] = score + weight * tf / (tf + norms[docno])
+            scores = matched
+
+        best = heapq.nlargest(top, scores.items(), key=itemgetter(1))
+        return len(scores), [SearchHit(self._doc_ids[docno], round(score, 4)) for docno, score in best]
+
+    def _search_long(self, lists: List[Tuple[str, Tuple[array, array]]], top: int) -> Optional[Tuple[int, List[SearchHit]]]:
+        """
+        Called with the lock held, when every posting list is long. Matches are
+        counted exactly by intersecting bitmaps. When there are at most
+        SEARCH_MAX_CANDIDATES they are all scored; otherwise only those among
+        the best postings of some term are. None when they cannot fill the page.
+        """
+        n = len(self._doc_ids)
+        k1_plus_1 = self.k1 + 1
+        norms = self._norms
+        if self._live_bits is None:
+            self._live_bits = _bitmap(self._live)
+        matches = self._live_bits
+        # Per term: weight and postings; candidates: its best postings and those appended since they were picked
+        terms = []
+        candidates = set()
+        for term, (docnos, tfs) in lists:
+            entry = self._long_postings(term, docnos, tfs)
+            tail = docnos[entry.size:]
+            bits = entry.bits
+            if tail:
+                flags = bytearray(tail[-1] - tail[0] + 1)
+                for docno in tail:
+                    flags[docno - tail[0]] = 1
+                bits |= _bitmap(flags) << tail[0]
+            matches &= bits
+            candidates.update(entry.docnos, tail)
+            df = len(docnos)
+            terms.append((math.log(1 + (n - df + 0.5) / (df + 0.5)) * k1_plus_1, docnos, tfs))
+
+        total = bin(matches).count("1")
+        if not total:
+            return 0, []
+        matched = matches.to_bytes((n + 7) // 8, "little")
+        if total <= settings.SEARCH_MAX_CANDIDATES:
+            candidates = _set_bits(matched)
+        else:
+            candidates = [docno for docno in candidates if (matched[docno >> 3] >> (docno & 7)) & 1]
+        scored = []
+        for docno in candidates:
+            score = 0.0
+            for weight, docnos, tfs in terms:
+                tf = tfs[bisect_left(docnos, docno)]
+                score += weight * tf / (tf + norms[docno])
+            scored.append((score, docno))
+        best = heapq.nlargest(top, scored)
+        if len(best) < min(top, total):
+            return None
+        return total, [SearchHit(self._doc_ids[docno], round(score, 4)) for score, docno in best]
+
+    def _long_postings(self, term: str, docnos: array, tfs: array) -> LongPostings:
+        """Called with the lock held. Postings appended later are scored per query until there are too many."""
+        entry = self._long.get(term)
+        if entry is not None and len(docnos) - entry.size <= LONG_POSTINGS // 4:
+            self._long.move_to_end(term)
+            return entry
+        norms = self._norms
+        impacts = [tf / (tf + norms[docno]) for docno, tf in zip(docnos, tfs)]
+        best = heapq.nlargest(settings.SEARCH_MAX_CANDIDATES, range(len(impacts)), key=impacts.__getitem__)
+        flags = bytearray(docnos[-1] + 1)
+        for docno in docnos:
+            flags[docno] = 1
+        entry = self._long[term] = LongPostings(
+            array("I", map(docnos.__getitem__, best)),
+            _bitmap(flags),
+            len(docnos),
+        )
+        while len(self._long) > LONG_CACHE_TERMS:
+            self._long.popitem(last=False)
+        return entry
+
+    # --- Loading from the database ---
+
+    @staticmethod
+    def _searchable():
+        return and_(Document.status == DocumentStatus.PUBLISHED, Document.is_delete.isnot(True))
+
+    @staticmethod
+    async def _load(db: AsyncSession, documents: List[Document]) -> List[Tuple[int, Dict[str, str], datetime]]:
+        """(document id, fields, version) with page text capped at SEARCH_MAX_DOC_CHARS per document."""
+        ids = [document.id for document in documents]
+        pages: Dict[int, List[str]] = {document_id: [] for document_id in ids}
+        budget = {document_id: settings.SEARCH_MAX_DOC_CHARS for document_id in ids}
+        query = (
+            select(DocumentPage.document_id, DocumentPage.text)
+            .filter(DocumentPage.document_id.in_(ids))
+            .order_by(DocumentPage.document_id, DocumentPage.page_number)
+        )
+        for document_id, text in (await db.execute(query)).all():
+            if text and budget[document_id] > 0:
+                pages[document_id].append(text[:budget[document_id]])
+                budget[document_id] -= len(text)
+        return [
+            (document.id, SearchIndex.document_fields(document, "\n".join(pages[document.id])), document.updated_at)
+            for document in documents
+        ]
+
+    def _add_many(self, rows: Iterable[Tuple[int, Dict[str, str], datetime]]) -> None:
+        for document_id, fields, version in rows:
+            self.add(document_id, fields, version)
+
+    async def refresh(self, db: AsyncSession, force: bool = False) -> None:
+        """Bring the index up to date if SEARCH_REFRESH_SECONDS have passed since the last refresh."""
+        if self._ready and not force and time.monotonic() - self._refreshed_at < settings.SEARCH_REFRESH_SECONDS:
+            return
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if self._ready and not force and time.monotonic() - self._refreshed_at < settings.SEARCH_REFRESH_SECONDS:
+                return
+            if not self._ready or self.stale > max(1000, len(self._doc_ids) // 4):
+                await self._rebuild(db)
+            else:
+                await self._update(db)
+            self._refreshed_at = time.monotonic()
+
+    def warm_up(self) -> None:
+        """Build the index in the background (at startup) so the first search does not wait for it."""
+        async def build():
+            from app.db.session import SessionLocal
+            try:
+                async with SessionLocal() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                logger.error(f"Search index warm-up failed: {e}")
+
+        self._warmup = asyncio.get_running_loop().create_task(build())
+
+    async def _rebuild(self, db: AsyncSession) -> None:
+        started = time.perf_counter()
+        # Rows committed while loading may carry earlier timestamps: overlap the next update
+        watermark = datetime.utcnow() - timedelta(minutes=1)
+        fresh = SearchIndex(self.k1, self.b)
+        loop = asyncio.get_running_loop()
+        last_id = 0
+        while True:
+            query = (
+                select(Document).filter(self._searchable(), Document.id > last_id)
+                .order_by(Document.id).limit(LOAD_BATCH)
+            )
+            documents = (await db.execute(query)).scalars().all()
+            if not documents:
+                break
+            rows = await self._load(db, documents)
+            # Tokenizing is CPU work: keep it off the event loop
+            await loop.run_in_executor(None, fresh._add_many, rows)
+            last_id = documents[-1].id
+
+        with self._lock:
+            for name in ("_postings", "_doc_ids", "_lengths", "_norms", "_live", "_docnos", "_versions", "_total_length", "_norm_avg"):
+                setattr(self, name, getattr(fresh, name))
+            self._long.clear()
+            self._changed()
+        self._watermark = watermark
+        self._ready = True
+        logger.info(f"Search index built: {len(self)} documents in {time.perf_counter() - started:.1f}s")
+
+    async def _update(self, db: AsyncSession) -> None:
+        watermark = datetime.utcnow() - timedelta(minutes=1)
+        # Storing page text bumps Document.updated_at, so this also catches new extractions.
+        # The watermark overlaps the previous one; versions skip documents already indexed.
+        changed = select(Document.id, Document.updated_at).filter(Document.updated_at > self._watermark)
+        ids = {
+            document_id for document_id, updated_at in (await db.execute(changed)).all()
+            if updated_at is None or self._versions.get(document_id) != updated_at
+        }
+
+        if ids:
+            ids = list(ids)
+            for start in range(0, len(ids), LOAD_BATCH):
+                batch = ids[start:start + LOAD_BATCH]
+                documents = (await db.execute(select(Document).filter(Document.id.in_(batch)))).scalars().all()
+                searchable = [
+                    document for document in documents
+                    if document.status == DocumentStatus.PUBLISHED and not document.is_delete
+                ]
+                for document_id in set(batch) - {document.id for document in searchable}:
+                    self.remove(document_id)
+                rows = await self._load(db, searchable) if searchable else []
+                await asyncio.get_running_loop().run_in_executor(None, self._add_many, rows)
+
+        # Hard deletes leave no timestamp behind: reconcile the ids when the counts disagree
+        count = (await db.execute(select(func.count()).select_from(Document).filter(self._searchable()))).scalar_one()
+        if count != len(self):
+            current = {row[0] for row in (await db.execute(select(Document.id).filter(self._searchable()))).all()}
+            for document_id in set(self._docnos) - current:
+                self.remove(document_id)
+        self._watermark = watermark
+
+    async def snippets(
+        self, db: AsyncSession, query: str, document_ids: List[int], width: int = 160
+    ) -> Dict[int, Tuple[int, str]]:
+        """
+        document id -> (page number, text around the match) for the first page
+        containing the longest word of the query; documents matched only on
+        their title or description have no entry.
+        """
+        words = sorted(TOKEN_RE.findall(query.lower()), key=len, reverse=True)
+        if not words or not document_ids:
+            return {}
+        needle = words[0]
+        first_pages = (
+            select(DocumentPage.document_id, func.min(DocumentPage.page_number))
+            .filter(DocumentPage.document_id.in_(document_ids), DocumentPage.text.contains(needle, autoescape=True))
+            .group_by(DocumentPage.document_id)
+        )
+        pairs = (await db.execute(first_pages)).all()
+        if not pairs:
+            return {}
+        texts = select(DocumentPage.document_id, DocumentPage.page_number, DocumentPage.text).filter(
+            or_(*(and_(DocumentPage.document_id == document_id, DocumentPage.page_number == page) for document_id, page in pairs))
+        )
+        result = {}
+        for document_id, page, text in (await db.execute(texts)).all():
+            position = max(text.lower().find(needle), 0)
+            start = max(position - (width - len(needle)) // 2, 0)
+            snippet = " ".join(text[start:start + width].split())
+            result[document_id] = (
+                page,
+                ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else ""),
+            )
+        return result
+
+search_index = SearchIndex()
@@ -0,0 +1,843 @@
+import oss2
+import io
+import os
+import uuid
+import time
+import random
+import base64
+import hashlib
+import hmac
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlparse
+from fastapi import HTTPException
+from app.core.config import settings
+
+
+def _read_part(fileobj: BinaryIO, size: int) -> bytes:
+    """Read up to `size` bytes, looping over short reads from non-file streams."""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = fileobj.read(min(settings.UPLOAD_CHUNK_SIZE, size - len(buf)))
+        if not chunk:
+            break
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def hash_fileobj(fileobj: BinaryIO) -> Tuple[str, int]:
+    """Return (sha256 hex digest, size) of a seekable file and rewind it."""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+class HashingReader:
+    """Wraps a file object and feeds everything read through it into a sha256 digest."""
+
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+        self._digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self._digest.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class ChainedReader:
+    """Minimal read-only file object that reads through several readers in order."""
+
+    def __init__(self, readers: List[BinaryIO]):
+        self._readers = list(readers)
+
+    def read(self, size: int = -1) -> bytes:
+        while self._readers:
+            data = self._readers[0].read(size)
+            if data:
+                return data
+            self._readers.pop(0)
+        return b""
+
+
+class MultipartUploadError(Exception):
+    def __init__(self, upload_id: str, failed_parts: List[int], cause: Exception):
+        super().__init__(f"Multipart upload {upload_id} failed for parts {failed_parts}: {cause}")
+        self.upload_id = upload_id
+        self.failed_parts = failed_parts
+
+
+class MultipartUploader:
+    """
+    Parallel multipart upload engine for oss2-compatible buckets.
+
+    Objects below `threshold` go up as a single PUT. Larger ones are split into
+    `part_size` parts uploaded by `workers` threads; each part is retried on its
+    own up to `max_retries` times. At most `workers` parts are buffered at once.
+    If parts still fail, or anything else goes wrong once the multipart upload
+    exists (the source stream raising, completing the upload), it is left open
+    and MultipartUploadError carries its upload_id so the caller can resume
+    (already uploaded parts are skipped) or abort it.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        part_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        threshold: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.bucket = bucket
+        self.part_size = part_size or settings.OSS_PART_SIZE
+        self.workers = workers or settings.OSS_UPLOAD_WORKERS
+        self.threshold = max(threshold or settings.OSS_MULTIPART_THRESHOLD, 1)
+        self.max_retries = settings.OSS_PART_RETRIES if max_retries is None else max_retries
+
+    def upload(self, key: str, fileobj: BinaryIO, headers: Dict[str, str] = None, upload_id: str = None) -> int:
+        """Upload `fileobj` to `key` and return the number of bytes stored."""
+        head = b""
+        if not upload_id:
+            head = _read_part(fileobj, self.threshold)
+            if len(head) < self.threshold:
+                result = self.bucket.put_object(key, head, headers=headers)
+                if result.status != 200:
+                    raise HTTPException(status_code=500, detail="OSS upload failed")
+                return len(head)
+            upload_id = self.bucket.init_multipart_upload(key, headers=headers).upload_id
+
+        source = ChainedReader([io.BytesIO(head), fileobj])
+        del head
+        try:
+            return self._upload_parts(key, source, upload_id)
+        except MultipartUploadError:
+            raise
+        except Exception as e:
+            raise MultipartUploadError(upload_id, [], e) from e
+
+    def _upload_parts(self, key: str, source: BinaryIO, upload_id: str) -> int:
+        done = self._uploaded_parts(key, upload_id)
+
+        parts = {n: info for n, info in done.items()}
+        failures: Dict[int, Exception] = {}
+        slots = threading.BoundedSemaphore(self.workers)
+        size = 0
+
+        def on_done(part_number, future):
+            slots.release()
+            exc = future.exception()
+            if exc is not None:
+                failures[part_number] = exc
+            else:
+                parts[part_number] = future.result()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="oss-part") as pool:
+            part_number = 1
+            while not failures:
+                if part_number in done:
+                    # Resuming: skip bytes that are already stored
+                    skipped = self._skip(source, done[part_number].size or self.part_size)
+                    if not skipped:
+                        break
+                    size += skipped
+                    part_number += 1
+                    continue
+                slots.acquire()
+                data = _read_part(source, self.part_size)
+                if not data:
+                    slots.release()
+                    break
+                size += len(data)
+                future = pool.submit(self._upload_part, key, upload_id, part_number, data)
+                future.add_done_callback(lambda f, n=part_number: on_done(n, f))
+                del data
+                part_number += 1
+
+        if failures:
+            first = next(iter(failures.values()))
+            raise MultipartUploadError(upload_id, sorted(failures), first)
+
+        ordered = [parts[n] for n in sorted(parts)]
+        self.bucket.complete_multipart_upload(key, upload_id, ordered)
+        return size
+
+    def abort(self, key: str, upload_id: str):
+        self.bucket.abort_multipart_upload(key, upload_id)
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes):
+        attempt = 0
+        while True:
+            try:
+                result = self.bucket.upload_part(key, upload_id, part_number, data)
+                return oss2.models.PartInfo(part_number, result.etag, size=len(data))
+            except Exception:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(min(0.2 * (2 ** attempt), 5))
+                attempt += 1
+
+    def _uploaded_parts(self, key: str, upload_id: str) -> Dict[int, "oss2.models.PartInfo"]:
+        return {p.part_number: p for p in oss2.PartIterator(self.bucket, key, upload_id)}
+
+    @staticmethod
+    def _skip(fileobj, size: int) -> int:
+        skipped = 0
+        while skipped < size:
+            chunk = fileobj.read(min(settings.UPLOAD_CHUNK_SIZE, size - skipped))
+            if not chunk:
+                break
+            skipped += len(chunk)
+        return skipped
+
+
+class FakeBucket:
+    """
+    In-memory stand-in for oss2.Bucket covering the calls OSSStorage makes.
+    `latency` (seconds per request), `bandwidth` (bytes/sec per connection) and
+    `failure_rate` (per uploaded part) simulate a remote endpoint so uploads can be benchmarked
+    and retried offline.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0, failure_rate: float = 0.0, keep_data: bool = True):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.keep_data = keep_data
+        self.objects: Dict[str, bytes] = {}
+        # upload_id -> {part_number: (etag, size, data)}
+        self.uploads: Dict[str, Dict[int, tuple]] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _transfer(self, nbytes: int = 0):
+        with self._lock:
+            self.requests += 1
+        delay = self.latency
+        if self.bandwidth:
+            delay += nbytes / self.bandwidth
+        if delay:
+            time.sleep(delay)
+
+    def put_object(self, key, data, headers=None):
+        self._transfer(len(data))
+        self.objects[key] = data if self.keep_data else b""
+        return SimpleNamespace(status=200, etag=hashlib.md5(data).hexdigest())
+
+    def init_multipart_upload(self, key, headers=None):
+        self._transfer()
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return SimpleNamespace(status=200, upload_id=upload_id)
+
+    def upload_part(self, key, upload_id, part_number, data, headers=None):
+        self._transfer(len(data))
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise oss2.exceptions.RequestError(IOError("simulated network failure"))
+        etag = hashlib.md5(data).hexdigest()
+        self.uploads[upload_id][part_number] = (etag, len(data), data if self.keep_data else b"")
+        return SimpleNamespace(status=200, etag=etag)
+
+    def list_parts(self, key, upload_id, marker="", max_parts=1000, headers=None):
+        self._transfer()
+        stored = self.uploads[upload_id]
+        start = int(marker or 0)
+        numbers = sorted(n for n in stored if n > start)[:max_parts]
+        parts = [oss2.models.PartInfo(n, stored[n][0], size=stored[n][1]) for n in numbers]
+        truncated = len(numbers) == max_parts and numbers[-1] < max(stored)
+        return SimpleNamespace(parts=parts, is_truncated=truncated, next_marker=str(numbers[-1]) if numbers else "")
+
+    def complete_multipart_upload(self, key, upload_id, parts, headers=None):
+        self._transfer()
+        stored = self.uploads.pop(upload_id)
+        self.objects[key] = b"".join(stored[p.part_number][2] for p in parts)
+        return SimpleNamespace(status=200)
+
+    def abort_multipart_upload(self, key, upload_id, headers=None):
+        self._transfer()
+        self.uploads.pop(upload_id, None)
+        return SimpleNamespace(status=204)
+
+    def delete_object(self, key, headers=None):
+        self._transfer()
+        self.objects.pop(key, None)
+        return SimpleNamespace(status=204)
+
+    def head_object(self, key, headers=None):
+        self._transfer()
+        if key not in self.objects:
+            raise oss2.exceptions.NotFound(404, {}, b"", {})
+        data = self.objects[key]
+        return SimpleNamespace(content_length=len(data), etag=hashlib.md5(data).hexdigest(), headers={})
+
+    def get_object(self, key, headers=None):
+        self._transfer()
+        if key not in self.objects:
+            raise oss2.exceptions.NotFound(404, {}, b"", {})
+        return io.BytesIO(self.objects[key])
+
+    def list_objects(self, prefix="", delimiter="", marker="", max_keys=100, headers=None):
+        self._transfer()
+        keys = sorted(k for k in self.objects if k.startswith(prefix) and k > marker)
+        page = keys[:max_keys]
+        objects = [SimpleNamespace(key=k, size=len(self.objects[k]), last_modified=0) for k in page]
+        truncated = len(keys) > max_keys
+        return SimpleNamespace(object_list=objects, prefix_list=[], is_truncated=truncated, next_marker=page[-1] if truncated else "")
+
+    def batch_delete_objects(self, key_list, headers=None):
+        self._transfer()
+        for key in key_list:
+            self.objects.pop(key, None)
+        return SimpleNamespace(status=200, deleted_keys=list(key_list))
+
+    endpoint = "https://fake-bucket.invalid"
+    bucket_name = "fake"
+
+    def sign_url(self, method, key, expires, headers=None, params=None):
+        query = "&".join(f"{k}={quote(str(v))}" for k, v in (params or {}).items())
+        return f"https://fake-bucket.invalid/{key}?Expires={int(time.time()) + expires}" + (f"&{query}" if query else "")
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for a boto3 S3 client (MinIO or AWS) covering the calls
+    S3Storage makes, so the S3 backend can be exercised without a server.
+    """
+
+    def __init__(self):
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, Dict[str, str]]] = {}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.objects[(bucket, key)] = (fileobj.read(), dict(ExtraArgs or {}))
+
+    class NotFound(Exception):
+        response = {"Error": {"Code": "404", "Message": "Not Found"}}
+
+    def _get(self, bucket, key):
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            raise self.NotFound(key)
+
+    def head_object(self, Bucket, Key):
+        data, extra = self._get(Bucket, Key)
+        return {"ContentLength": len(data), "ETag": f'"{hashlib.md5(data).hexdigest()}"', "ContentType": extra.get("ContentType")}
+
+    def get_object(self, Bucket, Key):
+        data, _ = self._get(Bucket, Key)
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix) and k > (ContinuationToken or ""))
+        page = keys[:MaxKeys]
+        result = {
+            "Contents": [{"Key": k, "Size": len(self.objects[(Bucket, k)][0]), "LastModified": datetime.fromtimestamp(0, timezone.utc)} for k in page],
+            "IsTruncated": len(keys) > MaxKeys,
+        }
+        if result["IsTruncated"]:
+            result["NextContinuationToken"] = page[-1]
+        return result
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+        return {"Deleted": [{"Key": obj["Key"]} for obj in Delete["Objects"]]}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        return f"http://fake-s3.invalid/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        policy = json.dumps({"conditions": [{"bucket": Bucket}, {"key": Key}, *(Conditions or [])]})
+        fields = {**(Fields or {}), "key": Key, "policy": base64.b64encode(policy.encode()).decode()}
+        return {"url": f"http://fake-s3.invalid/{Bucket}", "fields": fields}
+
+
+# --- Storage references ---
+#
+# Document.file_path holds "<backend>:<object key>", e.g. "oss:2026/10/<uuid>.pdf".
+# Where the bytes live is decided by the backend name, so objects can be moved
+# between backends by rewriting the prefix, and URLs are built only when needed.
+
+def shard_prefix(name: str, levels: int = None) -> str:
+    """Hash-prefix directories for `name`, e.g. "3f/a9" (256 entries per level)."""
+    levels = settings.LOCAL_SHARD_LEVELS if levels is None else levels
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return "/".join(digest[2 * i:2 * i + 2] for i in range(levels))
+
+
+def shard_key(name: str, levels: int = None) -> str:
+    """Fan `name` out below its hash-prefix directories: "3f/a9/<name>"."""
+    prefix = shard_prefix(name, levels)
+    return f"{prefix}/{name}" if prefix else name
+
+
+def make_ref(backend: str, key: str) -> str:
+    return f"{backend}:{key}"
+
+
+def parse_ref(ref: str) -> Tuple[str, str]:
+    """Split a storage reference into (backend name, object key). Understands pre-backend URLs."""
+    if ref.startswith("/static/screenshots/"):
+        return "screenshots", ref[len("/static/screenshots/"):]
+    if ref.startswith("/static/uploads/"):
+        return "local", ref[len("/static/uploads/"):]
+    if ref.startswith(("http://", "https://")):
+        # Old rows stored the public OSS URL
+        return "oss", urlparse(ref).path.lstrip("/")
+    backend, sep, key = ref.partition(":")
+    if not sep or not key:
+        raise ValueError(f"Invalid storage reference: {ref!r}")
+    return backend, key
+
+
+# OSS DeleteMultipleObjects and S3 DeleteObjects both accept at most 1000 keys
+MAX_BATCH_DELETE = 1000
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    last_modified: float # Unix timestamp
+
+
+class StorageBackend:
+    """
+    Interface of a blob store. Implementations are thread-safe and own their
+    connection pool, so one instance per process is shared by every request.
+    """
+
+    name: str = ""
+    # Can hand out signed URLs that clients use without going through the API
+    supports_presign: bool = False
+
+    def new_key(self, filename: str) -> str:
+        """Key for a new object: YYYY/MM/<uuid>.<ext>."""
+        ext = os.path.splitext(filename)[1]
+        return f"{datetime.now().strftime('%Y/%m')}/{uuid.uuid4()}{ext}"
+
+    def put(self, key: str, fileobj: BinaryIO, content_type: str = None) -> int:
+        """Stream `fileobj` to `key` and return the number of bytes stored."""
+        raise NotImplementedError
+
+    def open(self, key: str) -> BinaryIO:
+        """Readable stream of the object; the caller closes it."""
+        raise NotImplementedError
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        """size / etag / checksum / content_type of an object, or None if it does not exist."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Delete an object; deleting a missing object is not an error."""
+        raise NotImplementedError
+
+    def delete_many(self, keys: Iterable[str]) -> List[str]:
+        """Delete objects, batching requests where the backend allows it. Returns keys that failed."""
+        failed = []
+        for key in keys:
+            try:
+                self.delete(key)
+            except Exception:
+                failed.append(key)
+        return failed
+
+    def iter_objects(self, prefix: str = "", page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        """Yield the stored objects page by page, in key order."""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the object when it lives on local disk."""
+        return None
+
+    def presign_get(self, key: str, expires: int, params: Dict[str, str] = None) -> str:
+        raise HTTPException(status_code=400, detail=f"Storage backend '{self.name}' cannot sign URLs")
+
+    def presign_post(self, key: str, max_size: int, content_type: str = None, expires: int = None) -> Dict[str, Any]:
+        """
+        A browser form upload of at most `max_size` bytes to `key`: {"url", "method", "fields"}.
+        The storage service itself rejects larger bodies, before anything is stored.
+        """
+        raise HTTPException(status_code=400, detail=f"Storage backend '{self.name}' does not accept direct uploads")
+
+
+class LocalStorage(StorageBackend):
+    """Files under a local directory (served through nginx X-Accel-Redirect in production)."""
+
+    name = "local"
+
+    def __init__(self, root: str = None, name: str = None):
+        self.root = root or settings.LOCAL_STORAGE_ROOT
+        if name:
+            self.name = name
+
+    def new_key(self, filename: str) -> str:
+        # Hash-prefix fan-out keeps directories small (65536 leaves with two levels)
+        ext = os.path.splitext(filename)[1]
+        return shard_key(f"{uuid.uuid4()}{ext}")
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid object key: {key!r}")
+        return path
+
+    def put(self, key: str, fileobj: BinaryIO, content_type: str = None) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = fileobj.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return {"size": stat.st_size, "etag": f"{stat.st_size:x}-{stat.st_mtime_ns:x}", "checksum": None, "content_type": None}
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_objects(self, prefix: str = "", page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        page = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(".tmp"):
+                    continue # upload in progress
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if not key.startswith(prefix):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                page.append(ObjectInfo(key, stat.st_size, stat.st_mtime))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+class OSSStorage(StorageBackend):
+    """Aliyun OSS bucket. One oss2 session (keep-alive pool) is shared by all calls."""
+
+    name = "oss"
+    supports_presign = True
+
+    def __init__(self, bucket=None, sign_bucket=None):
+        if bucket is None:
+            auth = oss2.Auth(settings.OSS_ACCESS_KEY_ID, settings.OSS_ACCESS_KEY_SECRET)
+            session = oss2.Session(pool_size=settings.STORAGE_POOL_SIZE)
+            bucket = oss2.Bucket(auth, settings.OSS_ENDPOINT, settings.OSS_BUCKET_NAME, session=session)
+            # Sign downloads against the custom (CDN) domain when one is configured
+            if settings.OSS_BUCKET_DOMAIN:
+                sign_bucket = oss2.Bucket(
+                    auth, settings.OSS_BUCKET_DOMAIN, settings.OSS_BUCKET_NAME, is_cname=True, session=session
+                )
+        self.bucket = bucket
+        self.sign_bucket = sign_bucket or bucket
+        self.uploader = MultipartUploader(bucket)
+
+    def put(self, key: str, fileobj: BinaryIO, content_type: str = None) -> int:
+        headers = {'Content-Type': content_type} if content_type else {}
+        try:
+            return self.uploader.upload(key, fileobj, headers=headers)
+        except MultipartUploadError as e:
+            # A consumed stream cannot be replayed, so drop the stored (billed) parts
+            try:
+                self.uploader.abort(key, e.upload_id)
+            except Exception as abort_error:
+                print(f"OSS Abort Multipart Upload Error ({e.upload_id}): {abort_error}")
+            raise
+
+    def open(self, key: str) -> BinaryIO:
+        return self.bucket.get_object(key)
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            meta = self.bucket.head_object(key)
+        except oss2.exceptions.NotFound:
+            return None
+        crc64 = meta.headers.get('x-oss-hash-crc64ecma')
+        return {
+            "size": meta.content_length,
+            "etag": meta.etag,
+            "checksum": f"crc64ecma:{crc64}" if crc64 else None,
+            "content_type": meta.headers.get('Content-Type'),
+        }
+
+    def delete(self, key: str) -> None:
+        self.bucket.delete_object(key)
+
+    def delete_many(self, keys: Iterable[str]) -> List[str]:
+        keys = list(keys)
+        failed = []
+        for start in range(0, len(keys), MAX_BATCH_DELETE):
+            batch = keys[start:start + MAX_BATCH_DELETE]
+            try:
+                result = self.bucket.batch_delete_objects(batch)
+            except Exception as e:
+                print(f"OSS Batch Delete Error: {e}")
+                failed.extend(batch)
+                continue
+            deleted = set(result.deleted_keys)
+            failed.extend(key for key in batch if key not in deleted)
+        return failed
+
+    def iter_objects(self, prefix: str = "", page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        marker = ""
+        while True:
+            result = self.bucket.list_objects(prefix=prefix, marker=marker, max_keys=min(page_size, 1000))
+            yield [ObjectInfo(obj.key, obj.size, obj.last_modified) for obj in result.object_list]
+            if not result.is_truncated:
+                break
+            marker = result.next_marker
+
+    def presign_get(self, key: str, expires: int, params: Dict[str, str] = None) -> str:
+        return self.sign_bucket.sign_url('GET', key, expires, params=params or {})
+
+    def presign_post(self, key: str, max_size: int, content_type: str = None, expires: int = None) -> Dict[str, Any]:
+        # PostObject policy: https://help.aliyun.com/document_detail/31988.html
+        expires_at = datetime.now(timezone.utc).timestamp() + (expires or settings.DIRECT_UPLOAD_EXPIRE_SECONDS)
+        fields = {"key": key, "success_action_status": "200"}
+        if content_type:
+            fields["Content-Type"] = content_type
+        policy = {
+            "expiration": datetime.fromtimestamp(expires_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "conditions": [
+                {"bucket": self.bucket.bucket_name},
+                ["content-length-range", 1, max_size],
+                *({name: value} for name, value in fields.items()),
+            ],
+        }
+        encoded = base64.b64encode(json.dumps(policy).encode()).decode()
+        signature = hmac.new(settings.OSS_ACCESS_KEY_SECRET.encode(), encoded.encode(), hashlib.sha1).digest()
+        fields.update(OSSAccessKeyId=settings.OSS_ACCESS_KEY_ID, policy=encoded, Signature=base64.b64encode(signature).decode())
+        endpoint = urlparse(self.bucket.endpoint)
+        return {"url": f"{endpoint.scheme}://{self.bucket.bucket_name}.{endpoint.netloc}/", "method": "POST", "fields": fields}
+
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible bucket (AWS S3, MinIO, ...). boto3 is optional and only
+    imported when this backend is configured; its client keeps a connection
+    pool of STORAGE_POOL_SIZE and handles multipart uploads itself.
+    """
+
+    name = "s3"
+    supports_presign = True
+
+    def __init__(self, client=None, bucket_name: str = None):
+        self.transfer_config = None
+        if client is None:
+            try:
+                import boto3
+                from boto3.s3.transfer import TransferConfig
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("The s3 storage backend requires boto3 (pip install boto3)")
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                region_name=settings.S3_REGION or None,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+                config=Config(
+                    max_pool_connections=settings.STORAGE_POOL_SIZE,
+                    retries={"max_attempts": settings.OSS_PART_RETRIES, "mode": "standard"},
+                    # MinIO and most self-hosted endpoints only route path-style requests
+                    s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+                ),
+            )
+            self.transfer_config = TransferConfig(
+                multipart_threshold=settings.OSS_MULTIPART_THRESHOLD,
+                multipart_chunksize=settings.OSS_PART_SIZE,
+                max_concurrency=settings.OSS_UPLOAD_WORKERS,
+            )
+        self.client = client
+        self.bucket_name = bucket_name or settings.S3_BUCKET_NAME
+
+    def put(self, key: str, fileobj: BinaryIO, content_type: str = None) -> int:
+        reader = _CountingReader(fileobj)
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(reader, self.bucket_name, key, ExtraArgs=extra, Config=self.transfer_config)
+        return reader.size
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket_name, Key=key)["Body"]
+
+    def head(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            meta = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except Exception as e:
+            # botocore ClientError carries the S3 error code in .response
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {
+            "size": meta["ContentLength"],
+            "etag": meta["ETag"].strip('"'),
+            "checksum": None,
+            "content_type": meta.get("ContentType"),
+        }
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def delete_many(self, keys: Iterable[str]) -> List[str]:
+        keys = list(keys)
+        failed = []
+        for start in range(0, len(keys), MAX_BATCH_DELETE):
+            batch = keys[start:start + MAX_BATCH_DELETE]
+            try:
+                result = self.client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+            except Exception as e:
+                print(f"S3 Batch Delete Error: {e}")
+                failed.extend(batch)
+                continue
+            # Quiet mode only reports failures
+            failed.extend(error["Key"] for error in result.get("Errors", []))
+        return failed
+
+    def iter_objects(self, prefix: str = "", page_size: int = 1000) -> Iterator[List[ObjectInfo]]:
+        kwargs = {"Bucket": self.bucket_name, "Prefix": prefix, "MaxKeys": min(page_size, 1000)}
+        while True:
+            result = self.client.list_objects_v2(**kwargs)
+            yield [
+                ObjectInfo(obj["Key"], obj["Size"], obj["LastModified"].timestamp())
+                for obj in result.get("Contents", [])
+            ]
+            if not result.get("IsTruncated"):
+                break
+            kwargs["ContinuationToken"] = result["NextContinuationToken"]
+
+    def presign_get(self, key: str, expires: int, params: Dict[str, str] = None) -> str:
+        request_params = {"Bucket": self.bucket_name, "Key": key}
+        if params and "response-content-disposition" in params:
+            request_params["ResponseContentDisposition"] = params["response-content-disposition"]
+        return self.client.generate_presigned_url("get_object", Params=request_params, ExpiresIn=expires)
+
+    def presign_post(self, key: str, max_size: int, content_type: str = None, expires: int = None) -> Dict[str, Any]:
+        fields = {"Content-Type": content_type} if content_type else {}
+        conditions = [["content-length-range", 1, max_size], *({name: value} for name, value in fields.items())]
+        signed = self.client.generate_presigned_post(
+            self.bucket_name, key, Fields=fields, Conditions=conditions,
+            ExpiresIn=expires or settings.DIRECT_UPLOAD_EXPIRE_SECONDS,
+        )
+        return {"url": signed["url"], "method": "POST", "fields": signed["fields"]}
+
+
+class _CountingReader:
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self.size += len(data)
+        return data
+
+
+class StorageRegistry:
+    """
+    Backends by name, created on first use. New files go to STORAGE_BACKEND
+    (default: oss when OSS credentials are set, otherwise local); existing
+    files are read from whichever backend their reference names.
+    """
+
+    factories = {
+        "local": LocalStorage,
+        "oss": OSSStorage,
+        "s3": S3Storage,
+        # Page images rendered by PDFService (served from /static/screenshots)
+        "screenshots": lambda: LocalStorage(root="static/screenshots", name="screenshots"),
+        # Rendered page images reused across analyses (PDFService render cache)
+        "render_cache": lambda: LocalStorage(root=settings.RENDER_CACHE_DIR, name="render_cache"),
+    }
+
+    def __init__(self):
+        self._backends: Dict[str, StorageBackend] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def default_name(self) -> str:
+        if settings.STORAGE_BACKEND:
+            return settings.STORAGE_BACKEND
+        if settings.OSS_ACCESS_KEY_ID and settings.OSS_ACCESS_KEY_SECRET and settings.OSS_ENDPOINT:
+            return "oss"
+        return "local"
+
+    @property
+    def default(self) -> StorageBackend:
+        return self.get(self.default_name)
+
+    def get(self, name: str) -> StorageBackend:
+        backend = self._backends.get(name)
+        if backend is None:
+            with self._lock:
+                backend = self._backends.get(name)
+                if backend is None:
+                    if name not in self.factories:
+                        raise ValueError(f"Unknown storage backend: {name!r}")
+                    backend = self.factories[name]()
+                    self._backends[name] = backend
+        return backend
+
+    def register(self, backend: StorageBackend) -> None:
+        """Install a preconfigured backend instance (e.g. a fake for tests or benchmarks)."""
+        with self._lock:
+            self._backends[backend.name] = backend
+
+    def resolve(self, ref: str) -> Tuple[StorageBackend, str]:
+        name, key = parse_ref(ref)
+        return self.get(name), key
+
+storage = StorageRegistry()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import uuid
+from typing import AsyncIterator, List, Optional
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models.upload import UploadSession
+
+
+class ChunkFileReader:
+    """Reads a sequence of chunk files as one stream, opening one file at a time."""
+
+    def __init__(self, paths: List[str]):
+        self._paths = paths
+        self.seek(0)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # Only rewinding is needed (hash first, then upload)
+        if offset != 0 or whence != 0:
+            raise ValueError("ChunkFileReader can only seek to the start")
+        self.close()
+        self._index = 0
+        self._current = None
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        while self._index < len(self._paths):
+            if self._current is None:
+                self._current = open(self._paths[self._index], "rb")
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+            self._index += 1
+        return b""
+
+    def close(self):
+        current = getattr(self, "_current", None)
+        if current is not None:
+            current.close()
+
+
+class UploadSessionService:
+    """Chunk staging on local disk for resumable upload sessions."""
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.UPLOAD_SESSION_DIR
+
+    def _session_dir(self, session: UploadSession) -> str:
+        return os.path.join(self.root, session.id)
+
+    def _chunk_path(self, session: UploadSession, index: int) -> str:
+        return os.path.join(self._session_dir(session), f"{index:06d}.part")
+
+    async def write_chunk(
+        self, session: UploadSession, index: int, body: AsyncIterator[bytes], content_length: Optional[int] = None
+    ) -> None:
+        """
+        Stream one chunk to disk. The chunk is written to a temp file and renamed
+        into place only once complete, so an interrupted PUT never counts as received.
+        Each PUT has its own temp file: concurrent retries of a chunk never interleave.
+        Nothing past the declared file size is accepted: a body longer than the
+        chunk is refused up front from its Content-Length, or as soon as it streams past.
+        """
+        if not 0 <= index < session.total_chunks:
+            raise HTTPException(status_code=400, detail="Chunk index out of range")
+        expected = session.chunk_length(index)
+        if content_length is not None and content_length > expected:
+            raise HTTPException(status_code=413, detail=f"Chunk {index} exceeds {expected} bytes")
+
+        await aiofiles.os.makedirs(self._session_dir(session), exist_ok=True)
+        final_path = self._chunk_path(session, index)
+        tmp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+        written = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for data in body:
+                    written += len(data)
+                    if written > expected:
+                        raise HTTPException(status_code=413, detail=f"Chunk {index} exceeds {expected} bytes")
+                    await f.write(data)
+            if written != expected:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes, got {written}")
+            await aiofiles.os.replace(tmp_path, final_path)
+        except BaseException:
+            try:
+                await aiofiles.os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def received_chunks(self, session: UploadSession) -> List[int]:
+        """Blocking (lists the session directory): call it through run_in_threadpool."""
+        session_dir = self._session_dir(session)
+        if not os.path.isdir(session_dir):
+            return []
+        return sorted(
+            int(name.split(".")[0])
+            for name in os.listdir(session_dir)
+            if name.endswith(".part")
+        )
+
+    def open_reader(self, session: UploadSession) -> ChunkFileReader:
+        paths = [self._chunk_path(session, i) for i in range(session.total_chunks)]
+        return ChunkFileReader(paths)
+
+    def discard(self, session: UploadSession) -> None:
+        shutil.rmtree(self._session_dir(session), ignore_errors=True)
+
+upload_session_service = UploadSessionService()
@@ -0,0 +1,201 @@
+"""
+Move local uploads and screenshots into the hash-sharded layout.
+
+    python -m app.shard_storage --dry-run
+    python -m app.shard_storage
+
+Files are hard-linked into their new "ab/cd/" directory first, the stored
+paths are rewritten in bulk and committed, and only then are the old names
+removed, so an interrupted run leaves every row pointing at an existing file
+and can simply be started again.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Tuple
+
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.future import select
+
+from app.db.session import SessionLocal
+from app.models.document import Document
+from app.models.upload import UploadSession
+from app.services.storage import storage, parse_ref, make_ref, shard_key, shard_prefix
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+SCREENSHOT_URL = "/static/screenshots/"
+PAGE_SUFFIX = re.compile(r"_page_\d+\.\w+$")
+
+def _link(src: str, dst: str) -> None:
+    if os.path.exists(dst) or not os.path.exists(src):
+        return
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Different filesystem or no hard link support
+        os.replace(src, dst)
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def upload_target(key: str) -> str:
+    return shard_key(os.path.basename(key))
+
+def screenshot_target(key: str) -> str:
+    # Pages of one document stay together: shard by the name without "_page_N.jpg"
+    name = os.path.basename(key)
+    prefix = shard_prefix(PAGE_SUFFIX.sub("", name))
+    return f"{prefix}/{name}" if prefix else name
+
+def plan_uploads(file_paths: List[str]) -> Dict[str, str]:
+    """old ref -> new ref for local files not in the sharded layout yet."""
+    backend = storage.get("local")
+    moves = {}
+    for ref in file_paths:
+        name, key = parse_ref(ref)
+        if name != "local":
+            continue
+        target = upload_target(key)
+        # Target already there: moved by an earlier (interrupted) run
+        if key != target and (os.path.exists(backend.local_path(key)) or os.path.exists(backend.local_path(target))):
+            moves[ref] = make_ref("local", target)
+    return moves
+
+def plan_screenshots(refs: List[str]) -> Dict[str, str]:
+    backend = storage.get("screenshots")
+    moves = {}
+    for ref in refs:
+        if not ref.startswith(SCREENSHOT_URL):
+            continue
+        key = ref[len(SCREENSHOT_URL):]
+        target = screenshot_target(key)
+        if key != target and (os.path.exists(backend.local_path(key)) or os.path.exists(backend.local_path(target))):
+            moves[ref] = SCREENSHOT_URL + target
+    return moves
+
+def _paths(moves: Dict[str, str], resolve) -> List[Tuple[str, str]]:
+    return [(resolve(old), resolve(new)) for old, new in moves.items()]
+
+async def migrate_uploads(db, dry_run: bool) -> int:
+    local = storage.get("local")
+    resolve = lambda ref: local.local_path(parse_ref(ref)[1])
+    result = await db.execute(
+        select(Document.file_path).filter(or_(Document.file_path.like("local:%"), Document.file_path.like("/static/uploads/%"))).distinct()
+    )
+    file_paths = [row[0] for row in result.all()]
+    result = await db.execute(select(UploadSession.file_path).filter(UploadSession.file_path.like("local:%")).distinct())
+    file_paths += [row[0] for row in result.all()]
+
+    moves = plan_uploads(list(dict.fromkeys(file_paths)))
+    if dry_run:
+        for old, new in moves.items():
+            logger.info(f"[dry-run] {old} -> {new}")
+        return len(moves)
+
+    items = list(moves.items())
+    for start in range(0, len(items), PAGE_SIZE):
+        batch = dict(items[start:start + PAGE_SIZE])
+        paths = _paths(batch, resolve)
+        for src, dst in paths:
+            _link(src, dst)
+        params = [{"old": old, "new": new} for old, new in batch.items()]
+        for table in (Document.__table__, UploadSession.__table__):
+            # Core executemany: one round trip per batch, not per row
+            await db.execute(
+                update(table).where(table.c.file_path == bindparam("old")).values(file_path=bindparam("new")),
+                params,
+            )
+        await db.commit()
+        for src, dst in paths:
+            if src != dst and os.path.exists(dst):
+                _unlink(src)
+        logger.info(f"Uploads: moved {start + len(batch)}/{len(items)}")
+    return len(items)
+
+async def migrate_screenshots(db, dry_run: bool) -> int:
+    shots = storage.get("screenshots")
+    resolve = lambda ref: shots.local_path(ref[len(SCREENSHOT_URL):])
+    moved = 0
+    last_id = 0
+    while True:
+        query = (
+            select(Document.id, Document.screenshots, Document.cover_image)
+            .filter(Document.id > last_id, or_(Document.screenshots.isnot(None), Document.cover_image.like(SCREENSHOT_URL + "%")))
+            .order_by(Document.id)
+            .limit(PAGE_SIZE)
+        )
+        rows = (await db.execute(query)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        decoded = []
+        refs = []
+        for doc_id, screenshots, cover_image in rows:
+            try:
+                paths = json.loads(screenshots) if screenshots else []
+            except ValueError:
+                paths = []
+            decoded.append((doc_id, paths, cover_image))
+            refs.extend(paths)
+            if cover_image:
+                refs.append(cover_image)
+        moves = plan_screenshots(list(dict.fromkeys(refs)))
+        if not moves:
+            continue
+        moved += len(moves)
+        if dry_run:
+            for old, new in moves.items():
+                logger.info(f"[dry-run] {old} -> {new}")
+            continue
+
+        paths = _paths(moves, resolve)
+        for src, dst in paths:
+            _link(src, dst)
+        params = []
+        for doc_id, shot_paths, cover_image in decoded:
+            new_paths = [moves.get(p, p) for p in shot_paths]
+            new_cover = moves.get(cover_image, cover_image)
+            if new_paths != shot_paths or new_cover != cover_image:
+                params.append({
+                    "doc_id": doc_id,
+                    "new_screenshots": json.dumps(new_paths) if new_paths else None,
+                    "new_cover": new_cover,
+                })
+        table = Document.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("doc_id"))
+            .values(screenshots=bindparam("new_screenshots"), cover_image=bindparam("new_cover")),
+            params,
+        )
+        await db.commit()
+        # Deduplicated documents on later pages may still list the old name;
+        # plan_screenshots maps them to the existing target
+        for src, dst in paths:
+            if src != dst and os.path.exists(dst):
+                _unlink(src)
+        logger.info(f"Screenshots: moved {moved} files (documents up to id {last_id})")
+    return moved
+
+async def main(args: argparse.Namespace) -> None:
+    async with SessionLocal() as db:
+        uploads = await migrate_uploads(db, args.dry_run)
+        screenshots = await migrate_screenshots(db, args.dry_run)
+    verb = "would move" if args.dry_run else "moved"
+    logger.info(f"Done: {verb} {uploads} uploads and {screenshots} screenshots")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move local files into the hash-sharded layout")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the planned moves")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,192 @@
+"""
+Delete stored objects that no document references any more.
+
+    python -m app.storage_gc --dry-run
+    python -m app.storage_gc --backend oss --rate 500
+
+Every referenced storage key (document files, page images and covers, files
+of upload sessions and verified uploads) is loaded into one set per backend, then each backend is
+listed page by page and unreferenced objects older than --min-age-hours are
+removed with batch deletes of up to 1000 keys, at most --rate objects/second.
+The age threshold protects files uploaded but not yet attached to a document.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.crud.crud_document import CRUDDocument
+from app.db.session import SessionLocal
+from app.models.document import Document
+from app.models.upload import UploadSession, VerifiedUpload
+from app.services.storage import storage, parse_ref, MAX_BATCH_DELETE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 5000
+
+class RateLimiter:
+    """Spaces out work so that at most `rate` units are done per second (0 = unlimited)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    async def wait(self, units: int) -> None:
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+        self._next = max(self._next, now) + units / self.rate
+
+def _add_ref(refs: Dict[str, Set[str]], ref: Optional[str]) -> None:
+    if not ref:
+        return
+    try:
+        backend, key = parse_ref(ref)
+    except ValueError:
+        return
+    refs[backend].add(key)
+
+async def load_references() -> Dict[str, Set[str]]:
+    """backend name -> set of keys referenced from the database."""
+    refs: Dict[str, Set[str]] = defaultdict(set)
+    async with SessionLocal() as db:
+        last_id = 0
+        while True:
+            # Keyset pagination over the primary key keeps every page an index range scan
+            query = (
+                select(
+                    Document.id, Document.file_path, Document.view_file_path, Document.cover_image,
+                    Document.screenshots, Document.screenshot_variants,
+                )
+                .filter(Document.id > last_id)
+                .order_by(Document.id)
+                .limit(PAGE_SIZE)
+            )
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+            for _, file_path, view_file_path, cover_image, screenshots, screenshot_variants in rows:
+                _add_ref(refs, file_path)
+                if view_file_path:
+                    _add_ref(refs, view_file_path)
+                if cover_image and not cover_image.startswith(("http://", "https://")):
+                    _add_ref(refs, cover_image)
+                if screenshots:
+                    try:
+                        for ref in json.loads(screenshots):
+                            _add_ref(refs, ref)
+                    except ValueError:
+                        pass
+                for ref in CRUDDocument.variant_paths(screenshot_variants):
+                    _add_ref(refs, ref)
+            last_id = rows[-1][0]
+
+        # Committed upload sessions hold a file the client has not attached to a document yet
+        result = await db.execute(select(UploadSession.file_path).filter(UploadSession.file_path.isnot(None)))
+        for (file_path,) in result.all():
+            _add_ref(refs, file_path)
+        # So are verified uploads that have not expired
+        result = await db.execute(
+            select(VerifiedUpload.file_path).filter(VerifiedUpload.expires_at >= datetime.utcnow())
+        )
+        for (file_path,) in result.all():
+            _add_ref(refs, file_path)
+    return refs
+
+async def collect(
+    backend_name: str,
+    referenced: Set[str],
+    *,
+    dry_run: bool,
+    min_age_hours: float,
+    rate: float,
+    batch_size: int,
+    prefix: str = "",
+) -> Dict[str, int]:
+    backend = storage.get(backend_name)
+    limiter = RateLimiter(rate)
+    cutoff = time.time() - min_age_hours * 3600
+    stats = {"scanned": 0, "orphaned": 0, "orphaned_bytes": 0, "deleted": 0, "failed": 0}
+    pending: List[str] = []
+    loop = asyncio.get_running_loop()
+    # The render cache may share a bucket with uploads; it manages its own size
+    cache_prefix = settings.RENDER_CACHE_PREFIX if backend_name == settings.RENDER_CACHE_BACKEND else None
+
+    async def flush():
+        if not pending:
+            return
+        batch = list(pending)
+        pending.clear()
+        if dry_run:
+            for key in batch:
+                logger.info(f"[dry-run] would delete {backend_name}:{key}")
+            return
+        await limiter.wait(len(batch))
+        failed = await loop.run_in_executor(None, backend.delete_many, batch)
+        stats["deleted"] += len(batch) - len(failed)
+        stats["failed"] += len(failed)
+        for key in failed:
+            logger.warning(f"Could not delete {backend_name}:{key}")
+
+    pages = backend.iter_objects(prefix=prefix)
+    while True:
+        # Listing is blocking network I/O for remote backends
+        page = await loop.run_in_executor(None, next, pages, None)
+        if page is None:
+            break
+        for obj in page:
+            stats["scanned"] += 1
+            if obj.key in referenced or obj.last_modified > cutoff:
+                continue
+            if cache_prefix and obj.key.startswith(cache_prefix):
+                continue
+            stats["orphaned"] += 1
+            stats["orphaned_bytes"] += obj.size
+            pending.append(obj.key)
+            if len(pending) >= batch_size:
+                await flush()
+    await flush()
+    return stats
+
+async def main(args: argparse.Namespace) -> None:
+    backends = args.backend or [storage.default_name, "screenshots"]
+    logger.info("Loading references...")
+    refs = await load_references()
+    logger.info(f"{sum(len(keys) for keys in refs.values())} referenced objects")
+    for name in backends:
+        stats = await collect(
+            name,
+            refs.get(name, set()),
+            dry_run=args.dry_run,
+            min_age_hours=args.min_age_hours,
+            rate=args.rate,
+            batch_size=args.batch_size,
+            prefix=args.prefix,
+        )
+        logger.info(f"{name}: {stats}")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Delete unreferenced stored objects")
+    parser.add_argument("--backend", action="append", help="Backend to scan (repeatable). Default: the upload backend and screenshots")
+    parser.add_argument("--prefix", default="", help="Only scan keys starting with this prefix")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    parser.add_argument("--min-age-hours", type=float, default=24, help="Never delete objects newer than this")
+    parser.add_argument("--rate", type=float, default=200, help="Max objects deleted per second (0 = unlimited)")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_DELETE, help="Keys per batch delete request (max 1000)")
+    args = parser.parse_args(argv)
+    args.batch_size = max(1, min(args.batch_size, MAX_BATCH_DELETE))
+    return args
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import signal
+from collections import defaultdict
+from datetime import timedelta
+
+from app.db.session import SessionLocal
+from app import crud
+from app.core.config import settings
+from app.models.ingest import IngestItemStatus
+from app.services.ingest_service import ingest_service
+from app.services.linearize_service import linearize_service
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def run_once() -> int:
+    """Claim one batch of pending ingest items and process it. Returns the number claimed."""
+    async with SessionLocal() as db:
+        await crud.ingest_job.requeue_stale(
+            db,
+            older_than=timedelta(minutes=settings.INGEST_ITEM_TIMEOUT_MINUTES),
+            max_attempts=settings.INGEST_MAX_ATTEMPTS,
+        )
+        items = await crud.ingest_job.claim_items(db, limit=settings.INGEST_WORKER_BATCH_SIZE)
+        by_job = defaultdict(list)
+        for item in items:
+            by_job[item.job_id].append(item)
+
+        for job_id, job_items in by_job.items():
+            job = await crud.ingest_job.get(db, id=job_id)
+            logger.info(f"Job {job_id}: ingesting {len(job_items)} file(s)")
+            try:
+                await ingest_service.process_items(
+                    db, job_items, category_id=job.category_id, created_by=job.created_by
+                )
+            except Exception as e:
+                # Items stay PROCESSING and are requeued once they go stale
+                await db.rollback()
+                logger.error(f"Job {job_id}: batch failed: {e}")
+            await crud.ingest_job.refresh_progress(db, job_id=job_id)
+        created = [
+            item.document_id for item in items
+            if item.status == IngestItemStatus.SUCCEEDED and not item.deduplicated
+        ]
+    # After the items are committed: the jobs show as done while large files are rewritten
+    await linearize_service.linearize_documents(created)
+    return len(items)
+
+async def main() -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    logger.info("Ingest worker started")
+    while not stopping.is_set():
+        try:
+            claimed = await run_once()
+        except Exception as e:
+            logger.error(f"Ingest worker iteration failed: {e}")
+            claimed = 0
+        if claimed:
+            continue
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=settings.INGEST_WORKER_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    logger.info("Ingest worker stopped")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""
+Benchmark of the document list `q` filter on MySQL: the ngram FULLTEXT index
+(MATCH ... AGAINST in boolean mode, ordered by relevance) against a naive
+LIKE '%q%' scan over the same columns.
+
+Loads a scratch table shaped like `documents` (title, description, ai_summary)
+with synthetic Chinese/English text into the configured database, then times
+first-page queries for frequent and rare terms. Needs MySQL 5.7.6+.
+
+    python bench_fulltext.py --rows 1000000 --queries 200
+    python bench_fulltext.py --keep      # reuse the table loaded by a previous run
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.session import SQLALCHEMY_DATABASE_URL
+
+TABLE = "bench_fulltext_documents"
+CJK_CHARS = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+COLUMNS = "title, description, ai_summary"
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        if len(words) % 2:
+            words.add("".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 4))))
+        else:
+            words.add("".join(rng.choice(LATIN) for _ in range(rng.randint(3, 10))))
+    return list(words)
+
+
+async def load(conn, args, vocabulary: list, cum_weights: list, rng: random.Random) -> None:
+    def words(count: int, sep: str = " ") -> str:
+        return sep.join(rng.choices(vocabulary, cum_weights=cum_weights, k=count))
+
+    await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    await conn.execute(text(
+        f"CREATE TABLE {TABLE} ("
+        " id INT AUTO_INCREMENT PRIMARY KEY,"
+        " title VARCHAR(200) NOT NULL,"
+        " description TEXT NULL,"
+        " ai_summary TEXT NULL,"
+        " created_at DATETIME NULL,"
+        " KEY ix_created_at (created_at)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+    insert = text(
+        f"INSERT INTO {TABLE} (title, description, ai_summary, created_at) "
+        "VALUES (:title, :description, :ai_summary, :created_at)"
+    )
+    start = time.perf_counter()
+    epoch = datetime(2024, 1, 1)
+    for offset in range(0, args.rows, args.batch):
+        rows = [
+            {
+                # Chinese titles have no spaces between words
+                "title": words(rng.randint(2, 5), sep="")[:200],
+                "description": words(args.description_words),
+                "ai_summary": words(args.summary_words) if rng.random() < 0.5 else None,
+                "created_at": epoch + timedelta(minutes=offset + i),
+            }
+            for i in range(min(args.batch, args.rows - offset))
+        ]
+        await conn.execute(insert, rows)
+        await conn.commit()
+        if (offset + len(rows)) % 100000 == 0:
+            print(f"  loaded {offset + len(rows)} rows ({time.perf_counter() - start:.0f}s)")
+    # Building the index once after the load is much faster than maintaining it row by row
+    build = time.perf_counter()
+    await conn.execute(text(f"CREATE FULLTEXT INDEX ft_bench ON {TABLE} ({COLUMNS}) WITH PARSER ngram"))
+    print(f"Loaded {args.rows} rows in {build - start:.0f}s, FULLTEXT index built in {time.perf_counter() - build:.0f}s")
+
+
+async def timed(conn, sql: str, params: dict) -> float:
+    begin = time.perf_counter()
+    (await conn.execute(text(sql), params)).fetchall()
+    return (time.perf_counter() - begin) * 1000
+
+
+def report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    print(f"  {label:<10} mean {statistics.mean(latencies):8.1f} ms   p50 {percentile(0.5):8.1f} ms   "
+          f"p95 {percentile(0.95):8.1f} ms   max {latencies[-1]:8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--description-words", type=int, default=20)
+    parser.add_argument("--summary-words", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per term class and method")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--zipf", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="reuse the existing table instead of reloading")
+    parser.add_argument("--drop", action="store_true", help="drop the table when done")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank ** args.zipf) for rank in range(1, len(vocabulary) + 1)))
+
+    engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+    async with engine.connect() as conn:
+        if not args.keep:
+            await load(conn, args, vocabulary, cum_weights, rng)
+
+        fulltext = (
+            f"SELECT id FROM {TABLE} "
+            f"WHERE MATCH ({COLUMNS}) AGAINST (:against IN BOOLEAN MODE) "
+            f"ORDER BY MATCH ({COLUMNS}) AGAINST (:against IN BOOLEAN MODE) DESC, created_at DESC "
+            "LIMIT :limit"
+        )
+        like = (
+            f"SELECT id FROM {TABLE} "
+            "WHERE title LIKE :pattern OR description LIKE :pattern OR ai_summary LIKE :pattern "
+            "ORDER BY created_at DESC LIMIT :limit"
+        )
+        query_rng = random.Random(args.seed + 1)
+        classes = {
+            # Frequent terms fill the first page early, which is LIKE's best case
+            "frequent": vocabulary[10:200],
+            # Rare terms make LIKE read most of the table before it has a page
+            "rare": vocabulary[len(vocabulary) // 2:],
+        }
+        for name, candidates in classes.items():
+            print(f"{name} terms, {args.queries} queries each:")
+            results = {"FULLTEXT": [], "LIKE": []}
+            for _ in range(args.queries):
+                term = query_rng.choice(candidates)
+                results["FULLTEXT"].append(await timed(conn, fulltext, {"against": f'+"{term}"', "limit": args.limit}))
+                results["LIKE"].append(await timed(conn, like, {"pattern": f"%{term}%", "limit": args.limit}))
+            for label, latencies in results.items():
+                report(label, latencies)
+
+        if args.drop:
+            await conn.execute(text(f"DROP TABLE {TABLE}"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
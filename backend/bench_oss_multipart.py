@@ -0,0 +1,61 @@
+"""
+Offline throughput benchmark for the OSS multipart upload engine.
+
+Uploads a random payload to FakeBucket, which simulates per-request latency
+and per-connection bandwidth, with different worker counts.
+
+    python bench_oss_multipart.py --size-mb 256 --part-mb 8 --latency 0.03 --bandwidth-mb 20
+"""
+import argparse
+import io
+import os
+import time
+
+from app.services.storage import FakeBucket, MultipartUploader
+
+MB = 1024 * 1024
+
+
+def run(payload: bytes, workers: int, args) -> float:
+    bucket = FakeBucket(
+        latency=args.latency,
+        bandwidth=args.bandwidth_mb * MB,
+        failure_rate=args.failure_rate,
+        keep_data=False,
+    )
+    uploader = MultipartUploader(
+        bucket,
+        part_size=args.part_mb * MB,
+        workers=workers,
+        threshold=args.threshold_mb * MB,
+    )
+    start = time.perf_counter()
+    size = uploader.upload("bench/object.pdf", io.BytesIO(payload))
+    elapsed = time.perf_counter() - start
+    assert size == len(payload)
+    print(f"workers={workers:<3} {elapsed:7.2f}s  {size / MB / elapsed:8.1f} MB/s  requests={bucket.requests}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--threshold-mb", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds per request")
+    parser.add_argument("--bandwidth-mb", type=float, default=20, help="MB/s per connection")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability a part upload fails")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_mb * MB)
+    print(f"Uploading {args.size_mb} MB in {args.part_mb} MB parts")
+    baseline = None
+    for workers in args.workers:
+        elapsed = run(payload, workers, args)
+        baseline = baseline or elapsed
+        print(f"           speedup x{baseline / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Latency benchmark for the in-process search index (GET /documents/search).
+
+Builds a synthetic library whose words follow a Zipf distribution (half
+Latin words, half Chinese text), then times uncached queries drawn from the
+same distribution: one to three words, including the most frequent ones, and
+single Chinese characters. Latencies are reported for all queries and
+separately for the frequent-term and single-character ones, which have the
+longest posting lists.
+
+    python bench_search.py --docs 100000 --page-words 400 --queries 2000
+
+With --db the library is written to a scratch SQLite database, the index is
+built from it the way the API builds it, and every query is also timed
+through the whole request path (index lookup, get_many and the snippet
+queries) with the ASGI app in-process:
+
+    python bench_search.py --docs 100000 --db /tmp/bench_search.db
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.core.config import settings
+from app.services.search_index import SearchIndex, search_index
+
+CJK_CHARS = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+# Words at the top of the Zipf distribution: the worst case for posting list length
+FREQUENT = 20
+INSERT_BATCH = 1000
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        if len(words) % 2:
+            words.add("".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 4))))
+        else:
+            words.add("".join(rng.choice(LATIN) for _ in range(rng.randint(3, 10))))
+    return list(words)
+
+
+def zipf_weights(size: int, exponent: float) -> list:
+    return [1 / (rank ** exponent) for rank in range(1, size + 1)]
+
+
+def make_queries(args, vocabulary: list, weights: list) -> List[Tuple[str, str]]:
+    """(kind, query): kind is "single character", "frequent words" or "words"."""
+    rng = random.Random(args.seed + 1)
+    frequent = set(vocabulary[:FREQUENT])
+    cjk = [(word, weight) for word, weight in zip(vocabulary, weights) if not word.isascii()]
+    queries = []
+    for _ in range(args.queries):
+        if rng.random() < args.single_char_share:
+            # A character of a Chinese word drawn by frequency
+            word = rng.choices([word for word, _ in cjk], weights=[weight for _, weight in cjk])[0]
+            queries.append(("single character", rng.choice(word)))
+            continue
+        words = rng.choices(vocabulary, weights=weights, k=rng.randint(1, 3))
+        queries.append(("frequent words" if frequent & set(words) else "words", " ".join(words)))
+    return queries
+
+
+def documents(args, vocabulary: list, cum_weights: list):
+    rng = random.Random(args.seed)
+
+    def text(words: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+    for document_id in range(1, args.docs + 1):
+        yield document_id, {
+            "title": text(args.title_words),
+            "description": text(args.description_words),
+            "pages": text(args.page_words),
+        }
+
+
+def report(label: str, results: List[Tuple[str, float]]) -> None:
+    print(label)
+    kinds: Dict[str, List[float]] = {"all": [latency for _, latency in results]}
+    for kind, latency in results:
+        kinds.setdefault(kind, []).append(latency)
+    for kind, latencies in kinds.items():
+        latencies = sorted(latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        print(
+            f"  {kind:17s} n={len(latencies):5d}  mean {statistics.mean(latencies):6.2f}  p50 {percentile(0.50):6.2f}"
+            f"  p95 {percentile(0.95):6.2f}  p99 {percentile(0.99):6.2f}  max {latencies[-1]:6.2f} ms"
+        )
+
+
+def time_index(index: SearchIndex, queries: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
+    results = []
+    for kind, query in queries:
+        begin = time.perf_counter()
+        index.search(query, limit=20)
+        results.append((kind, (time.perf_counter() - begin) * 1000))
+    return results
+
+
+def print_stats(index: SearchIndex, started: float) -> None:
+    stats = index.stats()
+    print(f"Indexed {stats['documents']} documents in {time.perf_counter() - started:.1f}s: "
+          f"{stats['terms']} terms, {stats['postings']} postings (~{stats['postings'] * 8 / 1024 / 1024:.0f} MB of arrays)")
+
+
+def bench_index(args, library: Callable, queries: List[Tuple[str, str]]) -> None:
+    index = SearchIndex()
+    started = time.perf_counter()
+    for document_id, fields in library():
+        index.add(document_id, fields)
+        if document_id % 10000 == 0:
+            print(f"  indexed {document_id} documents ({time.perf_counter() - started:.0f}s)")
+    print_stats(index, started)
+    report_index(index, queries)
+
+
+def report_index(index: SearchIndex, queries: List[Tuple[str, str]]) -> None:
+    # Frequent terms get their bitmap and best postings on first use: time both passes
+    report("Index lookup (SearchIndex.search), first pass", time_index(index, queries))
+    report("Index lookup (SearchIndex.search), second pass", time_index(index, queries))
+
+
+async def bench_requests(args, library: Callable, queries: List[Tuple[str, str]]) -> None:
+    import httpx
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.api import deps
+    from app.db.base import Base
+    from app.main import app
+    from app.models.document import Document, DocumentPage, DocumentStatus
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{args.db}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    started = time.perf_counter()
+    library = iter(library())
+    while True:
+        batch = list(itertools.islice(library, INSERT_BATCH))
+        if not batch:
+            break
+        async with engine.begin() as connection:
+            await connection.execute(insert(Document), [
+                {
+                    "id": document_id, "title": fields["title"][:200], "description": fields["description"],
+                    "file_path": f"local:bench/{document_id}.pdf", "file_name": f"{document_id}.pdf", "file_size": 0,
+                    "status": DocumentStatus.PUBLISHED, "is_delete": False, "created_by": 1,
+                }
+                for document_id, fields in batch
+            ])
+            await connection.execute(insert(DocumentPage), [
+                {"document_id": document_id, "page_number": 1, "text": fields["pages"], "char_count": len(fields["pages"])}
+                for document_id, fields in batch
+            ])
+    print(f"Wrote {args.docs} documents to {args.db} in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    async with Session() as db:
+        await search_index.refresh(db, force=True)
+    print_stats(search_index, started)
+    report_index(search_index, queries)
+
+    async def get_db():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[deps.get_db] = get_db
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for kind, query in queries:
+            begin = time.perf_counter()
+            response = await client.get("/api/v1/documents/search", params={"q": query, "limit": 20})
+            results.append((kind, (time.perf_counter() - begin) * 1000))
+            response.raise_for_status()
+    report("Full request (GET /documents/search: index, get_many, snippets), after the index passes", results)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--title-words", type=int, default=6)
+    parser.add_argument("--description-words", type=int, default=40)
+    parser.add_argument("--page-words", type=int, default=400, help="words of page text per document")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--single-char-share", type=float, default=0.1, help="share of one-character CJK queries")
+    parser.add_argument("--zipf", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="scratch SQLite file: also time the full request path")
+    args = parser.parse_args()
+
+    vocabulary = make_vocabulary(args.vocabulary, random.Random(args.seed))
+    weights = zipf_weights(len(vocabulary), args.zipf)
+    cum_weights = list(itertools.accumulate(weights))
+    queries = make_queries(args, vocabulary, weights)
+
+    # Measure the index, not the result cache
+    settings.SEARCH_CACHE_SIZE = 0
+    # Same library on every run with the same seed
+    library = lambda: documents(args, vocabulary, cum_weights)
+    if args.db:
+        asyncio.run(bench_requests(args, library, queries))
+    else:
+        bench_index(args, library, queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import time
+import requests
+
+API_URL = "http://localhost:8000/api/v1"
+ADMIN_EMAIL = "admin@example.com"
+ADMIN_PASSWORD = "admin123"
+
+# Requires the ingest worker: python -m app.worker
+
+def get_token():
+    response = requests.post(
+        f"{API_URL}/auth/login/access-token",
+        data={"username": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
+    )
+    if response.status_code != 200:
+        print(f"Login failed: {response.text}")
+        return None
+    return response.json()["access_token"]
+
+def test_ingest_job():
+    token = get_token()
+    if not token:
+        return
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = requests.get(f"{API_URL}/documents/categories", headers=headers)
+    assert response.status_code == 200, f"List categories failed: {response.status_code} {response.text}"
+    categories = response.json()
+    if not categories:
+        print("No categories found, create one first")
+        return
+    category_id = categories[0]["id"]
+
+    # 1. Queue a job; the response must come back before the files are ingested
+    files = [
+        ("files", (f"ingest_{i}.pdf", b"%PDF-1.4 ingest job test " + str(i).encode() * 100, "application/pdf"))
+        for i in range(3)
+    ]
+    files.append(("files", ("ingest_dup.pdf", b"%PDF-1.4 ingest job test " + b"0" * 100, "application/pdf")))
+    print("Creating ingest job...")
+    response = requests.post(f"{API_URL}/admin/upload/jobs", files=files, data={"category_id": category_id}, headers=headers)
+    print(f"Create Job Status: {response.status_code}")
+    if response.status_code != 202:
+        print(f"Error: {response.text}")
+        return
+    job = response.json()
+    print(f"Job {job['id']}: {job['status']}, {job['total']} files")
+
+    # 2. Poll progress
+    for _ in range(30):
+        job = requests.get(f"{API_URL}/admin/upload/jobs/{job['id']}", headers=headers).json()
+        print(f"Job {job['id']}: {job['status']} ({job['succeeded']} ok, {job['failed']} failed of {job['total']})")
+        if job["status"] == "completed":
+            break
+        time.sleep(1)
+
+    for item in job["items"]:
+        print(f"  {item['file_name']}: {item['status']} doc={item['document_id']} dedup={item['deduplicated']} {item['error'] or ''}")
+
+    # 3. Listing
+    response = requests.get(f"{API_URL}/admin/upload/jobs", headers=headers)
+    print(f"List Jobs Status: {response.status_code}, {len(response.json())} jobs")
+
+if __name__ == "__main__":
+    test_ingest_job()
@@ -0,0 +1,158 @@
+import time
+import requests
+
+API_URL = "http://localhost:8000/api/v1"
+ADMIN_EMAIL = "admin@example.com"
+ADMIN_PASSWORD = "admin123"
+
+def get_token():
+    response = requests.post(
+        f"{API_URL}/auth/login/access-token",
+        data={"username": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
+    )
+    if response.status_code != 200:
+        print(f"Login failed: {response.text}")
+        return None
+    return response.json()["access_token"]
+
+def test_upload_session():
+    token = get_token()
+    if not token:
+        return
+    headers = {"Authorization": f"Bearer {token}"}
+
+    content = b"%PDF-1.4 resumable upload test " + b"0" * 5000
+    chunk_size = 2048
+
+    # 1. Create session
+    print("Creating upload session...")
+    response = requests.post(
+        f"{API_URL}/documents/upload/sessions",
+        json={"file_name": "resumable.pdf", "file_size": len(content), "chunk_size": chunk_size, "content_type": "application/pdf"},
+        headers=headers,
+    )
+    print(f"Create Session Status: {response.status_code}")
+    if response.status_code != 200:
+        print(f"Error: {response.text}")
+        return
+    session = response.json()
+    session_id = session["id"]
+    print(f"Session {session_id}: {session['total_chunks']} chunks")
+
+    # 2. Upload every chunk except the first, simulating an interrupted client
+    for index in range(1, session["total_chunks"]):
+        chunk = content[index * chunk_size:(index + 1) * chunk_size]
+        response = requests.put(f"{API_URL}/documents/upload/sessions/{session_id}/chunks/{index}", data=chunk, headers=headers)
+        print(f"Chunk {index} Status: {response.status_code}")
+
+    # 3. Commit must fail while a chunk is missing
+    response = requests.post(f"{API_URL}/documents/upload/sessions/{session_id}/commit", headers=headers)
+    print(f"Early Commit Status (expect 400): {response.status_code}")
+
+    # 4. Resume: ask which chunks are missing and send them
+    response = requests.get(f"{API_URL}/documents/upload/sessions/{session_id}", headers=headers)
+    missing = response.json()["missing_chunks"]
+    print(f"Missing chunks: {missing}")
+    for index in missing:
+        chunk = content[index * chunk_size:(index + 1) * chunk_size]
+        requests.put(f"{API_URL}/documents/upload/sessions/{session_id}/chunks/{index}", data=chunk, headers=headers)
+
+    # 5. Commit
+    response = requests.post(f"{API_URL}/documents/upload/sessions/{session_id}/commit", headers=headers)
+    print(f"Commit Status: {response.status_code}")
+    if response.status_code == 200:
+        result = response.json()
+        print(f"Stored at {result['file_path']} ({result['file_size']} bytes)")
+        assert result["file_size"] == len(content)
+
+def test_upload_session_limits():
+    token = get_token()
+    if not token:
+        return
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # 1. A declared size over MAX_UPLOAD_SIZE is refused before any chunk is staged
+    response = requests.post(
+        f"{API_URL}/documents/upload/sessions",
+        json={"file_name": "huge.pdf", "file_size": 10 * 1024 ** 4, "content_type": "application/pdf"},
+        headers=headers,
+    )
+    print(f"Oversized Session Status (expect 413): {response.status_code}")
+    assert response.status_code == 413
+
+    # 2. Nothing past the declared size is accepted
+    response = requests.post(
+        f"{API_URL}/documents/upload/sessions",
+        json={"file_name": "small.pdf", "file_size": 3000, "chunk_size": 2048, "content_type": "application/pdf"},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    session_id = response.json()["id"]
+    chunks = f"{API_URL}/documents/upload/sessions/{session_id}/chunks"
+
+    response = requests.put(f"{chunks}/2", data=b"0" * 10, headers=headers)
+    print(f"Chunk Past The End Status (expect 400): {response.status_code}")
+    assert response.status_code == 400
+
+    # The last chunk covers bytes 2048-2999: 952 bytes, not a full chunk
+    response = requests.put(f"{chunks}/1", data=b"0" * 2048, headers=headers)
+    print(f"Overlong Last Chunk Status (expect 413): {response.status_code}")
+    assert response.status_code == 413
+
+    # Streamed without a Content-Length, the overflow is caught while writing
+    response = requests.put(f"{chunks}/1", data=iter([b"0" * 1000] * 2), headers=headers)
+    print(f"Overlong Streamed Chunk Status (expect 413): {response.status_code}")
+    assert response.status_code == 413
+
+    response = requests.get(f"{API_URL}/documents/upload/sessions/{session_id}", headers=headers)
+    assert response.json()["received_chunks"] == []
+
+def test_upload_session_commit_twice():
+    token = get_token()
+    if not token:
+        return
+    headers = {"Authorization": f"Bearer {token}"}
+
+    content = b"%PDF-1.4 committed twice " + str(time.time()).encode()
+    response = requests.post(
+        f"{API_URL}/documents/upload/sessions",
+        json={"file_name": "twice.pdf", "file_size": len(content), "content_type": "application/pdf"},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    session_id = response.json()["id"]
+    response = requests.put(f"{API_URL}/documents/upload/sessions/{session_id}/chunks/0", data=content, headers=headers)
+    assert response.status_code == 200, response.text
+
+    # 1. A retried commit returns the same result
+    first = requests.post(f"{API_URL}/documents/upload/sessions/{session_id}/commit", headers=headers)
+    second = requests.post(f"{API_URL}/documents/upload/sessions/{session_id}/commit", headers=headers)
+    print(f"Commit Statuses: {first.status_code}, {second.status_code}")
+    assert first.status_code == second.status_code == 200
+    assert first.json()["file_path"] == second.json()["file_path"]
+
+    # 2. ...but the file still backs only one document
+    response = requests.get(f"{API_URL}/documents/categories", headers=headers)
+    assert response.status_code == 200, response.text
+    categories = response.json()
+    if not categories:
+        print("No categories found, create one first")
+        return
+    doc_data = {
+        "title": "Committed twice",
+        "category_id": categories[0]["id"],
+        "file_path": first.json()["file_path"],
+        "file_name": "twice.pdf",
+        "file_size": len(content),
+    }
+    response = requests.post(f"{API_URL}/documents/", json=doc_data, headers=headers)
+    print(f"First Document Status: {response.status_code}")
+    assert response.status_code == 200, response.text
+    response = requests.post(f"{API_URL}/documents/", json=doc_data, headers=headers)
+    print(f"Second Document Status (expect 400): {response.status_code}")
+    assert response.status_code == 400
+
+if __name__ == "__main__":
+    test_upload_session()
+    test_upload_session_limits()
+    test_upload_session_commit_twice()
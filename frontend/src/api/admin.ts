@@ -57,9 +57,58 @@ export function deleteDocument(id: number) {
   })
 }
 
-export function analyzeDocument(id: number) {
+// Only stages whose inputs changed are redone unless `force` is set
+export function analyzeDocument(id: number, force = false) {
   return request({
     url: `/admin/documents/${id}/analyze`,
-    method: 'post'
+    method: 'post',
+    params: force ? { force: true } : undefined
+  })
+}
+
+// Background ingestion
+export interface IngestJob {
+  id: number
+  category_id: number | null
+  status: 'pending' | 'running' | 'completed'
+  total: number
+  succeeded: number
+  failed: number
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+  items?: {
+    id: number
+    file_name: string
+    file_size: number
+    status: 'pending' | 'processing' | 'succeeded' | 'failed'
+    attempts: number
+    error: string | null
+    document_id: number | null
+    deduplicated: boolean
+  }[]
+}
+
+export function createIngestJob(data: FormData) {
+  return request({
+    url: '/admin/upload/jobs',
+    method: 'post',
+    data,
+    headers: { 'Content-Type': 'multipart/form-data' }
+  })
+}
+
+export function getIngestJobs(params: any) {
+  return request({
+    url: '/admin/upload/jobs',
+    method: 'get',
+    params
+  })
+}
+
+export function getIngestJob(id: number) {
+  return request({
+    url: `/admin/upload/jobs/${id}`,
+    method: 'get'
   })
 }
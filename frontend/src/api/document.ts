@@ -26,9 +26,36 @@ export interface Document {
   updated_at: string
   cover_image?: string
   screenshots?: string[]
+  screenshot_variants?: PagePreview[]
+  is_linearized?: boolean
+  pdf_info?: Record<string, string>
   tags?: any[]
 }
 
+// [level, title, page]; page is null for outline entries without a target
+export type OutlineItem = [number, string, number | null]
+
+export interface DocumentStructure {
+  page_count?: number
+  page_sizes: [number, number][]
+  outline: OutlineItem[]
+  pdf_info: Record<string, string>
+  is_linearized?: boolean
+}
+
+export interface PreviewImage {
+  width: number
+  height: number
+  webp: string
+  jpg: string
+}
+
+// One rendered page: "thumb", "card" and "detail" sizes
+export interface PagePreview {
+  page: number
+  [size: string]: PreviewImage | number
+}
+
 export interface DocumentQuery {
   page?: number
   limit?: number
@@ -49,6 +76,31 @@ export function getDocuments(query: DocumentQuery) {
   })
 }
 
+export interface DocumentSearchHit {
+  document: Document
+  score: number
+  page?: number
+  snippet?: string
+}
+
+export interface DocumentSearchResult {
+  total: number
+  items: DocumentSearchHit[]
+}
+
+// Full-text search over titles, descriptions, summaries and page text
+export function searchDocuments(q: string, page = 1, limit = 10) {
+  return request({
+    url: '/documents/search',
+    method: 'get',
+    params: {
+      q,
+      skip: (page - 1) * limit,
+      limit
+    }
+  })
+}
+
 export function getDocument(id: number) {
   return request({
     url: `/documents/${id}`,
@@ -56,6 +108,14 @@ export function getDocument(id: number) {
   })
 }
 
+// Page sizes and outline, available shortly after upload
+export function getDocumentStructure(id: number) {
+  return request({
+    url: `/documents/${id}/structure`,
+    method: 'get'
+  })
+}
+
 export function getCategories(params?: any) {
   return request({
     url: '/documents/categories',
@@ -100,6 +160,34 @@ export function uploadFile(file: File) {
   })
 }
 
+// Upload straight to OSS with a signed form POST so the file never passes through the API.
+// Resolves to the same metadata as uploadFile.
+export async function uploadFileDirect(file: File) {
+  const ticket: any = await request({
+    url: '/documents/upload/direct',
+    method: 'post',
+    data: { file_name: file.name, content_type: file.type || null }
+  })
+  const form = new FormData()
+  for (const [name, value] of Object.entries(ticket.fields as Record<string, string>)) {
+    form.append(name, value)
+  }
+  // The storage service requires the file to be the last field
+  form.append('file', file)
+  const res = await fetch(ticket.upload_url, {
+    method: ticket.method,
+    body: form
+  })
+  if (!res.ok) {
+    throw new Error(`Direct upload failed: ${res.status}`)
+  }
+  return request({
+    url: '/documents/upload/direct/complete',
+    method: 'post',
+    data: { upload_token: ticket.upload_token }
+  })
+}
+
 export function createDocument(data: any) {
   return request({
     url: '/documents/',
@@ -114,3 +202,10 @@ export function downloadDocument(id: number) {
     method: 'get'
   })
 }
+
+export function getDocumentViewUrl(id: number) {
+  return request({
+    url: `/documents/${id}/view`,
+    method: 'get'
+  })
+}